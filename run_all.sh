@@ -15,9 +15,12 @@ echo "🧹 Cleaning old files..."
 # Delete generated CSVs, invoice PDFs, and vector database
 rm -f invoice_summary.csv
 rm -f attendance_detail.csv
+rm -f invoice_manifest.json
 rm -f invoice_count.txt
 rm -rf invoices
 rm -rf chroma_db
+rm -rf invoice_store
+rm -rf vector_index
 
 echo "✅ Cleanup complete."
 mkdir chroma_db
@@ -0,0 +1,147 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+In-memory cache of generated answers for the Q&A UI, so a question that has
+already been answered (or a rewording of it) does not pay for retrieval and a
+full LLM generation again.
+
+Entries are keyed by (model, succinct flag, corpus version). A lookup first tries
+the exact normalised question text, then the cosine similarity of the question
+embedding against cached questions, accepting the best match above `threshold`.
+Questions only match semantically if they name the same numbers, dates, invoice
+numbers and months, so "total cost in 2019" never answers "total cost in 2020".
+
+Entries expire after `ttl` seconds and the least recently used are evicted past
+`max_entries`. The corpus version is the vectorstore's build fingerprint: when it
+changes (the store was rebuilt) every cached answer is dropped.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from chunking import month_pattern
+
+# --- Configuration ---
+default_threshold = 0.95
+default_ttl = 24 * 60 * 60  # seconds
+default_max_entries = 1000
+
+signature_pattern = re.compile(r"\bINV-\d{4}-\d{2}(?:-\d+)?\b|\d+(?:[/.]\d+)*", re.IGNORECASE)
+
+
+def normalize(question):
+    return " ".join(re.sub(r"[^\w\s/.$-]", " ", question.lower()).split()).strip(" .")
+
+
+def signature(question):
+    """The specifics a reworded question must keep: numbers, dates, invoice numbers and months."""
+    terms = {term.upper() for term in signature_pattern.findall(question)}
+    terms |= {month.capitalize() for month in month_pattern.findall(question)}
+    return tuple(sorted(terms))
+
+
+class AnswerCache:
+    def __init__(self, embed_query=None, threshold=default_threshold, ttl=default_ttl,
+                 max_entries=default_max_entries, clock=time.monotonic):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.corpus_version = None
+        self._entries = OrderedDict()  # (model, succinct, normalised question) -> (answer, vector, signature, stored_at)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, corpus_version):
+        if corpus_version != self.corpus_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.corpus_version = corpus_version
+
+    def _expire(self):
+        now = self.clock()
+        # Entries are kept in least-recently-used order, not insertion order, so check them all.
+        expired = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def _embed(self, question):
+        vector = np.asarray(self.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, question, model, succinct, corpus_version, semantic=True):
+        """
+        (answer, "exact" | "semantic") for a cached answer, or None.
+
+        `semantic=False` skips the embedding lookup (e.g. when embedding the
+        question would load a model that is otherwise not needed).
+        """
+        key = (model, bool(succinct), normalize(question))
+        with self._lock:
+            self._check_version(corpus_version)
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0], "exact"
+            if not (semantic and self.embed_query):
+                self.misses += 1
+                return None
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if k[:2] == key[:2] and e[1] is not None and e[2] == signature(question)]
+
+        if candidates:
+            vector = self._embed(question)
+            scores = np.stack([entry[1] for _, entry in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                with self._lock:
+                    best_key = candidates[best][0]
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                        self.semantic_hits += 1
+                        return self._entries[best_key][0], "semantic"
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, question, model, succinct, corpus_version, answer, semantic=True):
+        vector = self._embed(question) if semantic and self.embed_query else None
+        key = (model, bool(succinct), normalize(question))
+        with self._lock:
+            self._check_version(corpus_version)
+            self._entries[key] = (answer, vector, signature(question), self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
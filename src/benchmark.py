@@ -0,0 +1,332 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+End-to-end benchmark of the pipeline on synthetic corpora of configurable size
+(by default 1k, 10k and 100k invoices). For each size it runs every stage in
+turn and records wall time, peak resident memory and throughput:
+
+- extract     PDF extraction with csv_builder (on a sample of rendered PDFs)
+- documents   invoice/attendance/summary records (invoice_documents)
+- chunking    chunking.iter_chunks
+- embedding   the embedding pipeline, with deterministic hashing embeddings
+- index       vectorstore sync into the memory-mapped index + the BM25 index
+- retrieval   hybrid search latency (p50 / p95) over sample questions
+- ask         full demo_ui_hybrid.ask_question latency against the fake Ollama server
+
+Everything runs offline (fake_embeddings.py, fake_ollama.py), and the corpus is
+seeded, so reports from different commits can be compared: --baseline prints
+each stage's change in wall time against an earlier report.
+
+Usage:
+    python src/benchmark.py --sizes 1000 10000 100000
+    python src/benchmark.py --sizes 1000 --baseline benchmark_report.json
+"""
+
+import io
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import platform
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+from itertools import islice
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import chunking
+import csv_builder
+import answer_cache
+import fake_embeddings
+import fake_ollama
+import hybrid_retrieval
+import invoice_documents
+import lexical_index
+import mmap_index
+import ollama_client
+import qa_chain
+import vectorstore_sync
+import embedding_pipeline
+import generate_invoices
+import demo_ui_hybrid as ui
+
+# --- Configuration ---
+default_sizes = [1_000, 10_000, 100_000]
+default_pdf_limit = 200     # PDFs rendered and extracted per size; extraction is reported per PDF
+default_queries = 50
+default_token_delay = 0.001  # fake LLM seconds per token
+report_file = "benchmark_report.json"
+model_name = fake_ollama.default_models[0]
+invoices_per_account = len(generate_invoices.years) * 12
+question_templates = [
+    "Tell me about invoice {number}.",
+    "What did {dog} do on {date}?",
+    "Which days did {dog} go to daycare in {month} {year}?",
+    "What discount does {dog} get and why?",
+    "Describe {dog}'s attendance pattern in {year}.",
+]
+
+
+# --- Memory ---
+def reset_peak_rss():
+    """Start a new peak-RSS window (Linux); elsewhere the peak covers the whole process."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextlib.contextmanager
+def stage(stages, name):
+    """Time the block; the block fills in "items" (and any extra metrics) on the yielded dict."""
+    result = {"items": 0}
+    reset_peak_rss()
+    start = time.perf_counter()
+    yield result
+    wall = time.perf_counter() - start
+    stages[name] = {"wall_s": round(wall, 3), "peak_rss_mb": round(peak_rss_mb(), 1), **result,
+                    "items_per_s": round(result["items"] / wall, 1) if wall else 0.0}
+
+
+def percentile_ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else 0.0
+
+
+# --- Synthetic corpus ---
+def invoice_plan(invoices, seed=0):
+    """The first `invoices` invoices generate_invoices plans, with as many client accounts as that takes."""
+    accounts = -(-invoices // invoices_per_account)
+    return list(islice(generate_invoices.iter_invoices(clients=accounts, seed=seed), invoices))
+
+
+def make_tables(plan):
+    """Invoice and attendance tables shaped like invoice_store.load_invoices() / load_attendance()."""
+    invoice_df = pd.DataFrame([{key: value for key, value in invoice.items() if key != "Dates"} for invoice in plan])
+    invoice_df["Year"] = invoice_df["Year"].astype(int)
+    invoice_df["TotalAmountDue"] = pd.to_numeric(invoice_df["TotalAmountDue"])
+    attendance_df = pd.DataFrame([{"InvoiceNumber": invoice["InvoiceNumber"], "Date": date_str,
+                                   "DogName": invoice["DogName"]} for invoice in plan for date_str in invoice["Dates"]])
+    attendance_df["ParsedDate"] = pd.to_datetime(attendance_df["Date"], format="%d/%m/%Y")
+    attendance_df.insert(2, "Day", attendance_df["ParsedDate"].dt.day_name())
+    return invoice_df, attendance_df
+
+
+def render_pdfs(plan, directory):
+    """Write the planned invoices as PDFs with generate_invoices; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    for invoice in plan:
+        generate_invoices.render(invoice, directory)
+    return csv_builder.list_invoice_pdfs(directory)
+
+
+def make_questions(plan, count, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        invoice = rng.choice(plan)
+        questions.append(rng.choice(question_templates).format(
+            number=invoice["InvoiceNumber"], date=rng.choice(invoice["Dates"]), dog=invoice["DogName"],
+            month=invoice["MonthBilledFor"], year=invoice["Year"]))
+    return questions
+
+
+class PrecomputedEmbeddings:
+    """Hands the index the vectors from the embedding stage, so the index stage does not time embedding."""
+
+    def __init__(self, texts, vectors, model):
+        self.rows = {text: row for row, text in enumerate(texts)}
+        self.vectors = vectors
+        self.model = model
+
+    def embed_documents(self, texts):
+        return self.vectors[[self.rows[text] for text in texts]]
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+# --- Stages ---
+async def ask_all(questions):
+    """(latencies, first-token latencies) for answering `questions` one after another."""
+    latencies, first_tokens = [], []
+    for question in questions:
+        start = time.perf_counter()
+        first = None
+        async for _ in ui.ask_question(model_name, question, True):
+            if first is None:
+                first = time.perf_counter() - start
+        latencies.append(time.perf_counter() - start)
+        first_tokens.append(first)
+    return latencies, first_tokens
+
+
+def run_size(invoices, directory, pdf_limit=default_pdf_limit, queries=default_queries, batch_size=64,
+             workers=1, extract_workers=1, token_delay=default_token_delay, seed=0):
+    stages = {}
+    plan = invoice_plan(invoices, seed)
+
+    if pdf_limit:
+        paths = render_pdfs(plan[:pdf_limit], os.path.join(directory, "invoices"))
+        with stage(stages, "extract") as result:
+            _, _, failures = csv_builder.extract_invoices(paths, workers=extract_workers)
+            result.update(items=len(paths), failures=len(failures))
+
+    invoice_df, attendance_df = make_tables(plan)
+
+    with stage(stages, "documents") as result:
+        records = list(invoice_documents.iter_records(invoice_df, attendance_df))
+        result["items"] = len(records)
+
+    with stage(stages, "chunking") as result:
+        chunks = list(chunking.iter_chunks(records))
+        result["items"] = len(chunks)
+    del records
+
+    model = fake_embeddings.HashingEmbeddings()
+    texts = [text for _, text, _ in chunks]
+    with stage(stages, "embedding") as result:
+        pipeline = embedding_pipeline.PipelineEmbeddings(fake_embeddings.HashingEmbeddings, batch_size, workers,
+                                                         report=None)
+        vectors = np.empty((len(texts), model.dim), dtype=np.float32)
+        try:
+            for start in range(0, len(texts), vectorstore_sync.write_batch_size):
+                batch = texts[start:start + vectorstore_sync.write_batch_size]
+                vectors[start:start + len(batch)] = pipeline.embed_documents(batch)
+        finally:
+            pipeline.close()
+        result["items"] = len(texts)
+
+    store = os.path.join(directory, "store")
+    with stage(stages, "index") as result:
+        vectorstore = mmap_index.MmapVectorIndex(store, PrecomputedEmbeddings(texts, vectors, model))
+        lexical = lexical_index.LexicalIndexBuilder()
+        vectorstore_sync.sync_vectorstore(vectorstore, lexical.track(iter(chunks)))
+        vectorstore.persist()
+        index = lexical.build()
+        index.save(store)
+        result["items"] = len(chunks)
+    del texts, vectors
+
+    questions = make_questions(plan, queries, seed)
+    search = hybrid_retrieval.HybridSearch(index, vectorstore)
+    with stage(stages, "retrieval") as result:
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            search.search(question, chunking.metadata_filter(question))
+            latencies.append(time.perf_counter() - start)
+        result.update(items=len(questions), p50_ms=percentile_ms(latencies, 50), p95_ms=percentile_ms(latencies, 95))
+
+    server = fake_ollama.start_server(token_delay=token_delay)
+    client = ollama_client.OllamaClient(server.base_url)
+    # Point the UI module at the benchmark corpus; its own state is restored afterwards.
+    benchmark_ui = mock.patch.multiple(
+        ui, client=client, embedding=model, vectorstore=vectorstore, hybrid=search,
+        chains=qa_chain.ChainPool(client, search), answers=answer_cache.AnswerCache(max_entries=0), router=None,
+        persist_directory=store)
+    try:
+        with benchmark_ui, stage(stages, "ask") as result, contextlib.redirect_stdout(io.StringIO()):
+            latencies, first_tokens = asyncio.run(ask_all(questions))
+            result.update(items=len(questions), p50_ms=percentile_ms(latencies, 50),
+                          p95_ms=percentile_ms(latencies, 95), first_token_p50_ms=percentile_ms(first_tokens, 50),
+                          first_token_p95_ms=percentile_ms(first_tokens, 95))
+    finally:
+        client.close()
+        server.shutdown()
+
+    return {"invoices": invoices, "attendance_rows": len(attendance_df), "chunks": len(chunks), "stages": stages}
+
+
+def run(sizes=default_sizes, pdf_limit=default_pdf_limit, queries=default_queries, batch_size=64, workers=1,
+        extract_workers=1, token_delay=default_token_delay, seed=0):
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"pdf_limit": pdf_limit, "queries": queries, "batch_size": batch_size, "workers": workers,
+                     "extract_workers": extract_workers, "token_delay": token_delay, "seed": seed},
+        "sizes": {},
+    }
+    for invoices in sizes:
+        directory = tempfile.mkdtemp(prefix="invoice_benchmark_")
+        try:
+            report["sizes"][str(invoices)] = run_size(invoices, directory, pdf_limit, queries, batch_size, workers,
+                                                      extract_workers, token_delay, seed)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def compare(report, baseline):
+    """Lines giving each stage's wall-time change against `baseline`, for sizes and stages both reports have."""
+    lines = []
+    for size, result in report["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if not previous:
+            continue
+        for name, measured in result["stages"].items():
+            before = previous["stages"].get(name, {}).get("wall_s")
+            if before:
+                change = (measured["wall_s"] - before) / before
+                lines.append(f"{'⚠️' if change > 0.1 else '✅'} {size} invoices, {name}: "
+                             f"{before:.3f}s -> {measured['wall_s']:.3f}s ({change:+.0%})")
+    return lines
+
+
+def print_report(report):
+    for size, result in report["sizes"].items():
+        print(f"📄 {size} invoices ({result['attendance_rows']} attendance rows, {result['chunks']} chunks)")
+        for name, measured in result["stages"].items():
+            latency = f", p50 {measured['p50_ms']} ms, p95 {measured['p95_ms']} ms" if "p50_ms" in measured else ""
+            print(f"   {name:<10} {measured['wall_s']:>8.3f}s  {measured['items_per_s']:>10.1f}/s  "
+                  f"peak RSS {measured['peak_rss_mb']:.0f} MB{latency}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="Corpus sizes in invoices.")
+    parser.add_argument("--pdf-limit", type=int, default=default_pdf_limit,
+                        help="PDFs rendered and extracted per size (0 skips extraction; default: %(default)s).")
+    parser.add_argument("--queries", type=int, default=default_queries, help="Questions for the latency stages.")
+    parser.add_argument("--batch-size", type=int, default=embedding_pipeline.default_batch_size,
+                        help="Chunks per embedding model batch.")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Embedding processes.")
+    parser.add_argument("--extract-workers", type=int, default=1, help="PDF extraction processes.")
+    parser.add_argument("--token-delay", type=float, default=default_token_delay, help="Fake LLM seconds per token.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=report_file, help="Where to write the JSON report (default: %(default)s).")
+    parser.add_argument("--baseline", help="Earlier report to compare wall times against.")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.pdf_limit, args.queries, args.batch_size, args.embed_workers,
+                 args.extract_workers, args.token_delay, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"✅ Report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines = compare(report, json.load(f))
+        print("\n".join(lines) if lines else "⚠️ No sizes in common with the baseline.")
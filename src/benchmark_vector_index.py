@@ -0,0 +1,207 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Compares the memory-mapped vector index (mmap_index.py, float16 and int8) with
+Chroma on a synthetic corpus: recall@k against exact float32 search, query
+latency (p50 / p95), time to open the store and resident memory after the
+queries. Each store is built and queried in its own subprocess so their memory
+use does not mix. Chroma is skipped if chromadb is not installed.
+
+Usage:
+    python src/benchmark_vector_index.py --chunks 100000 --dim 384 --queries 200
+    python src/benchmark_vector_index.py --filtered   # queries restricted to one year
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+import numpy as np
+
+# --- Configuration ---
+backends = ["mmap-float16", "mmap-int8", "chroma"]
+years = list(range(2017, 2025))
+chroma_batch_size = 5000
+
+
+def make_dataset(directory, chunks, dim, queries, seed=0):
+    """Clustered unit vectors (like real embeddings, which are far from uniform) plus queries near them."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(chunks // 500, 1), dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), chunks)] + 0.6 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.integers(0, chunks, queries)
+    query_vectors = vectors[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    np.save(os.path.join(directory, "vectors.npy"), vectors)
+    np.save(os.path.join(directory, "queries.npy"), query_vectors)
+    np.save(os.path.join(directory, "years.npy"), rng.choice(years, chunks).astype(np.int32))
+    np.save(os.path.join(directory, "query_years.npy"), rng.choice(years, queries).astype(np.int32))
+
+
+def exact_top_k(directory, k, filtered):
+    vectors = np.load(os.path.join(directory, "vectors.npy"))
+    queries = np.load(os.path.join(directory, "queries.npy"))
+    chunk_years = np.load(os.path.join(directory, "years.npy"))
+    query_years = np.load(os.path.join(directory, "query_years.npy"))
+    truth = []
+    for query, year in zip(queries, query_years):
+        rows = np.flatnonzero(chunk_years == year) if filtered else np.arange(len(vectors))
+        scores = vectors[rows] @ query
+        truth.append(set(rows[np.argsort(-scores)[:k]].tolist()))
+    return truth
+
+
+def resident_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PrecomputedEmbeddings:
+    """Embeds the text "chunk <i>" as row i of the dataset, so both stores index identical vectors."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return self.vectors[[int(text.split()[1]) for text in texts]]
+
+
+# --- Workers (run in subprocesses) ---
+def build(backend, data, store):
+    vectors = np.load(os.path.join(data, "vectors.npy"))
+    chunk_years = np.load(os.path.join(data, "years.npy"))
+    ids = [f"chunk:{i}" for i in range(len(vectors))]
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+    metadatas = [{"year": int(year)} for year in chunk_years]
+    if backend.startswith("mmap"):
+        import mmap_index
+        index = mmap_index.MmapVectorIndex(store, PrecomputedEmbeddings(vectors), backend.split("-")[1])
+        index.add_texts(texts, metadatas, ids)
+        index.persist()
+    else:
+        import chromadb
+        collection = chromadb.PersistentClient(path=store).get_or_create_collection(
+            "benchmark", metadata={"hnsw:space": "cosine"})
+        for start in range(0, len(ids), chroma_batch_size):
+            end = start + chroma_batch_size
+            collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                           metadatas=metadatas[start:end], documents=texts[start:end])
+
+
+def query(backend, data, store, k, filtered):
+    queries = np.load(os.path.join(data, "queries.npy"))
+    query_years = np.load(os.path.join(data, "query_years.npy"))
+    start = time.perf_counter()
+    if backend.startswith("mmap"):
+        import mmap_index
+        index = mmap_index.MmapVectorIndex(store)
+
+        def search(vector, where):
+            return [row for row, _ in index.search_rows(vector, k, where)]
+    else:
+        import chromadb
+        collection = chromadb.PersistentClient(path=store).get_collection("benchmark")
+
+        def search(vector, where):
+            result = collection.query(query_embeddings=[vector.tolist()], n_results=k, where=where)
+            return [int(cid.split(":")[1]) for cid in result["ids"][0]]
+    open_ms = (time.perf_counter() - start) * 1000
+
+    latencies, results = [], []
+    for vector, year in zip(queries, query_years):
+        where = {"year": int(year)} if filtered else None
+        start = time.perf_counter()
+        results.append(search(vector, where))
+        latencies.append(time.perf_counter() - start)
+    return {"open_ms": open_ms, "latencies": latencies, "results": results, "rss_mb": resident_mb()}
+
+
+def run_worker(command, backend, data, store, k=10, filtered=False):
+    args = [sys.executable, os.path.abspath(__file__), "--worker", command, "--backend", backend,
+            "--data", data, "--store", store, "--k", str(k)] + (["--filtered"] if filtered else [])
+    completed = subprocess.run(args, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "worker failed")
+    return json.loads(completed.stdout) if command == "query" else None
+
+
+def run(chunks=100_000, dim=384, queries=200, k=10, filtered=False, seed=0):
+    data = tempfile.mkdtemp(prefix="vector_benchmark_")
+    report = {"chunks": chunks, "dim": dim, "queries": queries, "k": k, "filtered": filtered, "backends": {}}
+    try:
+        make_dataset(data, chunks, dim, queries, seed)
+        truth = exact_top_k(data, k, filtered)
+        for backend in backends:
+            store = os.path.join(data, backend)
+            try:
+                start = time.perf_counter()
+                run_worker("build", backend, data, store)
+                build_s = time.perf_counter() - start
+                measured = run_worker("query", backend, data, store, k, filtered)
+            except RuntimeError as e:
+                report["backends"][backend] = {"skipped": str(e)}
+                continue
+            recall = np.mean([len(set(found) & expected) / max(len(expected), 1)
+                              for found, expected in zip(measured["results"], truth)])
+            report["backends"][backend] = {
+                "build_s": round(build_s, 2),
+                "open_ms": round(measured["open_ms"], 1),
+                "recall_at_k": round(float(recall), 4),
+                "p50_ms": round(float(np.percentile(measured["latencies"], 50)) * 1000, 2),
+                "p95_ms": round(float(np.percentile(measured["latencies"], 95)) * 1000, 2),
+                "rss_mb": round(measured["rss_mb"], 1),
+                "disk_mb": round(sum(os.path.getsize(os.path.join(root, name))
+                                     for root, _, names in os.walk(store) for name in names) / 2 ** 20, 1),
+            }
+    finally:
+        shutil.rmtree(data, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the memory-mapped vector index against Chroma.")
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--filtered", action="store_true", help="Restrict every query to one year's chunks.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    parser.add_argument("--worker", choices=["build", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--store", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == "build":
+        build(args.backend, args.data, args.store)
+    elif args.worker == "query":
+        print(json.dumps(query(args.backend, args.data, args.store, args.k, args.filtered)))
+    else:
+        report = run(args.chunks, args.dim, args.queries, args.k, args.filtered)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(f"🔢 {report['chunks']} chunks x {report['dim']} dims, {report['queries']} queries, "
+                  f"k={report['k']}{' (filtered by year)' if report['filtered'] else ''}")
+            for backend, result in report["backends"].items():
+                if "skipped" in result:
+                    print(f"⚠️ {backend}: skipped ({result['skipped']})")
+                    continue
+                print(f"✅ {backend}: recall@k {result['recall_at_k']:.3f}, p50 {result['p50_ms']} ms, "
+                      f"p95 {result['p95_ms']} ms, open {result['open_ms']} ms, RSS {result['rss_mb']} MB, "
+                      f"disk {result['disk_mb']} MB, build {result['build_s']} s")
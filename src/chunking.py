@@ -0,0 +1,134 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Record-aware chunking for the vectorstore. Instead of joining every document into
+one string and re-splitting it with overlapping windows, each record from
+invoice_documents.py is packed line by line into chunks of up to `chunk_size`
+characters. A line (one invoice, one attendance date, one summary fact) is never
+cut in half unless it is longer than a chunk on its own, no text is duplicated by
+overlaps, and every chunk carries its record's metadata:
+
+    record_type     invoice / attendance / summary
+    invoice_number  e.g. INV-2021-07, or INV-2021-07-0042 with an account suffix
+    year, month     billing year and month of the invoice
+    dog             dog name
+    client          client name (per-dog summary records)
+
+The metadata lets retrieval filter candidates (see metadata_filter) so a question
+about one invoice or one year only searches the matching chunks.
+"""
+
+import re
+import json
+import calendar
+import hashlib
+
+# --- Configuration ---
+default_chunk_size = 500
+
+invoice_number_pattern = re.compile(r"\bINV-\d{4}-\d{2}(?:-\d+)?\b", re.IGNORECASE)
+year_pattern = re.compile(r"\b(19\d{2}|20\d{2})\b")
+month_names = "|".join(calendar.month_name[1:])
+# A month name in any case next to a day or year number ("may 2019", "3 March"), or a
+# capitalised one inside a sentence; so "May I ask..." or "you may" is not the month May.
+month_pattern = re.compile(rf"((?i:\b(?:{month_names})\b)(?=\s+\d)|(?<=\d\s)(?i:\b(?:{month_names})\b)"
+                           rf"|(?<=[\w,]\s)\b(?:{month_names})\b)")
+
+
+def content_hash(text, metadata):
+    payload = text + "\0" + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(record_key, index, text, metadata):
+    """Deterministic chunk ID: source record, position within the record, content (and metadata) hash."""
+    return f"{record_key}:{index}:{content_hash(text, metadata)}"
+
+
+def _split_long_line(line, chunk_size):
+    """Fallback for a single line longer than a chunk: split on whitespace."""
+    pieces, current = [], ""
+    for word in line.split(" "):
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > chunk_size and current:
+            pieces.append(current)
+            candidate = word
+        while len(candidate) > chunk_size:
+            pieces.append(candidate[:chunk_size])
+            candidate = candidate[chunk_size:]
+        current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def pack_lines(lines, chunk_size=default_chunk_size):
+    """Greedily pack whole lines (joined with newlines) into chunks of at most `chunk_size` characters."""
+    chunks, current = [], []
+    length = 0
+    for line in lines:
+        if len(line) > chunk_size:
+            if current:
+                chunks.append("\n".join(current))
+                current, length = [], 0
+            chunks.extend(_split_long_line(line, chunk_size))
+            continue
+        added = len(line) + (1 if current else 0)
+        if current and length + added > chunk_size:
+            chunks.append("\n".join(current))
+            current, length = [], 0
+            added = len(line)
+        current.append(line)
+        length += added
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def iter_chunks(records, chunk_size=default_chunk_size):
+    """
+    Turn (record_key, lines, metadata) records into (chunk_id, text, metadata) chunks.
+
+    `records` may be any iterable (e.g. invoice_documents.iter_records), so the
+    corpus is never held in memory as a whole.
+    """
+    for record_key, lines, metadata in records:
+        for index, text in enumerate(pack_lines(lines, chunk_size)):
+            chunk_metadata = {**metadata, "record_key": record_key, "chunk": index}
+            yield chunk_id(record_key, index, text, chunk_metadata), text, chunk_metadata
+
+
+def metadata_filter(query):
+    """
+    Chroma `where` filter implied by the question, or None to search everything.
+
+    An invoice number restricts the search to that invoice's chunks. A single year
+    (optionally with a month name) restricts it to that period's chunks, while
+    keeping the whole-history summary chunks in play.
+    """
+    numbers = {number.upper() for number in invoice_number_pattern.findall(query)}
+    if len(numbers) == 1:
+        return {"invoice_number": numbers.pop()}
+
+    years = set(year_pattern.findall(query))
+    if len(years) != 1:
+        return None
+    conditions = [{"year": int(years.pop())}]
+    months = {month.capitalize() for month in month_pattern.findall(query)}
+    if len(months) == 1:
+        conditions.append({"month": months.pop()})
+    period = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    return {"$or": [period, {"record_type": "summary"}]}
+
+
+def matches(metadata, where):
+    """Evaluate a filter from metadata_filter against one chunk's metadata (for searches outside Chroma)."""
+    if not where:
+        return True
+    if "$or" in where:
+        return any(matches(metadata, condition) for condition in where["$or"])
+    if "$and" in where:
+        return all(matches(metadata, condition) for condition in where["$and"])
+    return all(metadata.get(key) == value for key, value in where.items())
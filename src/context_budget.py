@@ -0,0 +1,120 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Chooses which retrieved chunks go into the prompt, so Ollama does not have to
+prefill context that adds nothing. From the fused, scored candidates of
+HybridSearch.search_scored():
+
+1. adaptive k: candidates whose relevance (from the retrievers' raw BM25 and
+   dense scores, see HybridSearch.search_scored) is below `min_relative_score` x
+   the best are dropped, so a question with one clearly relevant chunk sends one;
+2. near duplicates (chunks whose word shingles are mostly contained in a chunk
+   already chosen) are removed;
+3. the rest are picked by maximal marginal relevance (MMR), trading relevance
+   against similarity to what is already picked, until the model's token budget
+   or `max_chunks` is reached.
+
+Token counts are estimates (words and punctuation marks); the exact prompt
+token count reported by Ollama is recorded by ollama_client after generation.
+"""
+
+import re
+
+# --- Configuration ---
+default_token_budget = 1200   # context tokens; Ollama's default context window is 2048 tokens
+model_token_budgets = {       # per model family (the part of the name before ':')
+    "llama3": 1500,
+    "mistral": 1500,
+    "openchat": 1200,
+    "deepseek-coder": 1200,
+}
+max_chunks = 4                # no more than HybridSearch.search() hands over
+min_relative_score = 0.5      # adaptive k: keep candidates scoring at least this fraction of the best
+duplicate_threshold = 0.9     # share of a chunk's shingles already in a chosen chunk that makes it a duplicate
+mmr_lambda = 0.7              # 1.0 = relevance only, 0.0 = diversity only
+shingle_size = 3
+
+token_pattern = re.compile(r"\w+|[^\w\s]")
+word_pattern = re.compile(r"\w+")
+
+
+def count_tokens(text):
+    """Estimated token count of `text`."""
+    return len(token_pattern.findall(text))
+
+
+def token_budget(model):
+    """Context token budget for `model` (e.g. 'llama3:instruct')."""
+    return model_token_budgets.get((model or "").split(":")[0], default_token_budget)
+
+
+def shingles(text, size=shingle_size):
+    words = word_pattern.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def containment(a, b):
+    """Share of shingle set `a` that also appears in `b`."""
+    return len(a & b) / len(a) if a else 1.0
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def relevant(candidates, threshold=min_relative_score):
+    """Adaptive k: the (text, metadata, score) candidates scoring at least `threshold` x the best."""
+    if not candidates:
+        return []
+    top = max(score for _, _, score in candidates)
+    return [candidate for candidate in candidates if candidate[2] >= threshold * top]
+
+
+def remove_near_duplicates(candidates, threshold=duplicate_threshold):
+    """Drop candidates mostly contained in (or containing) a better-scored one; keeps the order."""
+    kept, kept_shingles = [], []
+    for candidate in candidates:
+        candidate_shingles = shingles(candidate[0])
+        if any(containment(candidate_shingles, other) >= threshold
+               or containment(other, candidate_shingles) >= threshold for other in kept_shingles):
+            continue
+        kept.append(candidate)
+        kept_shingles.append(candidate_shingles)
+    return kept
+
+
+def build_context(candidates, budget=default_token_budget, limit=max_chunks, diversity=mmr_lambda):
+    """
+    Pick chunks from scored `candidates` (best first) within `budget` tokens.
+    Returns (chosen (text, metadata) pairs in the order picked, stats).
+    """
+    kept = relevant(candidates)
+    pool = remove_near_duplicates(kept)
+    stats = {"candidates": len(candidates), "relevant": len(kept), "duplicates": len(kept) - len(pool),
+             "chunks": 0, "context_tokens": 0}
+    if not pool:
+        return [], stats
+
+    top = max(score for _, _, score in pool) or 1.0
+    pool_shingles = [shingles(text) for text, _, _ in pool]
+    tokens = [count_tokens(text) for text, _, _ in pool]
+    remaining = list(range(len(pool)))
+    chosen, used = [], 0
+    while remaining and len(chosen) < limit:
+        def marginal(i):
+            redundancy = max((jaccard(pool_shingles[i], pool_shingles[j]) for j in chosen), default=0.0)
+            return diversity * pool[i][2] / top - (1 - diversity) * redundancy
+
+        best = max(remaining, key=marginal)
+        remaining.remove(best)
+        if used + tokens[best] > budget:
+            continue  # a shorter candidate may still fit
+        chosen.append(best)
+        used += tokens[best]
+
+    stats.update(chunks=len(chosen), context_tokens=used)
+    return [pool[i][:2] for i in chosen], stats
@@ -3,19 +3,46 @@ Author: Andrew Buchanan
 Date: 26/04/2025
 
 Purpose:
-This script reads the generated PDF invoices from the 'invoices' directory, 
-extracts structured data (such as client name, service provider, dates attended, etc.), 
-and saves it into two CSV files: 'invoice_summary.csv' and 'attendance_detail.csv'. 
+This script reads the generated PDF invoices from the 'invoices' directory,
+extracts structured data (such as client name, service provider, dates attended, etc.),
+and saves it into two CSV files: 'invoice_summary.csv' and 'attendance_detail.csv'.
 These CSVs are later used to build the vectorstore and provide context for the AI Q&A system.
+
+Runs are incremental: 'invoice_manifest.json' records each PDF's size, mtime and
+content hash, so only new or changed PDFs are extracted and their rows upserted.
+Large backfills can be spread across several processes with --workers; results are
+merged back in sorted filename order, and PDFs that fail or hang are reported and skipped.
+With --format parquet/both the rows are also written to the typed, year-partitioned
+store in 'invoice_store/' (see invoice_store.py). The rollup tables in 'rollups/'
+(see rollups.py) are updated with just the invoices that changed.
+
+Extraction streams: pages are read one at a time and released, lines are matched
+against one combined pattern for every invoice field, attendance dates are only
+taken from the attendance table (between 'Attendance Date' and 'Original Cost Per
+Day'), and reading stops as soon as every field and the table have been seen. Each
+run writes 'extraction_report.json' with every PDF's timing, pages read and
+missing fields.
 """
 
 import os
 import sys
+import json
+import hashlib
+import signal
+import time
+import threading
+import argparse
+import multiprocessing
 import pdfplumber
+from pdfplumber.page import Page
+from pdfminer.pdfpage import PDFPage
 import pandas as pd
 import re
 from datetime import datetime
 import contextlib
+import invoice_store
+import rollups
+import tracing
 
 @contextlib.contextmanager
 def suppress_stderr_real():
@@ -34,84 +61,510 @@ def suppress_stderr_real():
 invoice_dir = "invoices"
 summary_csv = "invoice_summary.csv"
 attendance_csv = "attendance_detail.csv"
+manifest_json = "invoice_manifest.json"
+manifest_version = 1
+report_json = "extraction_report.json"
+
+# Parallel extraction settings
+default_workers = 1          # 1 = extract in this process, no pool
+default_chunk_size = 16      # PDFs handed to a worker per task
+default_timeout = 60         # seconds allowed per PDF before it is skipped
+default_format = "csv"       # "csv", "parquet" or "both"
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a single PDF takes longer than the allowed time."""
 
-# Lists to collect data
-summary_data = []
-attendance_data = []
 
+@contextlib.contextmanager
+def time_limit(seconds):
+    """Raise ExtractionTimeout if the block runs longer than `seconds` (POSIX main thread only)."""
+    if (not seconds or not hasattr(signal, "SIGALRM")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
 
-# Read invoices
-for filename in sorted(os.listdir(invoice_dir)):
-    if filename.endswith(".pdf"):
-        invoice_path = os.path.join(invoice_dir, filename)
-        with suppress_stderr_real():  # <-- TRUE suppression
-            with pdfplumber.open(invoice_path) as pdf:
-                text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+    def _on_alarm(signum, frame):
+        raise ExtractionTimeout(f"timed out after {seconds}s")
 
-        # Extract fields
-        def extract_field(pattern, text, default=""):
-            match = re.search(pattern, text)
-            return match.group(1).strip() if match else default
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(int(seconds))
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
 
-        invoice_number = extract_field(r"Invoice Number:\s*(.+)", text)
-        service_provider_name = extract_field(r"Service Provider Name:\s*(.+)", text)
-        service_provider_address = extract_field(r"Service Provider Address:\s*(.+)", text)
-        client_name = extract_field(r"Client Name:\s*(.+)", text)
-        client_address = extract_field(r"Client Address:\s*(.+)", text)
-        
-        month = extract_field(r"Month Billed For:\s*(\w+)", text)
-        year = extract_field(r"Invoice Number:\s*INV-(\d{4})", text)
-        month_billed_for = f"{month} {year}"
 
+# --- Template-aware extraction ---
+# One pattern for every labelled field; match.lastgroup names the field found.
+field_pattern = re.compile(
+    r"Invoice Number:\s*(?P<InvoiceNumber>.+)"
+    r"|Service Provider Name:\s*(?P<ServiceProviderName>.+)"
+    r"|Service Provider Address:\s*(?P<ServiceProviderAddress>.+)"
+    r"|Client Name:\s*(?P<ClientName>.+)"
+    r"|Client Address:\s*(?P<ClientAddress>.+)"
+    r"|Month Billed For:\s*(?P<MonthBilledFor>\w+)"
+    r"|Dog Name:\s*(?P<DogName>.+)"
+    r"|Original Cost Per Day:\s*\$(?P<OriginalCostPerDay>\d+\.\d{2})"
+    r"|Percentage Discount:\s*(?P<PercentageDiscount>\d+)%"
+    r"|Total Amount Due:\s*\$(?P<TotalAmountDue>\d+\.\d{2})"
+)
+invoice_fields = tuple(field_pattern.groupindex)
+table_start = "Attendance Date"
+table_end = "Original Cost Per Day"
+date_pattern = re.compile(r"\b(\d{2}/\d{2}/\d{4})\b")
+year_pattern = re.compile(r"INV-(\d{4})")
 
 
-        dog_name = extract_field(r"Dog Name:\s*(.+)", text)
-        original_cost_per_day = extract_field(r"Original Cost Per Day:\s*\$(\d+\.\d{2})", text)
-        percentage_discount = extract_field(r"Percentage Discount:\s*(\d+)%", text)
-        total_amount_due = extract_field(r"Total Amount Due:\s*\$(\d+\.\d{2})", text)
+def iter_pdf_lines(invoice_path, stats=None):
+    """
+    Yield the text lines of a PDF page by page. Pages are opened lazily and closed
+    once read, so memory does not grow with the page count; `stats["pages"]` counts
+    the pages read.
+    """
+    with suppress_stderr_real():  # <-- TRUE suppression
+        with pdfplumber.open(invoice_path) as pdf:
+            doctop = 0
+            for number, page_obj in enumerate(PDFPage.create_pages(pdf.doc), start=1):
+                page = Page(pdf, page_obj, page_number=number, initial_doctop=doctop)
+                doctop += page.height
+                text = page.extract_text()
+                page.close()
+                if stats is not None:
+                    stats["pages"] = number
+                if text:
+                    yield from text.splitlines()
 
-        # Extract all dates attended
-        dates_attended = re.findall(r"\b(\d{2}/\d{2}/\d{4})\b", text)
 
-        # Parse month and year
+def parse_invoice_lines(lines):
+    """
+    Turn the lines of one invoice into (fields, dates). Stops consuming `lines` once
+    every field has been found and the attendance table has ended.
+    """
+    fields = {}
+    dates = []
+    in_table = table_seen = False
+    for line in lines:
+        if in_table:
+            if table_end not in line:
+                dates.extend(date_pattern.findall(line))
+                continue
+            in_table = False
+        elif not table_seen and line.startswith(table_start):
+            in_table = table_seen = True
+            continue
+        match = field_pattern.search(line)
+        if match and match.lastgroup not in fields:
+            fields[match.lastgroup] = match.group(match.lastgroup).strip()
+            if table_seen and len(fields) == len(invoice_fields):
+                break
+    return fields, dates
+
+
+def build_rows(fields, dates):
+    """The summary row and attendance rows for one invoice's parsed fields and dates."""
+    invoice_number = fields.get("InvoiceNumber", "")
+    year = year_pattern.search(invoice_number)
+    month = fields.get("MonthBilledFor", "")
+    billing_month, billing_year = (month, year.group(1)) if month and year else ("", "")
+    dog_name = fields.get("DogName", "")
+    summary = {
+        "InvoiceNumber": invoice_number,
+        "ServiceProviderName": fields.get("ServiceProviderName", ""),
+        "ServiceProviderAddress": fields.get("ServiceProviderAddress", ""),
+        "ClientName": fields.get("ClientName", ""),
+        "ClientAddress": fields.get("ClientAddress", ""),
+        "MonthBilledFor": billing_month,
+        "Year": billing_year,
+        "DogName": dog_name,
+        "OriginalCostPerDay": fields.get("OriginalCostPerDay", ""),
+        "PercentageDiscount": fields.get("PercentageDiscount", ""),
+        "TotalAmountDue": fields.get("TotalAmountDue", ""),
+        "DatesAttendedCount": len(dates)
+    }
+
+    attendance = []
+    for date_str in dates:
         try:
-            billing_month, billing_year = month_billed_for.split()
-        except ValueError:
-            billing_month, billing_year = ("", "")
-
-        # Save invoice summary
-        summary_data.append({
-            "InvoiceNumber": invoice_number,
-            "ServiceProviderName": service_provider_name,
-            "ServiceProviderAddress": service_provider_address,
-            "ClientName": client_name,
-            "ClientAddress": client_address,
-            "MonthBilledFor": billing_month,
-            "Year": billing_year,
-            "DogName": dog_name,
-            "OriginalCostPerDay": original_cost_per_day,
-            "PercentageDiscount": percentage_discount,
-            "TotalAmountDue": total_amount_due,
-            "DatesAttendedCount": len(dates_attended)
-        })
-
-        # Save attendance details
-        for date_str in dates_attended:
+            dt = datetime.strptime(date_str, "%d/%m/%Y")
+            attendance.append({
+                "InvoiceNumber": invoice_number,
+                "Date": date_str,
+                "Day": dt.strftime("%A"),
+                "DogName": dog_name
+            })
+        except Exception as e:
+            print(f"⚠️ Error parsing date {date_str}: {e}")
+
+    return summary, attendance
+
+
+def parse_invoice_text(text):
+    """Turn the text of one invoice into a summary row and its attendance rows."""
+    return build_rows(*parse_invoice_lines(text.splitlines()))
+
+
+def extract_invoice_report(invoice_path):
+    """
+    Extract one PDF. Returns (summary, attendance, report), where the report holds
+    the time taken, pages read and any fields not found.
+    """
+    start = time.perf_counter()
+    stats = {"pages": 0}
+    lines = iter_pdf_lines(invoice_path, stats)
+    try:
+        fields, dates = parse_invoice_lines(lines)
+    finally:
+        lines.close()  # closes the PDF if parsing stopped early
+    summary, attendance = build_rows(fields, dates)
+    report = {"ms": round((time.perf_counter() - start) * 1000, 1), "pages": stats["pages"],
+              "dates": len(dates), "missing": [field for field in invoice_fields if field not in fields]}
+    return summary, attendance, report
+
+
+def extract_invoice(invoice_path):
+    """Extract the summary row and attendance rows from a single PDF."""
+    summary, attendance, _ = extract_invoice_report(invoice_path)
+    return summary, attendance
+
+
+def _extract_chunk(invoice_paths, timeout):
+    """Worker task: extract a chunk of PDFs, capturing per-file failures instead of raising."""
+    results = []
+    for invoice_path in invoice_paths:
+        try:
+            with time_limit(timeout):
+                summary, attendance, report = extract_invoice_report(invoice_path)
+            results.append((invoice_path, summary, attendance, None, report))
+        except Exception as e:
+            results.append((invoice_path, None, [], f"{type(e).__name__}: {e}", None))
+    return results
+
+
+def list_invoice_pdfs(directory=invoice_dir):
+    """Return the PDF paths in `directory`, sorted by filename."""
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.endswith(".pdf")
+    ]
+
+
+def iter_extraction_results(invoice_paths, workers=default_workers, chunk_size=default_chunk_size,
+                            timeout=default_timeout):
+    """
+    Yield (path, summary, attendance, error, report) for every PDF in sorted filename
+    order, regardless of how many workers were used. `error` is set, and the rows
+    are empty and the report None, for PDFs that raised or exceeded `timeout` seconds.
+    """
+    invoice_paths = sorted(invoice_paths, key=os.path.basename)
+    chunk_size = max(1, chunk_size)
+    chunks = [invoice_paths[i:i + chunk_size] for i in range(0, len(invoice_paths), chunk_size)]
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _extract_chunk(chunk, timeout)
+        return
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        pending = [pool.apply_async(_extract_chunk, (chunk, timeout)) for chunk in chunks]
+        for chunk, result in zip(chunks, pending):
+            # Guard against a worker that dies or ignores the per-file alarm.
+            chunk_timeout = timeout * len(chunk) + timeout if timeout else None
             try:
-                dt = datetime.strptime(date_str, "%d/%m/%Y")
-                attendance_data.append({
-                    "InvoiceNumber": invoice_number,
-                    "Date": date_str,
-                    "Day": dt.strftime("%A"),
-                    "DogName": dog_name
-                })
+                yield from result.get(chunk_timeout)
+            except multiprocessing.TimeoutError:
+                yield from ((path, None, [], "worker did not respond", None) for path in chunk)
             except Exception as e:
-                print(f"⚠️ Error parsing date {date_str}: {e}")
+                yield from ((path, None, [], f"{type(e).__name__}: {e}", None) for path in chunk)
+        # Leaving the block terminates any worker still stuck on a hung PDF.
+
+
+def extract_invoices(invoice_paths, workers=default_workers, chunk_size=default_chunk_size,
+                     timeout=default_timeout):
+    """
+    Extract every PDF in `invoice_paths`.
+
+    Returns (summary_data, attendance_data, failures) with rows in sorted filename
+    order; `failures` lists (path, reason) for PDFs that could not be read.
+    """
+    summary_data = []
+    attendance_data = []
+    failures = []
+    for invoice_path, summary, attendance, error, _ in iter_extraction_results(
+            invoice_paths, workers=workers, chunk_size=chunk_size, timeout=timeout):
+        if error:
+            failures.append((invoice_path, error))
+            continue
+        summary_data.append(summary)
+        attendance_data.extend(attendance)
+
+    return summary_data, attendance_data, failures
+
+
+# --- Incremental manifest ---
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_format=default_format, path=manifest_json):
+    """Return the manifest's file entries, or an empty dict if there is no usable manifest."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != manifest_version or manifest.get("format") != output_format:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(files, output_format=default_format, path=manifest_json):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": manifest_version, "format": output_format, "files": files}, f,
+                  indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan_changes(invoice_paths, manifest):
+    """
+    Compare the PDFs on disk with the manifest.
+
+    Returns (entries, changed, deleted): `entries` is the manifest carried forward for
+    unchanged files, `changed` lists new or modified paths with their fresh fingerprint,
+    and `deleted` lists manifest paths no longer on disk. Files whose size and mtime
+    are unchanged are trusted without being hashed.
+    """
+    entries = {}
+    changed = []
+    for invoice_path in invoice_paths:
+        stat = os.stat(invoice_path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        previous = manifest.get(invoice_path)
+        if previous and all(previous.get(k) == v for k, v in fingerprint.items()):
+            entries[invoice_path] = previous
+            continue
+        fingerprint["sha256"] = file_sha256(invoice_path)
+        if previous and previous.get("sha256") == fingerprint["sha256"]:
+            entries[invoice_path] = {**previous, **fingerprint}  # touched, not modified
+            continue
+        changed.append((invoice_path, fingerprint))
+
+    current = set(invoice_paths)
+    deleted = [path for path in manifest if path not in current]
+    return entries, changed, deleted
+
+
+def coverage_summary(reports):
+    """Share of extracted PDFs in which each field was found, plus the slowest PDF."""
+    extracted = {path: report for path, report in reports.items() if "missing" in report}
+    coverage = {field: round(sum(field not in report["missing"] for report in extracted.values())
+                             / len(extracted), 4)
+                for field in invoice_fields} if extracted else {}
+    slowest = max(extracted, key=lambda path: extracted[path]["ms"], default=None)
+    return {"files": len(reports), "failed": len(reports) - len(extracted), "coverage": coverage,
+            "slowest": slowest, "slowest_ms": extracted[slowest]["ms"] if slowest else 0.0}
+
+
+def save_report(reports, path=report_json):
+    """Write the per-PDF extraction report and print any field coverage gaps."""
+    summary = coverage_summary(reports)
+    with open(path, "w") as f:
+        json.dump({"summary": summary, "files": reports}, f, indent=1, sort_keys=True)
+    gaps = {field: share for field, share in summary["coverage"].items() if share < 1}
+    if gaps:
+        print("⚠️ Fields not found in every PDF: "
+              + ", ".join(f"{field} {share:.0%}" for field, share in sorted(gaps.items())))
+    if summary["slowest"]:
+        print(f"🔎 Slowest PDF: {summary['slowest']} ({summary['slowest_ms']:.0f} ms). Report: {path}")
+
+
+def read_existing_output(path):
+    """Read a previously written CSV verbatim (as strings) so untouched rows round-trip unchanged."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def order_by_source(df, invoice_to_file):
+    """Sort rows into sorted-filename order of their source PDF, keeping in-file order."""
+    if df.empty:
+        return df
+    source = df["InvoiceNumber"].map(invoice_to_file).fillna("").map(os.path.basename)
+    return df.iloc[source.argsort(kind="stable")].reset_index(drop=True)
+
+
+def build_csvs(directory=invoice_dir, workers=default_workers, chunk_size=default_chunk_size,
+               timeout=default_timeout, full=False, output_format=default_format):
+    """
+    Bring the outputs up to date with the invoices in `directory`.
+
+    `output_format` is "csv", "parquet" (the typed store in invoice_store.py) or "both".
+    Only PDFs that are new or changed since the last run are extracted; their rows
+    replace any previous rows for the same invoice, and rows from deleted PDFs are
+    dropped. A PDF that fails to extract keeps its previous rows, and a PDF whose
+    invoice number another PDF already provides is skipped. `full=True` (or missing
+    outputs) re-extracts everything.
+    """
+    write_csv = output_format in ("csv", "both")
+    write_parquet = output_format in ("parquet", "both")
+    if write_parquet:
+        invoice_store.require_pyarrow()
+    elif invoice_store.store_exists():
+        invoice_store.remove_store()  # would otherwise be read in preference to the fresh CSVs
+        print(f"🧹 Removed stale {invoice_store.store_dir}/")
+
+    invoice_paths = list_invoice_pdfs(directory)
+    have_outputs = (
+        (not write_csv or (os.path.exists(summary_csv) and os.path.exists(attendance_csv)))
+        and (not write_parquet or invoice_store.store_exists())
+    )
+    manifest = {} if full or not have_outputs else load_manifest(output_format)
+
+    entries, changed, deleted = plan_changes(invoice_paths, manifest)
+    if manifest and not changed and not deleted:
+        save_manifest(entries, output_format)  # picks up touched-but-identical files
+        print(f"✅ All {len(entries)} invoices are up to date.")
+        return []
+
+    print(f"📄 {len(changed)} new or changed, {len(deleted)} deleted, {len(entries)} unchanged invoice(s).")
+
+    fingerprints = dict(changed)
+    results = []
+    reports = {}
+    with tracing.span("extract", workers=workers) as fields:
+        for invoice_path, summary, attendance, error, report in iter_extraction_results(
+                list(fingerprints), workers=workers, chunk_size=chunk_size, timeout=timeout):
+            reports[invoice_path] = report or {"error": error}
+            tracing.log_event("pdf", path=invoice_path, **reports[invoice_path])
+            results.append((invoice_path, summary, attendance, error))
+        fields.update(items=len(fingerprints), failed=sum(1 for result in results if result[3]))
+    print(f"⏱️ Extracted {len(fingerprints)} PDF(s) at {fields.get('items_per_s', 0.0):.1f} PDFs/s.")
+
+    # A PDF that fails keeps its last good rows (and old fingerprint, so it is retried next run).
+    for invoice_path, _, _, error in results:
+        if error and invoice_path in manifest:
+            entries[invoice_path] = manifest[invoice_path]
+    # Rows are upserted by InvoiceNumber, so each number must come from exactly one PDF:
+    # a PDF repeating a number another PDF already provides is skipped, not merged.
+    owners = {number: path for path, entry in entries.items() for number in entry["invoice_numbers"]}
+    summary_data = []
+    attendance_data = []
+    failures = []
+    extracted = []
+    for invoice_path, summary, attendance, error in results:
+        number = summary["InvoiceNumber"] if summary else None
+        if not error and owners.setdefault(number, invoice_path) != invoice_path:
+            error = reports[invoice_path]["error"] = f"duplicate invoice number {number} (also in {owners[number]})"
+        if error:
+            failures.append((invoice_path, error))
+            if invoice_path in manifest:
+                entries[invoice_path] = manifest[invoice_path]
+            continue
+        summary_data.append(summary)
+        attendance_data.extend(attendance)
+        extracted.append(invoice_path)
+        entries[invoice_path] = {**fingerprints[invoice_path], "invoice_numbers": [number]}
+    tracing.count("pdfs_extracted", len(summary_data))
+    tracing.count("pdfs_failed", len(failures))
+    save_report(reports)
+
+    for invoice_path, reason in failures:
+        kept = " (keeping its previous rows)" if invoice_path in manifest else ""
+        print(f"⚠️ Skipped {invoice_path}{kept}: {reason}")
+
+    # Upsert: drop every row belonging to a re-extracted or deleted PDF, then add the fresh rows.
+    stale = {number for path in extracted + deleted
+             for number in manifest.get(path, {}).get("invoice_numbers", [])}
+    stale.update(row["InvoiceNumber"] for row in summary_data)
+
+    new_summary = pd.DataFrame(summary_data, columns=invoice_store.invoice_columns)
+    new_attendance = pd.DataFrame(attendance_data, columns=invoice_store.attendance_columns)
+    fresh_summary, fresh_attendance = new_summary, new_attendance
+    changed_invoice_years = changed_attendance_years = None
+    previous_fingerprint = None
+    if manifest:
+        previous_fingerprint = invoice_store.data_fingerprint()
+        if write_csv:
+            old_summary = read_existing_output(summary_csv)
+            old_attendance = read_existing_output(attendance_csv)
+        else:
+            old_summary, old_attendance = invoice_store.load_raw_frames()
+        removed_summary = old_summary["InvoiceNumber"].isin(stale)
+        removed_attendance = old_attendance["InvoiceNumber"].isin(stale)
+        # Only the year partitions that lost or gained rows need rewriting.
+        changed_invoice_years = (set(invoice_store.invoice_years(old_summary[removed_summary]))
+                                 | set(invoice_store.invoice_years(new_summary)))
+        changed_attendance_years = (set(invoice_store.attendance_years(old_attendance[removed_attendance]))
+                                    | set(invoice_store.attendance_years(new_attendance)))
+        new_summary = pd.concat([old_summary[~removed_summary], new_summary], ignore_index=True)
+        new_attendance = pd.concat([old_attendance[~removed_attendance], new_attendance], ignore_index=True)
+
+    invoice_to_file = {number: path for path, entry in entries.items() for number in entry["invoice_numbers"]}
+    new_summary = order_by_source(new_summary, invoice_to_file)
+    new_attendance = order_by_source(new_attendance, invoice_to_file)
+
+    with tracing.span("write_outputs", format=output_format, invoices=len(new_summary)):
+        if write_csv:
+            new_summary.to_csv(summary_csv, index=False)
+            new_attendance.to_csv(attendance_csv, index=False)
+        if write_parquet:
+            invoice_store.write_store(new_summary, new_attendance, changed_invoice_years, changed_attendance_years)
+        save_manifest(entries, output_format)
+    with tracing.span("update_rollups"):
+        update_rollups(fresh_summary, fresh_attendance, stale, new_summary, new_attendance, previous_fingerprint)
+
+    if write_csv:
+        print("✅ Saved invoice summary to invoice_summary.csv")
+        print("✅ Saved attendance detail to attendance_detail.csv")
+    if write_parquet:
+        print(f"✅ Saved typed Parquet store to {invoice_store.store_dir}/")
+
+    if failures:
+        print(f"⚠️ {len(failures)} invoice(s) could not be read.")
+    print("✅ Done.")
+    return failures
+
+
+def update_rollups(fresh_summary, fresh_attendance, removed, summary_df, attendance_df, previous_fingerprint=None):
+    """
+    Apply the re-extracted and `removed` invoices to the rollup tables (rollups.py),
+    or rebuild them from the full frames when they do not match the previous outputs.
+    """
+    rollup = rollups.Rollups.load(contributions=True) if previous_fingerprint else None
+    if rollup is not None and rollup.fingerprint == previous_fingerprint:
+        groups = rollup.update(fresh_summary, fresh_attendance, removed)
+        print(f"🔢 Rollups updated: {groups} group(s) recomputed.")
+    else:
+        rollup = rollups.Rollups.from_frames(summary_df, attendance_df)
+        print(f"🔢 Rollups rebuilt: {len(rollup.groups)} group(s).")
+    rollup.fingerprint = invoice_store.data_fingerprint()
+    rollup.save()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract invoice PDFs into CSV files and/or a Parquet store.")
+    parser.add_argument("--invoice-dir", default=invoice_dir, help="Directory containing invoice PDFs.")
+    parser.add_argument("--workers", type=int, default=default_workers,
+                        help="Number of extraction processes (1 = no pool).")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size,
+                        help="PDFs dispatched to a worker at a time.")
+    parser.add_argument("--timeout", type=int, default=default_timeout,
+                        help="Seconds allowed per PDF before it is skipped (0 = no limit).")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the manifest and re-extract every PDF.")
+    parser.add_argument("--format", dest="output_format", choices=["csv", "parquet", "both"],
+                        default=default_format, help="Write the CSV files, the typed Parquet store, or both.")
+    parser.add_argument("--trace-log", help="Append per-stage timings as JSON lines to this file.")
+    return parser.parse_args(argv)
 
-# Save CSV files
-pd.DataFrame(summary_data).to_csv(summary_csv, index=False)
-pd.DataFrame(attendance_data).to_csv(attendance_csv, index=False)
 
-print("✅ Saved invoice summary to invoice_summary.csv")
-print("✅ Saved attendance detail to attendance_detail.csv")
-print("✅ Done.")
+if __name__ == "__main__":
+    args = parse_args()
+    tracing.configure(args.trace_log)
+    build_csvs(args.invoice_dir, workers=args.workers, chunk_size=args.chunk_size, timeout=args.timeout,
+               full=args.full, output_format=args.output_format)
@@ -1,150 +1,263 @@
-""" 
-Author: Andrew Buchanan  
+"""
+Author: Andrew Buchanan
 Fully working version: dynamic model selection + improved chunking + embedded summaries
+
+Serve mode: the UI opens the vectorstore that 'ingest_invoices_hybrid.py' persisted in
+'chroma_db' instead of rebuilding it, and only rebuilds when the store is missing or
+stale (or with --rebuild). LangChain, Ollama and the embedding model (torch /
+transformers) are imported on the first question rather than at startup.
+
+Retrieval is hybrid: BM25 over the lexical index fused with dense search (see
+hybrid_retrieval.py). Questions naming an exact invoice number or date are
+answered from the lexical index without loading the embedding model.
+
+Aggregate and lookup questions (totals, day counts, first/last attendance, ...)
+are answered by query_router.py from the persisted rollup tables (rollups.py)
+without retrieval or an LLM; every answer is prefixed with the path that served it.
+
+Other questions stream from Ollama token by token. QA chains are cached per model
+and share one keep-alive HTTP session (see qa_chain.py / ollama_client.py); the
+selected model is preloaded when it is chosen, and model discovery times out
+quickly instead of hanging when Ollama is slow.
+
+Generated answers are cached (see answer_cache.py) per model, succinct flag and
+vectorstore build, so repeated or reworded questions are answered instantly.
+
+The handler is async and the Gradio queue runs up to --concurrency questions at
+once; query embeddings from concurrent questions are micro-batched into one
+forward pass (embedding_cache.BatchedQueryEmbeddings). src/load_test.py measures
+throughput and latency under concurrent load against the fake Ollama server.
+
+Every request is timed through tracing.py (embed, retrieve, prompt size, time to
+first token, generation): --trace-log writes them as JSON lines, --metrics-port
+serves the aggregates on localhost and --show-timings appends the breakdown to
+each answer.
 """
 
-import gradio as gr
-import os
-import pandas as pd
-import requests
-from datetime import datetime
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain_ollama import OllamaLLM
-from langchain.prompts import PromptTemplate
+import time
+import asyncio
+import argparse
+import invoice_store
+import query_router
+import rollups
+import embedding_cache
+import lexical_index
+import hybrid_retrieval
+import ollama_client
+import qa_chain
+import answer_cache
+import tracing
+import ingest_invoices_hybrid as ingest
 
 # --- Configuration ---
-persist_directory = "chroma_db"
-invoice_csv = "invoice_summary.csv"
-attendance_csv = "attendance_detail.csv"
-embedding_model_name = "BAAI/bge-small-en"
-
-# --- Load Data ---
-if not os.path.exists(invoice_csv) or not os.path.exists(attendance_csv):
-    raise FileNotFoundError("Missing invoice or attendance CSVs.")
-
-invoice_df = pd.read_csv(invoice_csv)
-attendance_df = pd.read_csv(attendance_csv)
-attendance_df["ParsedDate"] = pd.to_datetime(attendance_df["Date"], format="%d/%m/%Y", errors="coerce")
-
-# --- Prepare Document Content ---
-documents = []
-
-# Invoice lines
-for _, row in invoice_df.iterrows():
-    documents.append(
-        f"Invoice Number: {row['InvoiceNumber']}. "
-        f"Month: {row['MonthBilledFor']} {row['Year']}. "
-        f"Dog: {row['DogName']}. "
-        f"Total: ${row['TotalAmountDue']}. "
-        f"Discounted Day Rate: ${row['OriginalCostPerDay']} - {row['PercentageDiscount']}% discount."
-    )
-
-# Attendance lines
-for _, row in attendance_df.iterrows():
-    documents.append(f"{row['DogName']} attended on {row['Date']} ({row['Day']}) under invoice {row['InvoiceNumber']}.")
-
-# Calculated summaries
-first_date = attendance_df["ParsedDate"].min()
-last_date = attendance_df["ParsedDate"].max()
-first_day = first_date.strftime("%A")
-last_day = last_date.strftime("%A")
-total_attendance = attendance_df["ParsedDate"].notna().sum()
-monthly_attendance = attendance_df["ParsedDate"].dt.to_period("M").value_counts().sort_index()
-avg_cost_per_day = invoice_df["TotalAmountDue"].sum() / total_attendance
-attendance_by_day = attendance_df["Day"].fillna("Unknown").value_counts()
-most_common_day = attendance_by_day.idxmax()
-gaps = attendance_df["ParsedDate"].sort_values().diff().dt.days
-max_gap = int(gaps.max())
-unique_months = attendance_df["ParsedDate"].dt.to_period("M").nunique()
-attendance_years = sorted(attendance_df["ParsedDate"].dt.year.dropna().unique())
-total_cost = invoice_df["TotalAmountDue"].sum()
-invoice_count = len(invoice_df)
-
-service_address = invoice_df['ServiceProviderAddress'].iloc[0]
-client_address = invoice_df['ClientAddress'].iloc[0]
-
-# Combine narrative and summary
-documents.insert(0, f"""Snoopy is a cheerful Beagle owned by Charlie Brown. They live together in Bloomington, Minnesota. Charlie Brown and Snoopys full address is: {client_address}
-Each week, Snoopy attends doggy daycare at Pawprints & Playcare LLC, a local service offering structured care for dogs.
-The facility is open seven days a week and is located on Willow Creek Drive. The full address of Pawprints and Playcare LLC is: {service_address}.
-Every month, Pawprints & Playcare invoices Charlie Brown for Snoopy’s visits, applying a 50% loyalty discount.
-Snoopy's first attendance was on {first_date.strftime('%d %B %Y')} ({first_day}).
-Snoopy's most recent attendance was on {last_date.strftime('%d %B %Y')} ({last_day}).
-Total days attended: {total_attendance}.
-Average cost per day: ${avg_cost_per_day:.2f}.
-Most frequent day: {most_common_day}s.
-Longest gap between visits: {max_gap} days.
-Total cost across all invoices: ${total_cost:.2f}.
-Years attended: {', '.join(str(y) for y in attendance_years)}.
-Total invoices: {invoice_count}.
-""")
-
-# Monthly breakdown
-documents.append("Monthly attendance breakdown:")
-for month, count in monthly_attendance.items():
-    documents.append(f"- {month.strftime('%B %Y')}: {count} attendances")
-
-# --- Chunking ---
-print("✂️ Splitting documents...")
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-chunks = text_splitter.split_text("\n".join(documents))
-
-# --- Embedding & Vectorstore ---
-print("🔢 Creating vectorstore...")
-if os.path.exists(persist_directory):
-    import shutil
-    shutil.rmtree(persist_directory)
-
-embedding = HuggingFaceEmbeddings(model_name=embedding_model_name)
-vectorstore = Chroma.from_texts(chunks, embedding=embedding, persist_directory=persist_directory)
-print("✅ Vectorstore created.")
+persist_directory = ingest.persist_directory
+embedding_model_name = ingest.embedding_model_name
+default_concurrency = 4      # questions answered at once (Ollama serves OLLAMA_NUM_PARALLEL of them in parallel)
+default_max_queue = 64
+query_batch_window = 0.005   # seconds; concurrent query embeddings within this window share one forward pass
+
+embedding = None
+vectorstore = None
+hybrid = None
+router = None
+client = ollama_client.OllamaClient()  # shared, keep-alive connections to Ollama
+chains = None  # per-model QA chains
+answers = answer_cache.AnswerCache()
+show_timings = False  # append each answer's timing breakdown in the UI
+
+
+# --- Vectorstore ---
+def load_vectorstore(rebuild=False, backend=ingest.default_backend, shared_embedding=None):
+    """
+    Open the persisted store, rebuilding it first only if it is missing, stale or
+    `rebuild` is set. `shared_embedding` reuses an embedding model that is already loaded.
+    """
+    global embedding, vectorstore, hybrid, chains, answers, persist_directory
+    persist_directory = ingest.backend_directories[backend]
+    embedding = shared_embedding or embedding_cache.lazy_cached_huggingface_embeddings(
+        embedding_model_name, query_batch_window=query_batch_window)
+    if rebuild or not ingest.store_is_current(persist_directory):
+        print("🔢 Vectorstore missing or out of date, rebuilding...")
+        vectorstore = ingest.build_vectorstore(embedding, backend)
+    else:
+        print(f"📂 Opening existing vectorstore in {persist_directory}/ (embedding model loads on first query)...")
+        vectorstore = ingest.open_vectorstore(embedding, persist_directory, backend)
+    index = lexical_index.LexicalIndex.load(persist_directory)
+    if index is None:
+        print("⚠️ No lexical index found, using dense retrieval only.")
+    hybrid = hybrid_retrieval.HybridSearch(index, vectorstore)
+    chains = qa_chain.ChainPool(client, hybrid)
+    answers = answer_cache.AnswerCache(embed_query=embedding.embed_query)
+    return vectorstore
+
 
 # --- Model selection ---
+fallback_models = ["llama3:instruct", "mistral:instruct", "openchat", "deepseek-coder:6.7b-instruct"]
+
+
 def get_ollama_models():
+    """Installed Ollama models, or a default list if Ollama does not answer within the discovery timeout."""
+    try:
+        return client.list_models() or fallback_models
+    except ollama_client.OllamaError as e:
+        print(f"⚠️ {e}; using the default model list.")
+        return fallback_models
+
+
+def warm_up(model_choice):
+    """Load the selected model into Ollama so the first question does not pay for it."""
     try:
-        r = requests.get("http://localhost:11434/api/tags")
-        r.raise_for_status()
-        return sorted([m["name"] for m in r.json().get("models", [])])
-    except:
-        return ["llama3:instruct", "mistral:instruct", "openchat", "deepseek-coder:6.7b-instruct"]
-
-available_models = get_ollama_models()
-selected_model = available_models[0] if available_models else "llama3:instruct"
-
-# --- Prompt and Chain ---
-prompt_template = PromptTemplate(
-    input_variables=["context", "question"],
-    template="You are a helpful assistant answering only based on the context below.\n"
-             "Context:{context}\n"
-             "Question: {question}\n"
-             "Answer:"
-)
+        chains.warm_up(model_choice)
+        print(f"🔥 {model_choice} loaded.")
+    except ollama_client.OllamaError as e:
+        print(f"⚠️ {e}")
+
+
+# --- Structured fast path ---
+def load_router():
+    """Build the query router from the persisted rollup tables; the attendance history is not read."""
+    global router
+    invoice_df = invoice_store.load_invoices()
+    router = query_router.QueryRouter(invoice_df, rollup=rollups.load_or_build())
+    return router
+
 
 # --- Q&A Interface ---
-def ask_question(model_choice, query, succinct):
-    llm = OllamaLLM(model=model_choice)
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=vectorstore.as_retriever(),
-        chain_type="stuff",
-        chain_type_kwargs={"prompt": prompt_template},
-        return_source_documents=False,
-    )
+async def ask_question(model_choice, query, succinct):
+    """
+    Answer from the structured tables when the router recognises the question,
+    then from the answer cache, otherwise via RAG. Yields the answer so far, so
+    the UI shows it as it streams. Blocking work (embedding, retrieval, Ollama)
+    runs in worker threads, so concurrent questions do not wait on each other.
+    """
+    start = time.perf_counter()
+    if router is not None:
+        routed = router.route(query)
+        if routed is not None:
+            answer, intent = routed
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"⚡ Structured answer ({intent}) in {elapsed_ms:.2f} ms")
+            timings = finish_request(f"structured/{intent}", start, {})
+            yield f"[Path: structured/{intent}, {elapsed_ms:.2f} ms]\n{answer}{timings}"
+            return
+
+    version = corpus_version()
+    # Embedding an exact-ID question would load the model that hybrid search avoids for it.
+    semantic = not lexical_index.exact_terms(query)
+    record = {}
+
+    def lookup():
+        with tracing.collect(record):
+            return answers.get(query, model_choice, succinct, version, semantic)
+
+    cached = await asyncio.to_thread(lookup)
+    print_cache_stats()
+    if cached is not None:
+        answer, how = cached
+        timings = finish_request(f"cache/{how}", start, record, model=model_choice)
+        yield f"[Path: cache/{how}] [Model: {model_choice}]\n{answer}{timings}"
+        return
+    async for partial in ask_rag(model_choice, query, succinct, version, semantic, record, start):
+        yield partial
+
+
+def finish_request(path, start, record, **fields):
+    """Record one answered question in the metrics and trace log; returns the UI timing line, if enabled."""
+    elapsed = time.perf_counter() - start
+    record["total_ms"] = elapsed * 1000
+    tracing.observe("request", elapsed)
+    tracing.count("requests_" + path.split("/")[0])
+    tracing.log_event("request", path=path, **fields, **record)
+    return f"\n\n⏱️ {tracing.format_breakdown(record)}" if show_timings else ""
+
+
+def corpus_version():
+    """Fingerprint of the current vectorstore build; cached answers from other builds are discarded."""
+    return ingest.read_build_info(persist_directory).get("fingerprint")
+
+
+def print_cache_stats():
+    stats = answers.stats()
+    print(f"🧠 Answer cache: {stats['hit_rate']:.0%} hit rate ({stats['exact_hits']} exact, "
+          f"{stats['semantic_hits']} semantic, {stats['misses']} misses, {stats['entries']} entries)")
+
+
+async def ask_rag(model_choice, query, succinct, version=None, semantic=True, info=None, start=None):
+    question = query
+    chain = chains.get(model_choice)
     if succinct:
         query = "Answer as succinctly as possible. " + query
-    result = qa_chain.invoke({"query": query})
-    return f"[Model: {model_choice}]\n{result['result'].strip()}"
-
-gr.Interface(
-    fn=ask_question,
-    inputs=[
-        gr.Dropdown(choices=available_models, value=selected_model, label="Choose Model"),
-        gr.Textbox(label="Your question"),
-        gr.Checkbox(label="Make answer succinct", value=True)
-    ],
-    outputs=gr.Textbox(label="Answer"),
-    title="Snoopy Invoice Q&A (RAG + Ollama)"
-).launch()
\ No newline at end of file
+    start = start or time.perf_counter()
+    info = info if info is not None else {}
+    header, answer = None, ""
+    try:
+        async for token in chain.astream(query, info):
+            if header is None:
+                timings = hybrid_retrieval.format_timings(info.get("retrieval", {}))
+                print(f"🔎 Retrieval {timings}; first token after {(time.perf_counter() - start) * 1000:.0f} ms")
+                header = f"[Path: rag] [Model: {model_choice}] [Retrieval {timings}]\n"
+            answer += token
+            yield header + answer
+    except ollama_client.OllamaError as e:
+        finish_request("rag", start, info, model=model_choice, error=str(e))
+        yield (header or f"[Path: rag] [Model: {model_choice}]\n") + answer + f"\n⚠️ {e}"
+        return
+    timings = finish_request("rag", start, info, model=model_choice)
+    if header is None or timings:
+        yield (header or f"[Path: rag] [Model: {model_choice}]\n") + answer + timings
+    answers.put(question, model_choice, succinct, version, answer.strip(), semantic)
+
+
+def launch(preload=True, concurrency=default_concurrency, max_queue=default_max_queue):
+    """Serve the UI; at most `concurrency` questions are answered at once and `max_queue` may wait."""
+    import gradio as gr
+
+    available_models = get_ollama_models()
+    selected_model = available_models[0]
+    if preload:
+        warm_up(selected_model)
+
+    with gr.Blocks(title="Snoopy Invoice Q&A (RAG + Ollama)") as demo:
+        gr.Markdown("# Snoopy Invoice Q&A (RAG + Ollama)")
+        model = gr.Dropdown(choices=available_models, value=selected_model, label="Choose Model")
+        question = gr.Textbox(label="Your question")
+        succinct = gr.Checkbox(label="Make answer succinct", value=True)
+        submit = gr.Button("Submit", variant="primary")
+        answer = gr.Textbox(label="Answer")
+
+        if preload:
+            model.change(fn=warm_up, inputs=model)
+        submit.click(fn=ask_question, inputs=[model, question, succinct], outputs=answer)
+        question.submit(fn=ask_question, inputs=[model, question, succinct], outputs=answer)
+    demo.queue(default_concurrency_limit=concurrency, max_size=max_queue)
+    demo.launch()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Launch the Snoopy invoice Q&A UI.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the vectorstore before serving, even if it looks up to date.")
+    parser.add_argument("--ollama-url", default=ollama_client.default_base_url,
+                        help="Base URL of the Ollama server (e.g. a fake_ollama.py server for testing).")
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Do not load the selected model into Ollama ahead of the first question.")
+    parser.add_argument("--concurrency", type=int, default=default_concurrency,
+                        help="Questions answered at the same time (default: %(default)s).")
+    parser.add_argument("--max-queue", type=int, default=default_max_queue,
+                        help="Questions allowed to wait in the queue (default: %(default)s).")
+    parser.add_argument("--backend", choices=sorted(ingest.backend_directories), default=ingest.default_backend,
+                        help="Vector store to serve from: Chroma or the memory-mapped index (default: %(default)s).")
+    parser.add_argument("--show-timings", action="store_true",
+                        help="Append a per-request timing breakdown (embed, retrieve, prompt, LLM) to each answer.")
+    parser.add_argument("--trace-log", help="Append per-request and per-stage timings as JSON lines to this file.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help=f"Serve metrics on localhost at this port (e.g. {tracing.default_metrics_port}).")
+    args = parser.parse_args()
+    show_timings = args.show_timings
+    tracing.configure(args.trace_log)
+    if args.metrics_port is not None:
+        tracing.start_metrics_server(args.metrics_port)
+    client = ollama_client.OllamaClient(args.ollama_url, pool_size=max(args.concurrency, ollama_client.default_pool_size))
+    load_vectorstore(rebuild=args.rebuild, backend=args.backend)
+    load_router()
+    launch(preload=not args.no_preload, concurrency=args.concurrency, max_queue=args.max_queue)
@@ -0,0 +1,345 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Content-addressed on-disk cache for embedding vectors, shared by
+'ingest_invoices_hybrid.py' and 'demo_ui_hybrid.py'. Identical text embedded by the
+same model is only ever sent through the model once; after that it is read back
+from disk, including repeated question embeddings at Q&A time.
+
+Layout of embedding_cache/<model>/ (all fixed-width, memory-mapped):
+- meta.json    model name, vector dimension and current capacity
+- keys.bin     16-byte SHA-256 prefix of (model, kind, text) per slot
+- stamps.bin   last-used counter per slot (0 = empty), used for LRU eviction
+- vectors.bin  float32 vectors, one row per slot
+
+The slot lookup table is rebuilt from keys.bin on open, so there is no separate
+index to keep consistent. The cache grows by doubling up to `max_entries` and then
+evicts the least recently used entries.
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+import tracing
+
+# --- Configuration ---
+cache_directory = "embedding_cache"
+default_max_entries = 100_000
+initial_capacity = 1024
+key_size = 16
+default_batch_window = 0.005  # seconds to wait for concurrent queries to join a batch
+default_max_batch = 32
+
+
+class Embeddings:
+    """
+    The LangChain Embeddings interface, defined here so importing this module (and
+    starting the UI) does not load langchain_core. Vectorstores only call these methods.
+    """
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+class EmbeddingCache:
+    """Memory-mapped vector store keyed by content hash, with LRU eviction and hit/miss counters."""
+
+    def __init__(self, directory, model_name, max_entries=default_max_entries):
+        self.directory = directory
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._dim = None
+        self._capacity = 0
+        self._clock = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    # --- Files ---
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("model") != self.model_name:
+            return
+        self._dim = meta["dim"]
+        self._map(meta["capacity"])
+        occupied = np.flatnonzero(self._stamps)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in occupied}
+        self._clock = int(self._stamps.max(initial=0))
+
+    def _map(self, capacity):
+        """(Re)map the three arrays at `capacity` rows, extending the files if needed."""
+        for name, row_bytes in (("keys.bin", key_size), ("stamps.bin", 8), ("vectors.bin", 4 * self._dim)):
+            path = self._path(name)
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode="r+", shape=(capacity, key_size))
+        self._stamps = np.memmap(self._path("stamps.bin"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self._vectors = np.memmap(self._path("vectors.bin"), dtype=np.float32, mode="r+",
+                                  shape=(capacity, self._dim))
+        self._capacity = capacity
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": self._dim, "capacity": capacity}, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _free_slots(self, needed):
+        """Return `needed` empty slots, growing the files or evicting LRU entries as required."""
+        free = list(np.flatnonzero(self._stamps == 0)[:needed])
+        if len(free) < needed and self._capacity < self.max_entries:
+            old_capacity = self._capacity
+            new_capacity = min(self.max_entries, max(old_capacity * 2, old_capacity + needed))
+            self._map(new_capacity)
+            free += list(range(old_capacity, new_capacity))[:needed - len(free)]
+        if len(free) < needed:
+            # Every empty slot is already in `free`, so rank only the occupied ones.
+            stamps = np.where(self._stamps == 0, np.iinfo(np.int64).max, self._stamps)
+            victims = np.argsort(stamps, kind="stable")[:needed - len(free)]
+            for slot in victims:
+                self._slots.pop(self._keys[slot].tobytes(), None)
+            self.evictions += len(victims)
+            free += list(victims)
+        return [int(slot) for slot in free]
+
+    # --- Public API ---
+    def key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).digest()[:key_size]
+
+    def get_many(self, keys):
+        """Vectors for `keys`, with None for every miss."""
+        with self._lock:
+            found = []
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is not None and self._keys[slot].tobytes() != key:
+                    # Another process sharing the files evicted this entry and reused the slot.
+                    del self._slots[key]
+                    slot = None
+                if slot is None:
+                    self.misses += 1
+                    found.append(None)
+                    continue
+                self.hits += 1
+                self._clock += 1
+                self._stamps[slot] = self._clock
+                found.append(np.array(self._vectors[slot]))
+            return found
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._map(min(self.max_entries, max(initial_capacity, len(keys))))
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self._slots]
+            # Never evict more than the cache can hold in one go.
+            new_keys = new_keys[-self.max_entries:]
+            slots = self._free_slots(len(new_keys))
+            rows = {key: vector for key, vector in zip(keys, vectors)}
+            for key, slot in zip(new_keys, slots):
+                self._clock += 1
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._vectors[slot] = rows[key]
+                self._stamps[slot] = self._clock
+                self._slots[key] = slot
+
+    def flush(self):
+        with self._lock:
+            if self._capacity:
+                self._keys.flush()
+                self._stamps.flush()
+                self._vectors.flush()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._slots),
+            "capacity": self._capacity,
+            "evictions": self.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps any LangChain embedding object so repeated text is served from EmbeddingCache."""
+
+    def __init__(self, embeddings, model_name, directory=cache_directory, max_entries=default_max_entries):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.cache = EmbeddingCache(os.path.join(directory, safe_name), model_name, max_entries)
+        atexit.register(self.cache.flush)
+
+    def _embed(self, kind, texts, compute):
+        keys = [self.cache.key(kind, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = compute(list(missing.values()))
+            self.cache.put_many(list(missing), computed)
+            fresh = dict(zip(missing, computed))
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_documents(self, texts):
+        vectors = self._embed("document", texts, self.embeddings.embed_documents)
+        self.cache.flush()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """
+    Micro-batches embed_query calls from concurrent threads: queries arriving
+    within `window` seconds of each other (up to `max_batch`) are embedded in one
+    model forward pass. The batch goes through embed_documents, which for
+    HuggingFaceEmbeddings encodes exactly as embed_query does.
+    """
+
+    def __init__(self, embeddings, window=default_batch_window, max_batch=default_max_batch):
+        self.embeddings = embeddings
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.queries = 0
+        self._pending = []
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text):
+        future = Future()
+        with self._condition:
+            self._pending.append((text, future))
+            self._condition.notify()
+        return future.result()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def batch_stats(self):
+        return {"batches": self.batches, "queries": self.queries,
+                "mean_batch_size": self.queries / self.batches if self.batches else 0.0}
+
+
+def cached_huggingface_embeddings(model_name, directory=cache_directory, max_entries=default_max_entries,
+                                  query_batch_window=None):
+    """
+    HuggingFaceEmbeddings(model_name) behind the shared on-disk cache. With
+    `query_batch_window` (seconds), cache-missing query embeddings from concurrent
+    requests are micro-batched (see BatchedQueryEmbeddings).
+    """
+    with tracing.span("embedding_load", model=model_name):
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    return cached_embeddings(embeddings, model_name, directory, max_entries, query_batch_window)
+
+
+def cached_embeddings(embeddings, model_name, directory=cache_directory, max_entries=default_max_entries,
+                      query_batch_window=None):
+    """Any embedding object for `model_name` behind the shared cache, with optional query micro-batching."""
+    if query_batch_window:
+        embeddings = BatchedQueryEmbeddings(embeddings, query_batch_window)
+    return CachedEmbeddings(embeddings, model_name, directory, max_entries)
+
+
+class LazyEmbeddings(Embeddings):
+    """Defers building the embedding model (and importing torch/transformers) until it is first used."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._embeddings is not None
+
+    def _get(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = self.factory()
+            return self._embeddings
+
+    def embed_documents(self, texts):
+        return self._get().embed_documents(texts)
+
+    def embed_query(self, text):
+        with tracing.span("embed_query"):
+            return self._get().embed_query(text)
+
+    def stats(self):
+        return self._embeddings.stats() if self.loaded and hasattr(self._embeddings, "stats") else {
+            "hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 0, "capacity": 0, "evictions": 0}
+
+
+def lazy_cached_huggingface_embeddings(model_name, directory=cache_directory, max_entries=default_max_entries,
+                                       query_batch_window=None):
+    """Like cached_huggingface_embeddings(), but the model is only loaded on the first embed call."""
+    return LazyEmbeddings(lambda: cached_huggingface_embeddings(model_name, directory, max_entries,
+                                                                query_batch_window))
@@ -0,0 +1,144 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+The embedding stage of ingestion. PipelineEmbeddings sits between the
+vectorstore and the embedding model and:
+
+- feeds the model fixed-size batches (`batch_size`), whatever size of write
+  batch the vectorstore hands it,
+- sets the number of intra-op (torch) threads the model may use,
+- optionally shards batches across `workers` processes, each with its own copy
+  of the model,
+- counts chunks embedded and reports chunks/sec as it goes.
+
+vectorstore_sync already writes to the store one batch at a time, so with this
+stage memory stays bounded by the write batch, not by the corpus.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+
+
+import tracing
+from embedding_cache import Embeddings
+
+# --- Configuration ---
+default_batch_size = 64
+default_workers = 1
+progress_interval = 10.0  # seconds between progress lines
+
+
+def set_threads(threads):
+    """Limit the intra-op threads used by torch (and BLAS/OpenMP) in this process."""
+    if not threads:
+        return
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class HuggingFaceFactory:
+    """Picklable recipe for the HuggingFace model, so worker processes can build their own copy."""
+
+    def __init__(self, model_name, batch_size=default_batch_size):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def __call__(self):
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=self.model_name, encode_kwargs={"batch_size": self.batch_size})
+
+
+# --- Worker processes ---
+_worker_embeddings = None
+_worker_error = None
+
+
+def _init_worker(factory, threads):
+    # A failing initializer makes Pool restart the worker forever, so keep the error for the first task instead.
+    global _worker_embeddings, _worker_error
+    set_threads(threads)
+    try:
+        _worker_embeddings = factory()
+    except Exception as e:
+        _worker_error = e
+
+
+def _embed_in_worker(texts):
+    if _worker_error is not None:
+        raise _worker_error
+    return _worker_embeddings.embed_documents(texts)
+
+
+class PipelineEmbeddings(Embeddings):
+    def __init__(self, factory, batch_size=default_batch_size, workers=default_workers, threads=None,
+                 report=print):
+        self.factory = factory
+        self.batch_size = batch_size
+        self.workers = workers
+        self.threads = threads
+        self.report = report
+        self.embedded = 0
+        self.seconds = 0.0
+        self._embeddings = None
+        self._pool = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+    def _model(self):
+        if self._embeddings is None:
+            set_threads(self.threads)
+            with tracing.span("embedding_load"):
+                self._embeddings = self.factory()
+        return self._embeddings
+
+    def _workers(self):
+        if self._pool is None:
+            # spawn: never fork a process that may already hold torch threads.
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(self.workers, initializer=_init_worker, initargs=(self.factory, self.threads))
+        return self._pool
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        start = time.perf_counter()
+        if self.workers > 1 and not self._closed:
+            results = self._workers().map(_embed_in_worker, batches)
+        else:
+            model = self._model()
+            results = [model.embed_documents(batch) for batch in batches]
+        vectors = [vector for batch in results for vector in batch]
+        tracing.observe("embed_documents", time.perf_counter() - start)
+        tracing.count("chunks_embedded", len(texts))
+        with self._lock:
+            self.embedded += len(texts)
+            self.seconds += time.perf_counter() - start
+            if self.report and time.monotonic() - self._last_report >= progress_interval:
+                self._last_report = time.monotonic()
+                self.report(f"🔢 Embedded {self.embedded:,} chunks ({self.rate():.1f} chunks/s)")
+        return vectors
+
+    def embed_query(self, text):
+        return self._model().embed_query(text)
+
+    def rate(self):
+        """Chunks per second of embedding time so far."""
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+    def close(self):
+        """Stop the worker processes; any later calls embed in this process."""
+        self._closed = True
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,90 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Stand-ins for the embedding model and Chroma, for load tests and benchmarks that
+should not need torch, a model download or a vectorstore on disk.
+
+- HashingEmbeddings: deterministic bag-of-words vectors (feature hashing of the
+  lexical index's tokens). `forward_delay` adds a fixed cost per model call, the
+  way a real forward pass costs roughly the same for one text or a small batch,
+  and calls run one at a time, as they would on a single CPU/GPU.
+- InMemoryVectorstore: brute-force cosine search over those vectors, with the
+  same similarity_search(query, k, filter) and
+  similarity_search_with_relevance_scores calls HybridSearch makes on Chroma.
+"""
+
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+import chunking
+from lexical_index import tokenize
+from embedding_cache import Embeddings
+
+# --- Configuration ---
+default_dim = 256
+
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dim=default_dim, forward_delay=0.0):
+        self.dim = dim
+        self.forward_delay = forward_delay
+        self.calls = 0
+        self._device = threading.Lock()
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        with self._device:
+            self.calls += 1
+            if self.forward_delay:
+                time.sleep(self.forward_delay)
+            return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class Document:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+class InMemoryVectorstore:
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.texts, self.metadatas = [], []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def add_texts(self, texts, metadatas, ids=None):
+        vectors = np.asarray(self.embedding.embed_documents(list(texts)), dtype=np.float32)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self.vectors = vectors if not len(self.vectors) else np.vstack([self.vectors, vectors])
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+        if not self.texts:
+            return []
+        scores = self.vectors @ np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        results = []
+        for row in np.argsort(-scores, kind="stable"):
+            if filter is None or chunking.matches(self.metadatas[row], filter):
+                results.append((Document(self.texts[row], self.metadatas[row]), float(scores[row])))
+                if len(results) == k:
+                    break
+        return results
+
+    def similarity_search(self, query, k=4, filter=None):
+        return [document for document, _ in self.similarity_search_with_relevance_scores(query, k, filter)]
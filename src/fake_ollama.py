@@ -0,0 +1,118 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+A stand-in for the Ollama HTTP API, for tests and for running the Q&A UI without
+a real model. It answers GET /api/tags with a fixed model list and streams a
+canned answer from POST /api/generate as newline-delimited JSON, one word per
+message, with an optional delay per token. An empty prompt is treated as a
+preload request. Every request is recorded in `server.requests`.
+
+Run on its own:
+    python src/fake_ollama.py --port 11435
+then point the UI at it with: python src/demo_ui_hybrid.py --ollama-url http://localhost:11435
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+default_models = ["llama3:instruct", "mistral:instruct"]
+default_answer = "Snoopy attended doggy daycare according to the invoices."
+default_token_delay = 0.0  # seconds between streamed tokens
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, None))
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name} for name in self.server.models]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append(("POST", self.path, payload))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        model = payload.get("model")
+        if model not in self.server.models:
+            self._send_json(404, {"error": f"model '{model}' not found"})
+            return
+        if not payload.get("prompt"):
+            self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load"})
+            return
+
+        words = self.server.answer.split(" ")
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(words)]
+        if not payload.get("stream", True):
+            self._send_json(200, {"model": model, "response": "".join(tokens), "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                if self.server.token_delay:
+                    time.sleep(self.server.token_delay)
+                self._write_chunk({"model": model, "response": token, "done": False})
+            self._write_chunk({"model": model, "response": "", "done": True,
+                               "prompt_eval_count": len(payload["prompt"].split()), "eval_count": len(tokens)})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early; like Ollama, stop generating.
+            self.close_connection = True
+
+    def _write_chunk(self, message):
+        data = json.dumps(message).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(port=0, models=None, answer=default_answer, token_delay=default_token_delay):
+    """Start the fake server in a background thread; returns the server (base URL in `server.base_url`)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.models = list(models or default_models)
+    server.answer = answer
+    server.token_delay = token_delay
+    server.requests = []
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Ollama API server.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--answer", default=default_answer, help="Answer streamed for every prompt.")
+    parser.add_argument("--token-delay", type=float, default=default_token_delay,
+                        help="Seconds to wait between streamed tokens.")
+    args = parser.parse_args()
+    server = start_server(args.port, answer=args.answer, token_delay=args.token_delay)
+    print(f"✅ Fake Ollama listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
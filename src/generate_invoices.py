@@ -1,26 +1,43 @@
 """
 Author: Andrew Buchanan
 Date: 26/04/2025
-Update:07/05/2025
+Update:17/10/2026
 
 Purpose:
-This script generates synthetic PDF invoices for a fictional dog daycare business 
-to simulate real-world data. The invoices include service provider and client details, 
-attendance dates, and costs. It provides a test dataset for building and evaluating 
+This script generates synthetic PDF invoices for a fictional dog daycare business
+to simulate real-world data. The invoices include service provider and client details,
+attendance dates, and costs. It provides a test dataset for building and evaluating
 the invoice analysis system.
+
+With no options it writes the original dataset: one client (Charlie Brown) and one
+dog (Snoopy), an invoice per month for 2017-2024. For load tests it can generate
+any number of clients and dogs per client, each with its own daily rate and
+discount, e.g.
+
+    python src/generate_invoices.py --clients 1000 --dogs-per-client 2 --workers 8 --manifest
+
+Generation is seeded (--seed), and every client/dog account draws from its own
+random stream, so the output does not depend on the number of workers. With
+several accounts invoice numbers carry the account number (INV-2021-07-0042).
+The logo is parsed once per process and shared by every PDF, and PDFs are
+rendered across a process pool. --manifest writes the expected field values of
+every invoice (JSON lines) for checking extraction accuracy.
 """
 
 from fpdf import FPDF
 import os
+import json
 import random
 import calendar
-
-
+import argparse
+import multiprocessing
+from itertools import islice
 
 
 # Directory to store generated invoices
 invoice_dir = "invoices"
-os.makedirs(invoice_dir, exist_ok=True)
+manifest_file = "invoice_truth.jsonl"
+logo_file = "logo.png"
 
 # Static values
 service_provider_name = "Pawprints and Playcare LLC"
@@ -35,22 +52,56 @@ years = [2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024]
 
 original_cost_per_day = 22.50
 percentage_discount = 50
+attendance_days = [3, 10, 17, 24, 28]
+days_per_month = 4
+
+# Values drawn for generated clients and dogs (more than one account)
+client_first_names = ["Charlie", "Lucy", "Linus", "Sally", "Patty", "Franklin", "Marcie", "Schroeder", "Violet", "Frieda"]
+client_last_names = ["Brown", "van Pelt", "Reichardt", "Johnson", "Smith", "Garcia", "Nguyen", "Okafor", "Kowalski", "Murphy"]
+street_names = ["Willow Crescent", "Maple Avenue", "Oak Street", "Cedar Lane", "Birch Road", "Elm Court"]
+dog_names = ["Snoopy", "Rex", "Bella", "Max", "Luna", "Charlie", "Daisy", "Milo", "Bailey", "Coco", "Rocky", "Rosie"]
+cost_choices = [18.00, 20.00, 22.50, 25.00, 27.50]
+discount_choices = [0, 10, 15, 25, 50]
+
+# Parallel rendering
+default_workers = 1
+accounts_per_task = 4
+progress_every = 10_000  # invoices between progress lines
 
 
-def generate_invoice(invoice_number, year, month, attendance_dates):
+# --- Logo ---
+_logo_cache = {}
+
+
+def logo_info(path):
+    """The logo parsed once per process; each PDF gets a copy (fpdf drops the image data once written)."""
+    if path not in _logo_cache:
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.image(path, x=0, y=0, w=1, h=1)
+        _logo_cache[path] = pdf.images[path]
+    return _logo_cache[path]
+
+
+def generate_invoice(invoice_number, year, month, attendance_dates, output_dir=invoice_dir,
+                     client=client_name, address=client_address, dog=dog_name,
+                     cost_per_day=original_cost_per_day, discount=percentage_discount, logo=logo_file,
+                     verbose=True):
     pdf = FPDF()
     pdf.add_page()
-    
+
     pdf.set_font("Arial", style="B", size=10)
     pdf.cell(0, 10, txt=f"Invoice Number: {invoice_number}", ln=True, align='R')
 
     # Add a logo banner (adjust file path, width, and height as needed)
-    pdf.image("logo.png", x=25, y=20, w=150, h=50)
+    if logo:
+        pdf.images[logo] = dict(logo_info(logo))
+        pdf.image(logo, x=25, y=20, w=150, h=50)
 
     # Move cursor below the banner
     pdf.ln(50)
 
-    
+
     pdf.cell(200, 10, txt=f"Service Provider Name: {service_provider_name}", ln=True)
     #pdf.multi_cell(0, 10, txt=f"Service Provider Address: {service_provider_address}")
 
@@ -72,13 +123,13 @@ def generate_invoice(invoice_number, year, month, attendance_dates):
 
 
 
-    pdf.cell(200, 10, txt=f"Client Name: {client_name}", ln=True)
+    pdf.cell(200, 10, txt=f"Client Name: {client}", ln=True)
 
-    pdf.multi_cell(0, 10, txt=f"Client Address: {client_address}")
+    pdf.multi_cell(0, 10, txt=f"Client Address: {address}")
 
     pdf.cell(200, 10, txt=f"Month Billed For: {month} {year}", ln=True)
 
-    pdf.cell(200, 10, txt=f"Dog Name: {dog_name}", ln=True)
+    pdf.cell(200, 10, txt=f"Dog Name: {dog}", ln=True)
 
       # Table header
     pdf.set_fill_color(200, 220, 255)  # Light blue
@@ -96,30 +147,161 @@ def generate_invoice(invoice_number, year, month, attendance_dates):
     #    pdf.cell(200, 10, txt=f"{date}", ln=True)
 
     total_days = len(attendance_dates)
-    discounted_cost_per_day = original_cost_per_day * (1 - percentage_discount / 100)
+    discounted_cost_per_day = cost_per_day * (1 - discount / 100)
     total_amount_due = total_days * discounted_cost_per_day
 
-    pdf.cell(200, 10, txt=f"Original Cost Per Day: ${original_cost_per_day:.2f}", ln=True)
-    pdf.cell(200, 10, txt=f"Percentage Discount: {percentage_discount}%", ln=True)
+    pdf.cell(200, 10, txt=f"Original Cost Per Day: ${cost_per_day:.2f}", ln=True)
+    pdf.cell(200, 10, txt=f"Percentage Discount: {discount}%", ln=True)
     pdf.cell(200, 10, txt=f"Discounted Cost Per Day: ${discounted_cost_per_day:.2f}", ln=True)
     pdf.cell(200, 10, txt=f"Total Amount Due: ${total_amount_due:.2f}", ln=True)
 
-    output_path = os.path.join(invoice_dir, f"invoice_{invoice_number}.pdf")
+    output_path = os.path.join(output_dir, f"invoice_{invoice_number}.pdf")
     pdf.output(output_path)
-    print(f"✅ Created {output_path}")
-
-
-# Generate invoices
-invoice_counter = 1
-for year in years:
-    for i, month in enumerate(months, start=1):
-        invoice_number = f"INV-{year}-{i:02d}"
-        last_day = calendar.monthrange(year, i)[1]
-        possible_days = [d for d in [3, 10, 17, 24, 28] if d <= last_day]
-        # Ensure only valid days for the month
-        attendance_dates = [f"{day:02d}/{i:02d}/{year}" for day in possible_days if day <= last_day]
-        attendance_dates = random.sample(attendance_dates, k=min(4, len(attendance_dates)))
-        attendance_dates.sort(key=lambda x: int(x.split('/')[0]))
-        generate_invoice(invoice_number, year, month, attendance_dates)
-
-print("\n✅✅ All invoices created successfully!")
+    if verbose:
+        print(f"✅ Created {output_path}")
+
+
+# --- Invoice plan ---
+def account_profile(account, dogs_per_client, accounts, seed=0):
+    """Client, address, dog, daily cost and discount of one client/dog account."""
+    if accounts == 1:
+        return {"client": client_name, "address": client_address, "dog": dog_name,
+                "cost_per_day": original_cost_per_day, "discount": percentage_discount}
+    client_index = account // dogs_per_client
+    client_rng = random.Random(f"{seed}:client:{client_index}")
+    rng = random.Random(f"{seed}:account:{account}")
+    return {
+        "client": f"{client_rng.choice(client_first_names)} {client_rng.choice(client_last_names)}",
+        "address": f"{client_rng.randint(1, 9999)} {client_rng.choice(street_names)}, Bloomington, MN 55439, USA",
+        "dog": rng.choice(dog_names),
+        "cost_per_day": rng.choice(cost_choices),
+        "discount": rng.choice(discount_choices),
+    }
+
+
+def account_invoices(account, dogs_per_client=1, accounts=1, invoice_years=years, days=days_per_month, seed=0):
+    """
+    The invoices of one account, one per month, as the rows csv_builder should
+    extract from them (plus the attendance dates under "Dates").
+    """
+    profile = account_profile(account, dogs_per_client, accounts, seed)
+    rng = random.Random(f"{seed}:dates:{account}")
+    invoices = []
+    for year in invoice_years:
+        for i, month in enumerate(months, start=1):
+            invoice_number = f"INV-{year}-{i:02d}" if accounts == 1 else f"INV-{year}-{i:02d}-{account:04d}"
+            last_day = calendar.monthrange(year, i)[1]
+            possible_days = [d for d in attendance_days if d <= last_day]
+            attendance_dates = [f"{day:02d}/{i:02d}/{year}" for day in possible_days]
+            attendance_dates = rng.sample(attendance_dates, k=min(days, len(attendance_dates)))
+            attendance_dates.sort(key=lambda x: int(x.split('/')[0]))
+            discounted_cost_per_day = profile["cost_per_day"] * (1 - profile["discount"] / 100)
+            invoices.append({
+                "InvoiceNumber": invoice_number,
+                "ServiceProviderName": service_provider_name,
+                "ServiceProviderAddress": service_provider_address,
+                "ClientName": profile["client"],
+                "ClientAddress": profile["address"],
+                "MonthBilledFor": month,
+                "Year": str(year),
+                "DogName": profile["dog"],
+                "OriginalCostPerDay": f"{profile['cost_per_day']:.2f}",
+                "PercentageDiscount": str(profile["discount"]),
+                "TotalAmountDue": f"{len(attendance_dates) * discounted_cost_per_day:.2f}",
+                "DatesAttendedCount": len(attendance_dates),
+                "Dates": attendance_dates,
+            })
+    return invoices
+
+
+def iter_invoices(clients=1, dogs_per_client=1, invoice_years=years, days=days_per_month, seed=0):
+    """Every planned invoice, account by account."""
+    accounts = clients * dogs_per_client
+    for account in range(accounts):
+        yield from account_invoices(account, dogs_per_client, accounts, invoice_years, days, seed)
+
+
+def render(invoice, output_dir=invoice_dir, logo=logo_file):
+    """Write one planned invoice (a row from account_invoices) as a PDF."""
+    generate_invoice(invoice["InvoiceNumber"], invoice["Year"], invoice["MonthBilledFor"], invoice["Dates"],
+                     output_dir, invoice["ClientName"], invoice["ClientAddress"], invoice["DogName"],
+                     float(invoice["OriginalCostPerDay"]), int(invoice["PercentageDiscount"]), logo, verbose=False)
+
+
+# --- Parallel rendering ---
+def _render_accounts(task):
+    """Worker task: plan and render a few accounts; returns their planned invoices."""
+    account_range, settings = task
+    invoices = []
+    for account in account_range:
+        for invoice in account_invoices(account, settings["dogs_per_client"], settings["accounts"],
+                                        settings["years"], settings["days"], settings["seed"]):
+            render(invoice, settings["output_dir"], settings["logo"])
+            invoices.append(invoice)
+    return invoices
+
+
+def generate(clients=1, dogs_per_client=1, invoice_years=years, days=days_per_month, seed=0,
+             workers=default_workers, output_dir=invoice_dir, manifest=None, logo=logo_file):
+    """Render every invoice into `output_dir`; returns the number written."""
+    os.makedirs(output_dir, exist_ok=True)
+    accounts = clients * dogs_per_client
+    settings = {"dogs_per_client": dogs_per_client, "accounts": accounts, "years": list(invoice_years),
+                "days": days, "seed": seed, "output_dir": output_dir, "logo": logo}
+    tasks = [(range(start, min(start + accounts_per_task, accounts)), settings)
+             for start in range(0, accounts, accounts_per_task)]
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    results = pool.imap(_render_accounts, tasks) if pool else map(_render_accounts, tasks)
+    manifest_out = open(manifest, "w") if manifest else None
+    written = 0
+    try:
+        for invoices in results:
+            for invoice in invoices:
+                if manifest_out:
+                    manifest_out.write(json.dumps(invoice) + "\n")
+            written += len(invoices)
+            if written // progress_every > (written - len(invoices)) // progress_every:
+                print(f"📄 {written:,} invoices written...")
+    finally:
+        if manifest_out:
+            manifest_out.close()
+        if pool:
+            pool.close()
+            pool.join()
+    return written
+
+
+def load_manifest(path=manifest_file, limit=None):
+    """The planned invoices recorded by --manifest."""
+    with open(path) as f:
+        return [json.loads(line) for line in islice(f, limit)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic dog daycare invoices as PDFs.")
+    parser.add_argument("--clients", type=int, default=1, help="Number of clients (default: %(default)s).")
+    parser.add_argument("--dogs-per-client", type=int, default=1, help="Dogs per client (default: %(default)s).")
+    parser.add_argument("--start-year", type=int, default=years[0])
+    parser.add_argument("--end-year", type=int, default=years[-1])
+    parser.add_argument("--days-per-month", type=int, default=days_per_month,
+                        help="Attendance days per invoice, at most %d (default: %%(default)s)." % len(attendance_days))
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same invoices.")
+    parser.add_argument("--workers", type=int, default=default_workers,
+                        help="Processes rendering PDFs in parallel (default: %(default)s).")
+    parser.add_argument("--output-dir", default=invoice_dir)
+    parser.add_argument("--manifest", nargs="?", const=manifest_file, default=None,
+                        help=f"Write the expected values of every invoice as JSON lines (default file: {manifest_file}).")
+    parser.add_argument("--no-logo", action="store_true", help="Leave the logo out (much smaller PDFs).")
+    args = parser.parse_args()
+
+    written = generate(args.clients, args.dogs_per_client, range(args.start_year, args.end_year + 1),
+                       args.days_per_month, args.seed, args.workers, args.output_dir, args.manifest,
+                       None if args.no_logo else logo_file)
+    print(f"\n✅✅ All {written:,} invoices created successfully in {args.output_dir}/!")
+    if args.manifest:
+        print(f"📄 Expected values written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
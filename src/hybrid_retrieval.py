@@ -0,0 +1,151 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Hybrid retrieval for the Q&A UI: BM25 results from the lexical index
+(lexical_index.py) are fused with Chroma's dense similarity results using
+reciprocal rank fusion (RRF), so exact tokens and paraphrases both count.
+
+Questions naming an exact invoice number or dd/mm/yyyy date short-circuit: if
+the lexical index holds chunks containing that token they are returned directly,
+and neither Chroma nor the embedding model is touched.
+
+Every search records how long each retriever took (see last_timings, kept per
+thread so concurrent requests do not overwrite each other's timings).
+"""
+
+import time
+import threading
+
+import chunking
+from lexical_index import exact_terms
+
+# --- Configuration ---
+default_k = 4        # chunks returned by search(); prompts use context_budget over search_scored()
+default_fetch_k = 20  # candidates taken from each retriever before fusion
+rrf_k = 60
+dense_score_window = 0.15  # cosine similarity below the best at which a dense hit's relevance reaches 0
+
+
+def fusion_scores(rankings, k=rrf_k):
+    """score(key) = sum over the rankings of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings, k=rrf_k):
+    """Fuse ranked lists of keys by their fusion_scores(). Returns keys, best first."""
+    scores = fusion_scores(rankings, k)
+    return sorted(scores, key=lambda key: (-scores[key], str(key)))
+
+
+def _chunk_key(text, metadata):
+    if "record_key" in metadata:
+        return metadata["record_key"], metadata.get("chunk", 0)
+    return text
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def format_timings(timings):
+    parts = [f"{name[:-3]} {timings[name]} ms" for name in ("lexical_ms", "dense_ms", "fusion_ms") if name in timings]
+    return f"{timings.get('path', '?')}: " + ", ".join(parts)
+
+
+class HybridSearch:
+    def __init__(self, index, vectorstore=None, k=default_k, fetch_k=default_fetch_k):
+        self.index = index
+        self.vectorstore = vectorstore
+        self.k = k
+        self.fetch_k = fetch_k
+        self._local = threading.local()
+
+    @property
+    def last_timings(self):
+        """Timings of the last search made by the calling thread."""
+        return getattr(self._local, "timings", {})
+
+    def search(self, query, where=None):
+        """The top (text, metadata) chunks for `query`, restricted to chunks matching `where`."""
+        return [(text, metadata) for text, metadata, _ in self.search_scored(query, where, self.k)]
+
+    def search_scored(self, query, where=None, limit=None):
+        """
+        Up to `limit` (default: fetch_k) (text, metadata, relevance) triples in
+        fused (RRF) order. Relevance comes from the retrievers' raw scores, relative
+        to each retriever's best hit: BM25 score / best BM25 score, and for dense hits
+        1 - (best similarity - similarity) / dense_score_window, floored at 0. A
+        chunk found by both takes the higher; exact matches all score 1.
+        """
+        limit = self.fetch_k if limit is None else limit
+        timings = {}
+        self._local.timings = timings
+
+        terms = exact_terms(query)
+        if self.index is not None and terms:
+            start = time.perf_counter()
+            docs = self.index.exact(terms, where)
+            timings["lexical_ms"] = _elapsed_ms(start)
+            if docs:
+                timings["path"] = "exact"
+                return [(*self.index.document(doc)[1:], 1.0) for doc in docs[:limit]]
+
+        rankings, found, relevance = [], {}, {}
+        if self.index is not None:
+            start = time.perf_counter()
+            ranking = []
+            hits = self.index.search(query, self.fetch_k, where)
+            best = hits[0][0] if hits else 0.0
+            for score, doc in hits:
+                _, text, metadata = self.index.document(doc)
+                key = _chunk_key(text, metadata)
+                found.setdefault(key, (text, metadata))
+                relevance[key] = max(relevance.get(key, 0.0), score / best if best > 0 else 1.0)
+                ranking.append(key)
+            rankings.append(ranking)
+            timings["lexical_ms"] = timings.get("lexical_ms", 0) + _elapsed_ms(start)
+
+        if self.vectorstore is not None:
+            start = time.perf_counter()
+            ranking = []
+            if hasattr(self.vectorstore, "similarity_search_with_relevance_scores"):
+                hits = self.vectorstore.similarity_search_with_relevance_scores(query, k=self.fetch_k, filter=where)
+            else:  # no raw scores: every dense hit counts as relevant
+                hits = [(document, None) for document in
+                        self.vectorstore.similarity_search(query, k=self.fetch_k, filter=where)]
+            best = hits[0][1] if hits else None
+            for document, score in hits:
+                key = _chunk_key(document.page_content, document.metadata)
+                found.setdefault(key, (document.page_content, document.metadata))
+                dense = 1.0 if score is None else max(0.0, 1 - (best - score) / dense_score_window)
+                relevance[key] = max(relevance.get(key, 0.0), dense)
+                ranking.append(key)
+            rankings.append(ranking)
+            timings["dense_ms"] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        scores = fusion_scores(rankings)
+        fused = sorted(scores, key=lambda key: (-scores[key], str(key)))[:limit]
+        timings["fusion_ms"] = _elapsed_ms(start)
+        timings["path"] = "hybrid" if len(rankings) == 2 else ("dense" if self.vectorstore is not None else "lexical")
+        return [(*found[key], relevance[key]) for key in fused]
+
+    def as_retriever(self):
+        """A LangChain retriever over this search; the metadata filter is derived from each question."""
+        from langchain_core.documents import Document
+        from langchain_core.retrievers import BaseRetriever
+
+        search = self
+
+        class HybridRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                results = search.search(query, chunking.metadata_filter(query))
+                return [Document(page_content=text, metadata=metadata) for text, metadata in results]
+
+        return HybridRetriever()
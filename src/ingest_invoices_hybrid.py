@@ -5,87 +5,194 @@ Date: 26/04/2025
 Purpose:
 This script processes structured CSVs created from daycare invoices and attendance records.
 It builds a semantic vectorstore using sentence-transformer embeddings for retrieval-augmented generation.
-It also includes static facts such as the earliest attendance date to improve accuracy.
+It also includes static facts such as the earliest attendance date to improve accuracy,
+taken from the persisted rollup tables (rollups.py) rather than recomputed.
+The existing collection is updated in place: only new or changed chunks are embedded.
+
+After a build, 'chroma_db/build_info.json' records a fingerprint of the inputs so the
+Q&A UI can open the persisted store directly and only rebuild it when it is stale.
+A BM25 index of the same chunks is saved alongside as 'chroma_db/lexical_index.json'.
+
+With --backend mmap the vectors go into the compact memory-mapped index in
+'vector_index/' (see mmap_index.py) instead of Chroma; its build info and lexical
+index live in that directory.
+
+New chunks are embedded by the embedding pipeline (embedding_pipeline.py) in
+tunable model batches, with optional extra threads or worker processes, and are
+written to the store one batch at a time with chunks/sec progress.
 """
 
 import os
-import pandas as pd
+import json
+import time
+import argparse
 from datetime import datetime
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import invoice_store
+import vectorstore_sync
+import invoice_documents
+import rollups
+import chunking
+import lexical_index
+import mmap_index
+import embedding_cache
+import embedding_pipeline
+import tracing
 
 # --- Configuration ---
 persist_directory = "chroma_db"
 invoice_csv = "invoice_summary.csv"
 attendance_csv = "attendance_detail.csv"
 embedding_model_name = "BAAI/bge-small-en"
+build_info_file = "build_info.json"
+document_version = 4  # bump when the document texts or chunking change
+default_backend = "chroma"
+backend_directories = {"chroma": persist_directory, "mmap": mmap_index.default_directory}
+
+
+def load_data():
+    """Load the extracted data (typed Parquet store if present, otherwise the CSVs)."""
+    if not invoice_store.data_available():
+        raise FileNotFoundError("❌ Required CSV files are missing. Please generate them first.")
+
+    if invoice_store.store_exists():
+        print(f"📄 Reading {invoice_store.store_dir}/...")
+    else:
+        print(f"📄 Reading {invoice_csv} and {attendance_csv}...")
+    invoice_df = invoice_store.load_invoices()
+    attendance_df = invoice_store.load_attendance(columns=["InvoiceNumber", "Date", "Day", "DogName"])
+    return invoice_df, attendance_df
+
+
+# --- Staleness tracking ---
+def input_files():
+    """The files the vectorstore is built from (the Parquet store if present, otherwise the CSVs)."""
+    return invoice_store.data_files()
+
+
+def input_fingerprint():
+    """Hash of everything that determines the store's contents: input files, model and document version."""
+    return invoice_store.fingerprint_files(input_files(), embedding_model_name, document_version)
+
 
-# --- Load CSVs ---
-if not os.path.exists(invoice_csv) or not os.path.exists(attendance_csv):
-    raise FileNotFoundError("❌ Required CSV files are missing. Please generate them first.")
-
-print(f"📄 Reading {invoice_csv} and {attendance_csv}...")
-invoice_df = pd.read_csv(invoice_csv)
-attendance_df = pd.read_csv(attendance_csv)
-
-invoice_df['TotalAmountDue'] = pd.to_numeric(invoice_df['TotalAmountDue'], errors='coerce').fillna(0)
-attendance_df["ParsedDate"] = pd.to_datetime(attendance_df["Date"], format="%d/%m/%Y", errors="coerce")
-
-documents = []
-
-# --- Invoices as text chunks ---
-for _, row in invoice_df.iterrows():
-    invoice_text = (
-        f"Invoice Number: {row['InvoiceNumber']}. "
-        f"Month Billed: {row['MonthBilledFor']}. "
-        f"Year: {row['Year']}. "
-        f"Client: {row['ClientName']}, Address: {row['ClientAddress']}. "
-        f"Service Provider: {row['ServiceProviderName']}, Address: {row['ServiceProviderAddress']}. "
-        f"Dog Name: {row['DogName']}. "
-        f"Cost Per Day: ${row['OriginalCostPerDay']}, Discount: {row['PercentageDiscount']}%. "
-        f"Total Due: ${row['TotalAmountDue']}. "
-        f"Days Attended: {row['DatesAttendedCount']}."
-    )
-    documents.append(invoice_text)
-
-# --- Attendance as text chunks, with year explicitly included ---
-attendance_years = set()
-for _, row in attendance_df.iterrows():
+def read_build_info(directory=persist_directory):
     try:
-        date_obj = datetime.strptime(row['Date'], "%d/%m/%Y")
-        attendance_years.add(date_obj.year)
-        documents.append(
-            f"{row['DogName']} attended on {row['Date']} ({row['Day']}) in {date_obj.year} under invoice {row['InvoiceNumber']}."
-        )
-    except:
-        documents.append(
-            f"{row['DogName']} attended on {row['Date']} ({row['Day']}) under invoice {row['InvoiceNumber']}."
-        )
-
-# --- Static facts ---
-first_attendance = attendance_df["ParsedDate"].min()
-if pd.notnull(first_attendance):
-    documents.append(f"Snoopy first attended daycare on {first_attendance.strftime('%d/%m/%Y')}.")
-
-# Invoice summary
-documents.append(f"There are {len(invoice_df)} invoices in total.")
-documents.append(f"The total cost for all invoices is ${invoice_df['TotalAmountDue'].sum():.2f}.")
-
-# Attendance year summary
-sorted_years = sorted(attendance_years)
-if sorted_years:
-    documents.append("Snoopy attended doggy daycare in the following years: " + ", ".join(str(y) for y in sorted_years))
-
-# --- Chunking ---
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-chunks = text_splitter.split_text("\n".join(documents))
-
-if os.path.exists(persist_directory):
-    import shutil
-    shutil.rmtree(persist_directory)
-
-embedding = HuggingFaceEmbeddings(model_name=embedding_model_name)
-vectorstore = Chroma.from_texts(chunks, embedding=embedding, persist_directory=persist_directory)
-
-print("✅ Vectorstore created successfully.")
+        with open(os.path.join(directory, build_info_file)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_build_info(chunk_count, directory=persist_directory):
+    info = {
+        "fingerprint": input_fingerprint(),
+        "embedding_model": embedding_model_name,
+        "document_version": document_version,
+        "chunks": chunk_count,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    tmp_path = os.path.join(directory, f"{build_info_file}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, build_info_file))
+    return info
+
+
+def store_is_current(directory=persist_directory):
+    """True when the persisted store (and its lexical index) exists and was built from the current inputs."""
+    if not os.path.exists(os.path.join(directory, lexical_index.index_file)):
+        return False
+    return read_build_info(directory).get("fingerprint") == input_fingerprint()
+
+
+def open_vectorstore(embedding, directory=None, backend=default_backend, dtype=None):
+    """Open the `backend` store ("chroma" or "mmap") in `directory` (by default the backend's own directory)."""
+    directory = directory or backend_directories[backend]
+    if backend == "mmap":
+        return mmap_index.MmapVectorIndex(directory, embedding, dtype)
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=directory, embedding_function=embedding)
+
+
+def build_vectorstore(embedding=None, backend=default_backend, dtype=None,
+                      batch_size=embedding_pipeline.default_batch_size, workers=embedding_pipeline.default_workers,
+                      threads=None, write_batch=vectorstore_sync.write_batch_size, pipeline=None):
+    """
+    Bring the persisted vectorstore up to date with the extracted data and return it.
+
+    Without an `embedding`, new chunks go through the embedding pipeline: model
+    batches of `batch_size`, `threads` intra-op threads, `workers` processes, and
+    at most `write_batch` chunks embedded before they are written to the store.
+    A shared `embedding` built on an existing PipelineEmbeddings passes it as
+    `pipeline`, so its workers are closed and its throughput reported here too.
+    """
+    directory = backend_directories[backend]
+    with tracing.span("load_data"):
+        invoice_df, attendance_df = load_data()
+    records = invoice_documents.iter_records(invoice_df, attendance_df, rollup=rollups.load_or_build())
+
+    # --- Chunking: whole rows packed into chunks, with per-chunk metadata ---
+    chunks = chunking.iter_chunks(records, chunk_size=500)
+    # The lexical (BM25) index is rebuilt from the same chunks as they stream past.
+    lexical = lexical_index.LexicalIndexBuilder()
+    chunks = lexical.track(chunks)
+
+    # --- Incremental upsert into the existing collection ---
+    if embedding is None:
+        pipeline = embedding_pipeline.PipelineEmbeddings(
+            embedding_pipeline.HuggingFaceFactory(embedding_model_name, batch_size), batch_size, workers, threads)
+        embedding = embedding_cache.CachedEmbeddings(pipeline, embedding_model_name)
+    vectorstore = open_vectorstore(embedding, directory, backend, dtype)
+    start = time.perf_counter()
+    # Chunking and embedding happen as the sync pulls chunks, so they are timed inside this span.
+    with tracing.span("sync_vectorstore", backend=backend) as fields:
+        try:
+            stats = vectorstore_sync.sync_vectorstore(vectorstore, chunks, write_batch)
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+        fields.update(stats, items=stats["added"] + stats["unchanged"])
+    elapsed = time.perf_counter() - start
+    tracing.count("chunks_written", stats["added"])
+    with tracing.span("save_indexes"):
+        if backend == "mmap":
+            vectorstore.persist()
+        lexical.build().save(directory)
+        write_build_info(stats["added"] + stats["unchanged"], directory)
+
+    print(f"✅ Vectorstore up to date: {stats['added']} added, {stats['deleted']} deleted, "
+          f"{stats['unchanged']} unchanged chunks in {elapsed:.1f}s.")
+    if pipeline is not None and pipeline.embedded:
+        print(f"🔢 Embedded {pipeline.embedded:,} chunks at {pipeline.rate():.1f} chunks/s "
+              f"(batch {pipeline.batch_size}, {pipeline.workers} worker(s), "
+              f"{pipeline.threads or 'default'} thread(s)).")
+    if hasattr(embedding, "stats"):
+        cache_stats = embedding.stats()
+        print(f"🧠 Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['entries']} entries.")
+    return vectorstore
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the invoice vectorstore.")
+    parser.add_argument("--if-stale", action="store_true",
+                        help="Do nothing when the store was already built from the current inputs.")
+    parser.add_argument("--backend", choices=sorted(backend_directories), default=default_backend,
+                        help="Vector store: Chroma, or the compact memory-mapped index (default: %(default)s).")
+    parser.add_argument("--index-dtype", choices=["float16", "int8"], default=None,
+                        help="Vector storage for the mmap backend (default: float16, or what is already on disk).")
+    parser.add_argument("--batch-size", type=int, default=embedding_pipeline.default_batch_size,
+                        help="Chunks per embedding model batch (default: %(default)s).")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads for the embedding model (default: torch's choice).")
+    parser.add_argument("--embed-workers", type=int, default=embedding_pipeline.default_workers,
+                        help="Processes embedding in parallel, each with its own model (default: %(default)s).")
+    parser.add_argument("--write-batch", type=int, default=vectorstore_sync.write_batch_size,
+                        help="Chunks embedded and written to the store at a time; bounds memory (default: %(default)s).")
+    parser.add_argument("--trace-log", help="Append per-stage timings as JSON lines to this file.")
+    args = parser.parse_args()
+    tracing.configure(args.trace_log)
+    if args.if_stale and store_is_current(backend_directories[args.backend]):
+        print("✅ Vectorstore is already up to date.")
+    else:
+        build_vectorstore(backend=args.backend, dtype=args.index_dtype, batch_size=args.batch_size,
+                          workers=args.embed_workers, threads=args.threads, write_batch=args.write_batch)
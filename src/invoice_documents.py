@@ -0,0 +1,237 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Builds the RAG document texts (invoice, attendance and summary records) from the
+extracted invoice/attendance tables. This is the single place the texts are
+defined, so the ingest script and the Q&A UI (which rebuilds through the ingest
+script) cannot drift apart.
+
+Texts are built with vectorised pandas string/datetime operations instead of
+per-row Python loops, and records are yielded in batches so a history of
+millions of attendance rows never has to sit in memory as one list of strings.
+The summary records come from the rollup tables (rollups.py), one narrative and
+monthly breakdown per client and dog.
+
+Records are (record_key, lines, metadata) triples. Every line in a record is one
+whole row (an invoice, an attendance date, a summary fact) and shares the
+record's metadata, which chunking.py packs into chunks and attaches to each one.
+"""
+
+import calendar
+
+import numpy as np
+import pandas as pd
+
+import rollups
+
+# --- Configuration ---
+default_batch_size = 50_000  # attendance rows turned into text at a time
+# Background the extracted data cannot provide, for the narrative summaries.
+narrative_intros = {
+    ("Charlie Brown", "Snoopy"): "Snoopy is a cheerful Beagle owned by Charlie Brown. "
+                                 "They live together in Bloomington, Minnesota.",
+}
+provider_notes = {
+    "Pawprints and Playcare LLC": "The facility is open seven days a week and is located on Willow Creek Drive. ",
+}
+
+
+def _text(series):
+    return series.astype(str)
+
+
+def invoice_texts(invoice_df):
+    """One text per invoice row, indexed by invoice number."""
+    texts = (
+        "Invoice Number: " + _text(invoice_df["InvoiceNumber"])
+        + ". Month Billed: " + _text(invoice_df["MonthBilledFor"])
+        + ". Year: " + _text(invoice_df["Year"])
+        + ". Client: " + _text(invoice_df["ClientName"]) + ", Address: " + _text(invoice_df["ClientAddress"])
+        + ". Service Provider: " + _text(invoice_df["ServiceProviderName"])
+        + ", Address: " + _text(invoice_df["ServiceProviderAddress"])
+        + ". Dog Name: " + _text(invoice_df["DogName"])
+        + ". Cost Per Day: $" + _text(invoice_df["OriginalCostPerDay"])
+        + ", Discount: " + _text(invoice_df["PercentageDiscount"])
+        + "%. Total Due: $" + _text(invoice_df["TotalAmountDue"])
+        + ". Days Attended: " + _text(invoice_df["DatesAttendedCount"]) + "."
+    )
+    texts.index = invoice_df["InvoiceNumber"].astype(str).values
+    return texts
+
+
+def attendance_texts(attendance_df):
+    """One text per attendance row; the year is included whenever the date parsed."""
+    parsed = attendance_df["ParsedDate"]
+    year = parsed.dt.year.astype("Int64").astype(str)
+    in_year = pd.Series(np.where(parsed.notna(), " in " + year, ""), index=attendance_df.index)
+    return (
+        _text(attendance_df["DogName"]) + " attended on " + _text(attendance_df["Date"])
+        + " (" + _text(attendance_df["Day"]) + ")" + in_year
+        + " under invoice " + _text(attendance_df["InvoiceNumber"]) + "."
+    )
+
+
+def invoice_metadata(invoice_df):
+    """Per-invoice metadata (invoice number, year, month, dog), keyed by invoice number."""
+    columns = invoice_df[["InvoiceNumber", "Year", "MonthBilledFor", "DogName"]].drop_duplicates("InvoiceNumber")
+    years = pd.to_numeric(columns["Year"], errors="coerce")
+    metadata = {}
+    for number, year, month, dog in zip(columns["InvoiceNumber"].astype(str), years,
+                                        columns["MonthBilledFor"], columns["DogName"]):
+        entry = {"invoice_number": number}
+        if pd.notna(year):
+            entry["year"] = int(year)
+        if pd.notna(month):
+            entry["month"] = str(month)
+        if pd.notna(dog):
+            entry["dog"] = str(dog)
+        metadata[number] = entry
+    return metadata
+
+
+def _grouped_by_invoice(attendance_df):
+    """Attendance rows with each invoice's rows contiguous (the extractor already writes them that way)."""
+    numbers = attendance_df["InvoiceNumber"]
+    if (numbers != numbers.shift()).sum() == numbers.nunique():
+        return attendance_df
+    return attendance_df.sort_values("InvoiceNumber", kind="stable")
+
+
+def iter_invoice_records(invoice_df, attendance_df, batch_size=default_batch_size):
+    """
+    Yield lists of records: for each invoice an "invoice:<number>" record holding its
+    invoice line and an "attendance:<number>" record holding its attendance lines.
+
+    Attendance rows are converted `batch_size` rows at a time; an invoice whose rows
+    straddle a batch boundary is carried over to the next batch.
+    """
+    headers = invoice_texts(invoice_df)
+    headers = headers[~headers.index.duplicated(keep="first")].to_dict()
+    metadata = invoice_metadata(invoice_df)
+    emitted = set()
+    attendance_df = _grouped_by_invoice(attendance_df)
+    carry_key, carry_lines = None, []
+
+    def records_for(number, lines):
+        emitted.add(number)
+        base = metadata.get(number, {"invoice_number": number})
+        records = []
+        if number in headers:
+            records.append((f"invoice:{number}", [headers[number]], {**base, "record_type": "invoice"}))
+        if lines:
+            records.append((f"attendance:{number}", lines, {**base, "record_type": "attendance"}))
+        return records
+
+    for start in range(0, len(attendance_df), batch_size):
+        batch = attendance_df.iloc[start:start + batch_size]
+        lines = attendance_texts(batch).tolist()
+        numbers = batch["InvoiceNumber"].astype(str).to_numpy()
+        # Rows are contiguous per invoice, so groups are the runs between these boundaries.
+        starts = np.flatnonzero(np.r_[True, numbers[1:] != numbers[:-1]])
+        ends = np.r_[starts[1:], len(numbers)]
+
+        records = []
+        for group_start, group_end in zip(starts, ends):
+            number = numbers[group_start]
+            if number == carry_key:
+                carry_lines.extend(lines[group_start:group_end])
+                continue
+            if carry_key is not None:
+                records.extend(records_for(carry_key, carry_lines))
+            carry_key, carry_lines = number, lines[group_start:group_end]
+        if records:
+            yield records
+
+    final = records_for(carry_key, carry_lines) if carry_key is not None else []
+    # Invoices without any attendance rows still get a record.
+    for number in headers:
+        if number not in emitted:
+            final.extend(records_for(number, []))
+    if final:
+        yield final
+
+
+def _dog_names(pairs):
+    dogs = sorted({dog for _, dog in pairs})
+    return dogs[0] if len(dogs) == 1 else "The dogs"
+
+
+def build_narrative(client, dog, stats):
+    """Narrative summary of one dog's attendance history, from its rollup stats (see rollups.summarize)."""
+    profile = stats["profile"]
+    provider = profile.get("provider") or "the daycare"
+    discount = profile.get("discount") or "0"
+    day, _ = rollups.most_common_day(stats)
+    gap = stats["gap"][0] if stats["gap"] else 0
+    intro = narrative_intros.get((client, dog), f"{dog} is a dog owned by {client}.")
+
+    return f"""{intro} {client} and {dog}'s full address is: {profile.get('client_address', '')}
+Each week, {dog} attends doggy daycare at {provider}, a local service offering structured care for dogs.
+{provider_notes.get(provider, '')}The full address of {provider} is: {profile.get('provider_address', '')}.
+Every month, {provider} invoices {client} for {dog}’s visits, applying a {discount}% loyalty discount.
+{dog}'s first attendance was on {stats['first'].strftime('%d %B %Y')} ({stats['first'].strftime('%A')}).
+{dog}'s most recent attendance was on {stats['last'].strftime('%d %B %Y')} ({stats['last'].strftime('%A')}).
+Total days attended by {dog}: {stats['days']}.
+Average cost per day for {dog}: ${stats['cost'] / stats['days']:.2f}.
+{dog}'s most frequent day: {day}s.
+{dog}'s longest gap between visits: {gap} days.
+Total cost across {dog}'s invoices: ${stats['cost']:.2f}.
+Years {dog} attended: {', '.join(str(year) for year in stats['years'])}.
+Total invoices for {dog}: {stats['invoices']}.
+"""
+
+
+def build_monthly_breakdown(dog, stats):
+    monthly_lines = [f"Monthly attendance breakdown for {dog}:"]
+    monthly_lines += [f"- {dog}, {calendar.month_name[month]} {year}: {days} attendances"
+                      for year, month, days in stats["monthly"]]
+    return "\n".join(monthly_lines)
+
+
+def summary_records(rollup):
+    """
+    Whole-history facts from the rollup tables: first attendance, invoice count,
+    total cost, years, and a narrative and monthly breakdown record per (client, dog)
+    carrying the client and dog in its metadata.
+    """
+    facts = []
+    by_pair = rollup.by_pair()
+    per_pair = [(client, dog, rollups.summarize(items)) for (client, dog), items in by_pair.items()]
+    overall = rollups.summarize([item for items in by_pair.values() for item in items])
+    attended = [(stats["first"], dog) for _, dog, stats in per_pair if stats["first"] is not None]
+
+    if attended:
+        first_attendance, dog = min(attended)
+        facts.append(("summary:first_attendance",
+                      f"{dog} first attended daycare on {first_attendance.strftime('%d/%m/%Y')}."))
+
+    facts.append(("summary:invoice_count", f"There are {overall['invoices']} invoices in total."))
+    facts.append(("summary:total_cost", f"The total cost for all invoices is ${overall['cost']:.2f}."))
+
+    if attended:
+        facts.append(("summary:attendance_years",
+                      f"{_dog_names(by_pair)} attended doggy daycare in the following years: "
+                      + ", ".join(str(year) for year in overall["years"])))
+
+    records = [(key, text.strip().split("\n"), {"record_type": "summary"}) for key, text in facts]
+    for client, dog, stats in per_pair:
+        if not stats["days"]:
+            continue
+        metadata = {"record_type": "summary", "client": client, "dog": dog}
+        records.append((f"summary:narrative:{client}:{dog}",
+                        build_narrative(client, dog, stats).strip().split("\n"), metadata))
+        records.append((f"summary:monthly_breakdown:{client}:{dog}",
+                        build_monthly_breakdown(dog, stats).strip().split("\n"), dict(metadata)))
+    return records
+
+
+def iter_records(invoice_df, attendance_df, batch_size=default_batch_size, rollup=None):
+    """
+    Yield every (record_key, lines, metadata) record: invoice records in batches, then
+    the summaries, from `rollup` (see rollups.py) or else rollups built from the frames.
+    """
+    for batch in iter_invoice_records(invoice_df, attendance_df, batch_size):
+        yield from batch
+    yield from summary_records(rollup or rollups.Rollups.from_frames(invoice_df, attendance_df))
@@ -0,0 +1,257 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Typed columnar copy of the extracted invoice data. 'csv_builder.py' can write the
+invoice summary and attendance rows as Parquet files with a fixed schema (decimal
+amounts, real dates, categorical month/day/dog names), partitioned by year:
+
+    invoice_store/invoices/Year=2017/part-0.parquet
+    invoice_store/attendance/Year=2017/part-0.parquet
+
+'ingest_invoices_hybrid.py' and 'demo_ui_hybrid.py' load their tables through
+load_invoices()/load_attendance(), which read only the requested columns from the
+store and fall back to the CSV files when the store (or pyarrow) is not available.
+Both paths return the same shape: numeric TotalAmountDue, a 'ParsedDate' datetime
+column alongside the dd/mm/yyyy 'Date' strings.
+"""
+
+import os
+import shutil
+import hashlib
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the Parquet store
+    pa = None
+
+# --- Configuration ---
+store_dir = "invoice_store"
+invoice_csv = "invoice_summary.csv"
+attendance_csv = "attendance_detail.csv"
+date_format = "%d/%m/%Y"
+unknown_year = 0  # partition used for rows whose year could not be extracted
+
+invoice_columns = [
+    "InvoiceNumber", "ServiceProviderName", "ServiceProviderAddress", "ClientName", "ClientAddress",
+    "MonthBilledFor", "Year", "DogName", "OriginalCostPerDay", "PercentageDiscount", "TotalAmountDue",
+    "DatesAttendedCount",
+]
+attendance_columns = ["InvoiceNumber", "Date", "Day", "DogName"]
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("❌ The Parquet store needs pyarrow. Install it with: pip install pyarrow")
+
+
+def invoice_schema():
+    """Schema of the invoice partition files (Year lives in the partition path)."""
+    require_pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("InvoiceNumber", pa.string()),
+        ("ServiceProviderName", category),
+        ("ServiceProviderAddress", category),
+        ("ClientName", category),
+        ("ClientAddress", category),
+        ("MonthBilledFor", category),
+        ("DogName", category),
+        ("OriginalCostPerDay", pa.decimal128(9, 2)),
+        ("PercentageDiscount", pa.int16()),
+        ("TotalAmountDue", pa.decimal128(12, 2)),
+        ("DatesAttendedCount", pa.int32()),
+    ])
+
+
+def attendance_schema():
+    """Schema of the attendance partition files (Year lives in the partition path)."""
+    require_pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("InvoiceNumber", pa.string()),
+        ("Date", pa.date32()),
+        ("Day", category),
+        ("DogName", category),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("Year", pa.int16())]), flavor="hive")
+
+
+def _as_strings(series):
+    """Column values as an Arrow string array with blanks turned into nulls."""
+    values = series.astype("string").str.strip().replace("", pd.NA)
+    return pa.array(values, type=pa.string(), from_pandas=True)
+
+
+def _typed_column(series, field):
+    strings = _as_strings(series)
+    if field.type == pa.date32():
+        return pc.strptime(strings, format=date_format, unit="s", error_is_null=True).cast(pa.date32())
+    if pa.types.is_dictionary(field.type):
+        return strings.dictionary_encode()
+    return pc.cast(strings, field.type)
+
+
+def to_typed_table(df, schema):
+    """Convert a stringly-typed extraction frame into an Arrow table with `schema`."""
+    columns = [_typed_column(df[field.name], field) for field in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def invoice_years(summary_df):
+    return pd.to_numeric(summary_df["Year"], errors="coerce").fillna(unknown_year).astype(int)
+
+
+def attendance_years(attendance_df):
+    parsed = pd.to_datetime(attendance_df["Date"], format=date_format, errors="coerce")
+    return parsed.dt.year.fillna(unknown_year).astype(int)
+
+
+def _write_partitions(df, years, schema, table_dir, only_years=None):
+    """Write one Parquet file per year; with `only_years`, leave other partitions alone."""
+    present = set(years.unique())
+    if only_years is None:
+        if os.path.exists(table_dir):
+            shutil.rmtree(table_dir)
+        rewrite = present
+    else:
+        rewrite = set(only_years)
+
+    for year in sorted(rewrite):
+        partition_dir = os.path.join(table_dir, f"Year={year}")
+        if os.path.exists(partition_dir):
+            shutil.rmtree(partition_dir)
+        if year not in present:
+            continue
+        os.makedirs(partition_dir, exist_ok=True)
+        table = to_typed_table(df[years == year], schema)
+        pq.write_table(table, os.path.join(partition_dir, "part-0.parquet"))
+
+
+def write_store(summary_df, attendance_df, changed_invoice_years=None, changed_attendance_years=None,
+                directory=store_dir):
+    """
+    Write the extracted rows to the Parquet store.
+
+    The frames hold the same string values that go into the CSV files. When the
+    changed_*_years sets are given only those year partitions are rewritten, which
+    keeps incremental runs cheap on a large archive.
+    """
+    require_pyarrow()
+    _write_partitions(summary_df, invoice_years(summary_df), invoice_schema(),
+                      os.path.join(directory, "invoices"), changed_invoice_years)
+    _write_partitions(attendance_df, attendance_years(attendance_df), attendance_schema(),
+                      os.path.join(directory, "attendance"), changed_attendance_years)
+
+
+def store_exists(directory=store_dir):
+    return (
+        pa is not None
+        and os.path.isdir(os.path.join(directory, "invoices"))
+        and os.path.isdir(os.path.join(directory, "attendance"))
+    )
+
+
+def data_available(directory=store_dir):
+    """True when either the Parquet store or both CSV files exist."""
+    return store_exists(directory) or (os.path.exists(invoice_csv) and os.path.exists(attendance_csv))
+
+
+def data_files(directory=store_dir):
+    """The files the extracted data is read from: the Parquet store if present, otherwise the CSVs."""
+    if store_exists(directory):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+    return [invoice_csv, attendance_csv]
+
+
+def fingerprint_files(paths, *extra):
+    """Hash of the paths' sizes and mtimes (missing files are skipped) plus any `extra` values."""
+    digest = hashlib.sha256("\0".join(str(value) for value in extra).encode())
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def data_fingerprint(directory=store_dir):
+    """Fingerprint of the data files; changes whenever the extracted data is rewritten."""
+    return fingerprint_files(data_files(directory))
+
+
+def remove_store(directory=store_dir):
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+
+
+def _read_table(table_dir, schema, columns):
+    dataset = ds.dataset(table_dir, format="parquet", schema=schema.append(pa.field("Year", pa.int16())),
+                         partitioning=_partitioning())
+    table = dataset.to_table(columns=columns)
+    # Amounts are stored as exact decimals; the consumers aggregate them as floats.
+    decimals = [field.name for field in table.schema if pa.types.is_decimal(field.type)]
+    for name in decimals:
+        index = table.schema.get_field_index(name)
+        table = table.set_column(index, name, table.column(name).cast(pa.float64()))
+    return table.to_pandas()
+
+
+def load_invoices(columns=None, directory=store_dir):
+    """Invoice summary rows (only `columns`, if given) with a numeric TotalAmountDue."""
+    if store_exists(directory):
+        df = _read_table(os.path.join(directory, "invoices"), invoice_schema(), columns or invoice_columns)
+    else:
+        df = pd.read_csv(invoice_csv, usecols=columns)
+    if "TotalAmountDue" in df.columns:
+        df["TotalAmountDue"] = pd.to_numeric(df["TotalAmountDue"], errors="coerce").fillna(0)
+    return df
+
+
+def load_attendance(columns=None, directory=store_dir):
+    """Attendance rows (only `columns`, if given) plus a 'ParsedDate' column when 'Date' is loaded."""
+    if store_exists(directory):
+        df = _read_table(os.path.join(directory, "attendance"), attendance_schema(),
+                         columns or attendance_columns)
+        if "Date" in df.columns:
+            df["ParsedDate"] = pd.to_datetime(df["Date"])
+            df["Date"] = df["ParsedDate"].dt.strftime(date_format)
+    else:
+        csv_columns = None if columns is None else [c for c in columns if c != "Year"]
+        df = pd.read_csv(attendance_csv, usecols=csv_columns)
+        if "Date" in df.columns:
+            df["ParsedDate"] = pd.to_datetime(df["Date"], format=date_format, errors="coerce")
+        if columns is not None and "Year" in columns:
+            df["Year"] = attendance_years(df)
+    return df
+
+
+def _text(series, number_format=None):
+    """Render a typed column back to the extractor's string form ('' for missing values)."""
+    if number_format:
+        return series.map(lambda value: "" if pd.isna(value) else format(value, number_format))
+    return series.astype(object).map(lambda value: "" if pd.isna(value) else str(value))
+
+
+def load_raw_frames(directory=store_dir):
+    """Read the store back as the string-valued frames the extractor produces (used for upserts)."""
+    summary = load_invoices(directory=directory)[invoice_columns]
+    summary = pd.DataFrame({
+        name: _text(summary[name], {"OriginalCostPerDay": ".2f", "TotalAmountDue": ".2f",
+                                    "PercentageDiscount": ".0f", "DatesAttendedCount": ".0f"}.get(name))
+        for name in invoice_columns
+    })
+    summary.loc[summary["Year"] == str(unknown_year), "Year"] = ""
+
+    attendance = load_attendance(directory=directory)[attendance_columns]
+    attendance = pd.DataFrame({name: _text(attendance[name]) for name in attendance_columns})
+    return summary, attendance
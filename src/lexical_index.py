@@ -0,0 +1,154 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+In-process BM25 inverted index over the same chunks that go into Chroma. Dense
+embeddings are poor at exact tokens such as invoice numbers ('INV-2021-07') or
+dates ('03/10/2019'); the lexical index keeps those as whole tokens, so a
+question naming one finds the chunks that contain it.
+
+The index is built during ingestion (ingest_invoices_hybrid.py) and saved as
+'chroma_db/lexical_index.json' next to the vectorstore. It stores each chunk's
+text and metadata as well, so lexical hits can be returned without touching
+Chroma or the embedding model.
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter
+
+import chunking
+
+# --- Configuration ---
+index_file = "lexical_index.json"
+index_version = 1
+k1 = 1.5
+b = 0.75
+
+# Compound tokens such as 'inv-2021-07', '03/10/2019' or '22.5' are kept whole;
+# their parts ('inv', '2021', '07') are indexed as well.
+token_pattern = re.compile(r"[a-z0-9]+(?:[-/.:][a-z0-9]+)*")
+part_pattern = re.compile(r"[a-z0-9]+")
+exact_pattern = re.compile(r"\bINV-\d{4}-\d{2}(?:-\d+)?\b|\b\d{2}/\d{2}/\d{4}\b", re.IGNORECASE)
+
+
+def tokenize(text):
+    tokens = []
+    for token in token_pattern.findall(text.lower()):
+        tokens.append(token)
+        parts = part_pattern.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def exact_terms(query):
+    """Invoice numbers and dd/mm/yyyy dates in the question, as index tokens."""
+    return sorted({term.lower() for term in exact_pattern.findall(query)})
+
+
+class LexicalIndex:
+    def __init__(self, ids, texts, metadatas, doc_lengths, postings):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.doc_lengths = doc_lengths
+        self.postings = postings  # term -> [doc indices, term frequencies]
+        self.average_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def document(self, index):
+        return self.ids[index], self.texts[index], self.metadatas[index]
+
+    def search(self, query, k=10, where=None):
+        """Top `k` (score, doc index) pairs by BM25, restricted to chunks matching `where`."""
+        scores = {}
+        n = len(self.ids)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            docs, tfs = posting
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc, tf in zip(docs, tfs):
+                norm = k1 * (1 - b + b * self.doc_lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        candidates = ((score, doc) for doc, score in scores.items()
+                      if where is None or chunking.matches(self.metadatas[doc], where))
+        return heapq.nlargest(k, candidates)
+
+    def exact(self, terms, where=None):
+        """Doc indices containing every one of `terms`, in index order."""
+        docs = None
+        for term in terms:
+            posting = self.postings.get(term)
+            found = set(posting[0]) if posting else set()
+            docs = found if docs is None else docs & found
+        return [doc for doc in sorted(docs or ())
+                if where is None or chunking.matches(self.metadatas[doc], where)]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": index_version,
+            "ids": self.ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        tmp_path = os.path.join(directory, f"{index_file}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(directory, index_file))
+
+    @classmethod
+    def load(cls, directory):
+        """The saved index, or None if it is missing or from another index version."""
+        try:
+            with open(os.path.join(directory, index_file)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != index_version:
+            return None
+        return cls(data["ids"], data["texts"], data["metadatas"], data["doc_lengths"], data["postings"])
+
+
+class LexicalIndexBuilder:
+    """Collects chunks as they stream past (see track) and builds the index from them."""
+
+    def __init__(self):
+        self.ids, self.texts, self.metadatas, self.doc_lengths = [], [], [], []
+        self.postings = {}
+        self._seen = set()
+
+    def add(self, cid, text, metadata):
+        if cid in self._seen:
+            return
+        self._seen.add(cid)
+        doc = len(self.ids)
+        counts = Counter(tokenize(text))
+        self.ids.append(cid)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            posting = self.postings.setdefault(term, [[], []])
+            posting[0].append(doc)
+            posting[1].append(tf)
+
+    def track(self, chunks):
+        """Pass `chunks` through unchanged, indexing each one on the way."""
+        for chunk in chunks:
+            self.add(*chunk)
+            yield chunk
+
+    def build(self):
+        return LexicalIndex(self.ids, self.texts, self.metadatas, self.doc_lengths, self.postings)
@@ -0,0 +1,167 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Synthetic concurrent load against the Q&A handler (demo_ui_hybrid.ask_question),
+with the LLM replaced by the fake Ollama server and the embedding model by
+hashing embeddings with a fixed cost per forward pass. `--clients` simulated users
+send questions back to back, at most `--concurrency` are answered at once (as the
+Gradio queue would allow), and the script reports:
+
+- throughput (questions per second),
+- p50 / p95 latency to the full answer and to the first token,
+- how well concurrent query embeddings were micro-batched.
+
+The structured router and the answer cache are off unless asked for, so every
+question goes through retrieval and generation.
+
+Usage:
+    python src/load_test.py --clients 16 --requests 200 --concurrency 8
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import numpy as np
+
+import chunking
+import answer_cache
+import embedding_cache
+import fake_embeddings
+import fake_ollama
+import hybrid_retrieval
+import invoice_documents
+import lexical_index
+import ollama_client
+import qa_chain
+import demo_ui_hybrid as ui
+import ingest_invoices_hybrid as ingest
+
+# --- Configuration ---
+model_name = fake_ollama.default_models[0]
+question_templates = [
+    "Who does {dog} live with and where?",
+    "What does {dog} do at daycare in {month} {year}?",
+    "Which days did {dog} go to daycare in {month} {year}?",
+    "Tell me about the invoice for {month} {year}.",
+    "What discount does {dog} get and why?",
+    "Describe {dog}'s attendance pattern in {year}.",
+]
+
+
+def make_questions(count, seed=0):
+    rng = random.Random(seed)
+    months = ["January", "March", "June", "September", "November"]
+    return [rng.choice(question_templates).format(dog="Snoopy", month=rng.choice(months),
+                                                  year=rng.randint(2017, 2024)) for _ in range(count)]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def build_stack(server, forward_delay, batch_window, use_router, use_answer_cache, concurrency):
+    """Wire the UI module to the fake LLM, hashing embeddings and in-memory indexes built from the current data."""
+    model = fake_embeddings.HashingEmbeddings(forward_delay=forward_delay)
+    batched = embedding_cache.BatchedQueryEmbeddings(model, batch_window) if batch_window else None
+    embedding = batched or model
+
+    invoice_df, attendance_df = ingest.load_data()
+    chunks = list(chunking.iter_chunks(invoice_documents.iter_records(invoice_df, attendance_df)))
+    builder = lexical_index.LexicalIndexBuilder()
+    for chunk in chunks:
+        builder.add(*chunk)
+    vectorstore = fake_embeddings.InMemoryVectorstore(embedding)
+    vectorstore.add_texts([text for _, text, _ in chunks], [metadata for _, _, metadata in chunks])
+
+    ui.client = ollama_client.OllamaClient(server.base_url, pool_size=max(concurrency, 1))
+    ui.embedding = embedding
+    ui.vectorstore = vectorstore
+    ui.hybrid = hybrid_retrieval.HybridSearch(builder.build(), vectorstore)
+    ui.chains = qa_chain.ChainPool(ui.client, ui.hybrid)
+    ui.answers = answer_cache.AnswerCache(embedding.embed_query if use_answer_cache else None,
+                                          max_entries=answer_cache.default_max_entries if use_answer_cache else 0)
+    ui.router = ui.load_router() if use_router else None
+    return batched
+
+
+async def run_load(questions, clients, concurrency):
+    """Send `questions` from `clients` concurrent users; returns (wall time, latencies, first-token latencies)."""
+    pending = list(questions)
+    latencies, first_tokens = [], []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def user():
+        while pending:
+            question = pending.pop()
+            async with gate:
+                start = time.perf_counter()
+                first = None
+                async for _ in ui.ask_question(model_name, question, True):
+                    if first is None:
+                        first = time.perf_counter() - start
+                latencies.append(time.perf_counter() - start)
+                first_tokens.append(first)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(clients)))
+    return time.perf_counter() - start, latencies, first_tokens
+
+
+def run(clients=8, requests=100, concurrency=8, token_delay=0.005, forward_delay=0.02,
+        batch_window=embedding_cache.default_batch_window, use_router=False, use_answer_cache=False, seed=0):
+    server = fake_ollama.start_server(token_delay=token_delay)
+    try:
+        batched = build_stack(server, forward_delay, batch_window, use_router, use_answer_cache, concurrency)
+        questions = make_questions(requests, seed)
+        elapsed, latencies, first_tokens = asyncio.run(run_load(questions, clients, concurrency))
+    finally:
+        server.shutdown()
+    report = {
+        "clients": clients,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+        "first_token_p50_ms": percentile(first_tokens, 50),
+        "first_token_p95_ms": percentile(first_tokens, 95),
+    }
+    if batched is not None:
+        report["embedding"] = batched.batch_stats()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Q&A throughput and latency under concurrent load.")
+    parser.add_argument("--clients", type=int, default=8, help="Simulated concurrent users.")
+    parser.add_argument("--requests", type=int, default=100, help="Total questions to send.")
+    parser.add_argument("--concurrency", type=int, default=ui.default_concurrency,
+                        help="Questions answered at once (the UI's --concurrency).")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Fake LLM seconds per token.")
+    parser.add_argument("--forward-delay", type=float, default=0.02,
+                        help="Fake embedding model seconds per forward pass.")
+    parser.add_argument("--batch-window", type=float, default=embedding_cache.default_batch_window,
+                        help="Query embedding micro-batch window in seconds (0 disables batching).")
+    parser.add_argument("--router", action="store_true", help="Answer aggregate questions via the structured router.")
+    parser.add_argument("--answer-cache", action="store_true", help="Enable the answer cache.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    report = run(args.clients, args.requests, args.concurrency, args.token_delay, args.forward_delay,
+                 args.batch_window, args.router, args.answer_cache)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"✅ {report['requests']} questions from {report['clients']} clients "
+              f"(concurrency {report['concurrency']}): {report['qps']:.1f} QPS")
+        print(f"⏱️ Latency p50 {report['latency_p50_ms']:.0f} ms, p95 {report['latency_p95_ms']:.0f} ms; "
+              f"first token p50 {report['first_token_p50_ms']:.0f} ms, p95 {report['first_token_p95_ms']:.0f} ms")
+        if "embedding" in report:
+            stats = report["embedding"]
+            print(f"🧠 Query embeddings: {stats['queries']} in {stats['batches']} batches "
+                  f"(mean batch {stats['mean_batch_size']:.1f})")
@@ -9,11 +9,15 @@ This script presents a simple menu interface that allows the user to:
 3. Load the system and launch the Q&A UI.
 4. Run the entire workflow end-to-end.
 It simplifies the user experience for demonstrations and testing.
+
+Loading runs in this process through pipeline.py, which skips extraction and
+ingestion when their inputs have not changed and loads the embedding model once.
 """
 
 import os
 import shutil
-import subprocess
+import generate_invoices
+import pipeline
 
 #--------------------------------------------------------------------
 # Fake keys for testing scanning
@@ -24,8 +28,9 @@ AWS_SECRET_ACCESS_KEY = "wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY"
 
 def clean_environment():
     print("🧹 Cleaning environment...")
-    folders_to_delete = ["invoices", "chroma_db"]
-    files_to_delete = ["invoice_summary.csv", "attendance_detail.csv"]
+    folders_to_delete = ["invoices", "chroma_db", "invoice_store", "vector_index", "rollups"]
+    files_to_delete = ["invoice_summary.csv", "attendance_detail.csv", "invoice_manifest.json",
+                       "extraction_report.json", pipeline.state_file]
 
     for folder in folders_to_delete:
         if os.path.exists(folder):
@@ -41,15 +46,12 @@ def clean_environment():
 
 def create_test_invoices():
     print("📄 Generating test invoices...")
-    os.makedirs("invoices", exist_ok=True)
-    subprocess.run(["python", "src/generate_invoices.py"])
+    generate_invoices.generate()
     print("✅ Test invoices created.\n")
 
 def load_and_launch():
     print("🚀 Ingesting invoices and launching Q&A UI...")
-    subprocess.run(["python", "src/csv_builder.py"])
-    subprocess.run(["python", "src/ingest_invoices_hybrid.py"])
-    subprocess.run(["python", "src/demo_ui_hybrid.py"])
+    pipeline.run_pipeline(["serve"])
 
 def run_everything():
     clean_environment()
@@ -0,0 +1,258 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Compact alternative to Chroma for the vectorstore. For a corpus of up to a few
+hundred thousand chunks an exact, vectorised NumPy scan is fast enough, and it
+avoids Chroma's SQLite + HNSW startup cost and memory.
+
+Layout of the index directory (default 'vector_index/'):
+- meta.json     format version, vector dtype, dimension and row count
+- vectors.bin   one row per chunk, memory-mapped: float16, or int8 with a per-row
+                scale in scales.bin (float32)
+- docs.json     sidecar arrays of chunk IDs, texts and metadata, row-aligned
+
+Vectors are L2-normalised, so the score is cosine similarity. Metadata filters
+(the Chroma `where` subset from chunking.metadata_filter) are evaluated as
+vectorised masks over per-key code arrays before scoring, so a filtered search
+only scores the matching rows.
+
+MmapVectorIndex offers the calls the rest of the code makes on Chroma (get,
+add_texts, delete, similarity_search, similarity_search_by_vector,
+similarity_search_with_relevance_scores), so
+vectorstore_sync and HybridSearch work with either backend. Added rows are
+appended to spool files next to the index as each batch arrives (pending.*), so
+memory stays bounded by the write batch; persist() merges them and the deletes
+into new files and swaps them in atomically. Spool files left by an interrupted
+run are overwritten by the next write.
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+
+# --- Configuration ---
+index_version = 1
+default_directory = "vector_index"
+default_dtype = "float16"  # or "int8"
+block_rows = 4096           # rows scored per block; small blocks keep the float32 working copy in cache
+spool_files = {"vectors": "pending.vectors.bin", "scales": "pending.scales.bin", "docs": "pending.docs.jsonl"}
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize(vectors, dtype):
+    """(stored rows, per-row scales or None) for normalised float32 `vectors`."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported dtype: {dtype}")
+
+
+class MmapVectorIndex:
+    def __init__(self, directory=default_directory, embedding=None, dtype=None):
+        """`dtype` None opens whatever is on disk (float16 if new); an index stored in another dtype is discarded."""
+        self.directory = directory
+        self.embedding = embedding
+        self.requested_dtype = dtype
+        self.dtype = dtype or default_dtype
+        self.dim = None
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.vectors = None
+        self.scales = None
+        self._columns = None
+        self._deleted = set()
+        self._pending_ids = []  # rows spooled to disk since the last persist()
+        self._spool = None
+        self._load()
+
+    # --- Files ---
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+            with open(self._path("docs.json")) as f:
+                docs = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("version") != index_version:
+            return
+        if self.requested_dtype and meta["dtype"] != self.requested_dtype:
+            return
+        self.dtype, self.dim, count = meta["dtype"], meta["dim"], meta["count"]
+        self.ids, self.texts, self.metadatas = docs["ids"], docs["texts"], docs["metadatas"]
+        if count:
+            self.vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r", shape=(count, self.dim))
+            if self.dtype == "int8":
+                self.scales = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r", shape=(count,))
+
+    def _discard_spool(self):
+        for name in spool_files.values():
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def _spool_files(self):
+        if self._spool is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # "wb": spool files left by an interrupted run are started afresh.
+            self._spool = {key: open(self._path(name), "wb") for key, name in spool_files.items()}
+        return self._spool
+
+    def persist(self):
+        """Merge the spooled adds and the deletes into the index files and reopen them."""
+        if not self._pending_ids and not self._deleted:
+            return
+        if self._spool is not None:
+            for f in self._spool.values():
+                f.close()
+            self._spool = None
+        os.makedirs(self.directory, exist_ok=True)
+        keep = np.array([cid not in self._deleted for cid in self.ids], dtype=bool)
+        ids = [cid for cid, kept in zip(self.ids, keep) if kept]
+        texts = [text for text, kept in zip(self.texts, keep) if kept]
+        metadatas = [metadata for metadata, kept in zip(self.metadatas, keep) if kept]
+
+        with open(self._path("vectors.bin.tmp"), "wb") as vectors_file, \
+                open(self._path("scales.bin.tmp"), "wb") as scales_file:
+            for start in range(0, len(keep), block_rows):
+                block_keep = keep[start:start + block_rows]
+                vectors_file.write(np.ascontiguousarray(self.vectors[start:start + block_rows][block_keep]).tobytes())
+                if self.scales is not None:
+                    scales_file.write(np.ascontiguousarray(self.scales[start:start + block_rows][block_keep]).tobytes())
+            if self._pending_ids:
+                with open(self._path(spool_files["vectors"]), "rb") as f:
+                    shutil.copyfileobj(f, vectors_file)
+                with open(self._path(spool_files["scales"]), "rb") as f:
+                    shutil.copyfileobj(f, scales_file)
+                with open(self._path(spool_files["docs"]), encoding="utf-8") as f:
+                    for line in f:
+                        cid, text, metadata = json.loads(line)
+                        ids.append(cid)
+                        texts.append(text)
+                        metadatas.append(metadata)
+
+        # Release the old maps before replacing the files under them.
+        self.vectors = self.scales = None
+        with open(self._path("docs.json.tmp"), "w") as f:
+            json.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, f, separators=(",", ":"))
+        with open(self._path("meta.json.tmp"), "w") as f:
+            json.dump({"version": index_version, "dtype": self.dtype, "dim": self.dim, "count": len(ids)}, f)
+        for name in ("vectors.bin", "scales.bin", "docs.json", "meta.json"):
+            os.replace(self._path(f"{name}.tmp"), self._path(name))
+
+        self._pending_ids, self._deleted, self._columns = [], set(), None
+        self._discard_spool()
+        self._load()
+
+    # --- Chroma-compatible writes ---
+    def get(self, include=None):
+        return {"ids": [cid for cid in self.ids if cid not in self._deleted] + self._pending_ids}
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids)
+        vectors = _normalise(self.embedding.embed_documents(texts))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        stored, scales = quantize(vectors, self.dtype)
+        spool = self._spool_files()
+        spool["vectors"].write(stored.tobytes())
+        if scales is not None:
+            spool["scales"].write(scales.tobytes())
+        spool["docs"].write("".join(json.dumps([cid, text, metadata], separators=(",", ":")) + "\n"
+                                    for cid, text, metadata in zip(ids, texts, metadatas)).encode("utf-8"))
+        for f in spool.values():
+            f.flush()
+        self._pending_ids += ids
+        return ids
+
+    def delete(self, ids):
+        self._deleted.update(ids)
+
+    # --- Search ---
+    def __len__(self):
+        return len(self.ids)
+
+    def _column(self, key):
+        """(codes per row, value -> code) for one metadata key; -1 where the key is absent."""
+        if self._columns is None:
+            self._columns = {}
+        if key not in self._columns:
+            lookup = {}
+            codes = np.fromiter((lookup.setdefault(metadata[key], len(lookup)) if key in metadata else -1
+                                 for metadata in self.metadatas), dtype=np.int32, count=len(self.metadatas))
+            self._columns[key] = (codes, lookup)
+        return self._columns[key]
+
+    def _mask(self, where):
+        if "$or" in where:
+            return np.logical_or.reduce([self._mask(condition) for condition in where["$or"]])
+        if "$and" in where:
+            return np.logical_and.reduce([self._mask(condition) for condition in where["$and"]])
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, value in where.items():
+            codes, lookup = self._column(key)
+            code = lookup.get(value)
+            mask &= (codes == code) if code is not None else False
+        return mask
+
+    def _scores(self, rows, query):
+        """Cosine scores of `query` against `rows` (sorted row numbers), block by block."""
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), block_rows):
+            block = rows[start:start + block_rows]
+            contiguous = len(block) and block[-1] - block[0] == len(block) - 1
+            stored = self.vectors[block[0]:block[-1] + 1] if contiguous else self.vectors[block]
+            block_scores = stored.astype(np.float32) @ query
+            if self.scales is not None:
+                block_scores *= self.scales[block[0]:block[-1] + 1] if contiguous else self.scales[block]
+            scores[start:start + len(block)] = block_scores
+        return scores
+
+    def search_rows(self, vector, k=4, filter=None):
+        """Exact top-`k` (row, score) pairs for `vector`, restricted to rows matching `filter`."""
+        if self.vectors is None or not len(self.ids):
+            return []
+        query = _normalise(vector).astype(np.float32)
+        if filter:
+            rows = np.flatnonzero(self._mask(filter))
+        else:
+            rows = np.arange(len(self.ids))
+        if self._deleted:
+            rows = rows[[self.ids[row] not in self._deleted for row in rows]]
+        if not len(rows):
+            return []
+        scores = self._scores(rows, query)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _document(self, row):
+        from langchain_core.documents import Document  # deferred: LangChain is only needed once searching
+        return Document(page_content=self.texts[row], metadata=self.metadatas[row])
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        return [self._document(row) for row, _ in self.search_rows(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+        """(Document, cosine similarity) pairs, best first."""
+        return [(self._document(row), score)
+                for row, score in self.search_rows(self.embedding.embed_query(query), k, filter)]
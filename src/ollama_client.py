@@ -0,0 +1,98 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Small client for the Ollama HTTP API used by the Q&A UI. One requests.Session is
+shared by every call, so connections to Ollama are pooled and kept alive instead
+of being opened per question. Model discovery has a short, bounded timeout so a
+slow or absent Ollama cannot hang the UI at startup, and generation streams the
+answer token by token. The prompt and answer token counts Ollama reports at the
+end of a generation are attached to the request's tracing record.
+
+API calls used:
+    GET  /api/tags       list installed models
+    POST /api/generate   generate (streamed as newline-delimited JSON); an empty
+                         prompt just loads the model into memory (preload)
+"""
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+# --- Configuration ---
+default_base_url = "http://localhost:11434"
+discovery_timeout = 2.0          # seconds, for listing models
+connect_timeout = 3.05
+generate_timeout = 300.0         # seconds to wait between streamed tokens
+default_keep_alive = "30m"       # how long Ollama keeps a model loaded after a request
+default_pool_size = 8            # keep-alive connections; at least the UI's concurrency limit
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class OllamaClient:
+    def __init__(self, base_url=default_base_url, keep_alive=default_keep_alive, pool_size=default_pool_size):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def list_models(self, timeout=discovery_timeout):
+        """Names of the installed models; raises OllamaError if Ollama does not answer within `timeout`."""
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+            response.raise_for_status()
+            return sorted(model["name"] for model in response.json().get("models", []))
+        except (requests.RequestException, ValueError) as e:
+            raise OllamaError(f"Could not list Ollama models: {e}") from e
+
+    def preload(self, model, timeout=generate_timeout):
+        """Load `model` into memory ahead of the first question."""
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": self.keep_alive}
+        try:
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload,
+                                         timeout=(connect_timeout, timeout))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise OllamaError(f"Could not load {model}: {e}") from e
+
+    def generate_stream(self, model, prompt, options=None):
+        """Yield the answer to `prompt` piece by piece as Ollama produces it."""
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        try:
+            with self.session.post(f"{self.base_url}/api/generate", json=payload, stream=True,
+                                   timeout=(connect_timeout, generate_timeout)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise OllamaError(message["error"])
+                    if message.get("response"):
+                        yield message["response"]
+                    if message.get("done"):
+                        # Ollama's own prompt token count: what the context budget actually cost.
+                        if "prompt_eval_count" in message:
+                            tracing.annotate(prompt_eval_count=message["prompt_eval_count"],
+                                             prompt_eval_ms=message.get("prompt_eval_duration", 0) / 1e6,
+                                             eval_count=message.get("eval_count", 0))
+                        break
+        except (requests.RequestException, ValueError) as e:
+            raise OllamaError(f"Generation with {model} failed: {e}") from e
+
+    def generate(self, model, prompt, options=None):
+        return "".join(self.generate_stream(model, prompt, options))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,224 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Runs the extract -> ingest -> serve workflow in a single process, instead of one
+Python process per script (each paying the torch/langchain import cost and loading
+the embedding model again). Stages form a small dependency graph; asking for a
+stage runs whatever it depends on first.
+
+A stage is skipped when its inputs are unchanged since it last succeeded and its
+outputs are still there. Inputs are fingerprinted by file size and mtime (the
+invoice PDFs for extract; the CSVs or Parquet store, embedding model and document
+version for ingest), and the fingerprints are kept in 'pipeline_state.json'. The
+embedding model is loaded lazily, once, through the embedding pipeline stage
+(batch size, threads, workers) and shared by ingest and serve. Each stage is timed
+and reported, and recorded as a tracing span.
+
+Usage:
+    python src/pipeline.py            # extract and ingest if needed, then launch the UI
+    python src/pipeline.py ingest     # stop after the vectorstore
+    python src/pipeline.py --force    # rerun every stage
+"""
+
+import os
+import json
+import time
+import argparse
+
+import tracing
+import csv_builder
+import invoice_store
+import embedding_cache
+import embedding_pipeline
+import demo_ui_hybrid as ui
+import ingest_invoices_hybrid as ingest
+
+# --- Configuration ---
+state_file = "pipeline_state.json"
+state_version = 1
+
+
+class Stage:
+    """
+    One step of the pipeline. `run(context)` does the work; `fingerprint(context)`
+    identifies its inputs (None = always run) and `ready(context)` reports whether
+    its outputs exist.
+    """
+
+    def __init__(self, name, run, after=(), fingerprint=None, ready=None):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.fingerprint = fingerprint
+        self.ready = ready
+
+
+class Pipeline:
+    def __init__(self, stages, state_path=state_file):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+
+    def order(self, targets):
+        """The stages needed for `targets`, dependencies first."""
+        ordered, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dependency in self.stages[name].after:
+                visit(dependency)
+            ordered.append(self.stages[name])
+
+        for name in targets:
+            visit(name)
+        return ordered
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state.get("stages", {}) if state.get("version") == state_version else {}
+
+    def save_state(self, fingerprints):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": state_version, "stages": fingerprints}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self, targets, context=None, force=False):
+        """Run `targets` and their dependencies; returns {stage: {"status", "seconds"}}."""
+        context = {} if context is None else context
+        fingerprints = self.load_state()
+        report = {}
+        for stage in self.order(targets):
+            fingerprint = stage.fingerprint(context) if stage.fingerprint else None
+            up_to_date = (fingerprint is not None and fingerprints.get(stage.name) == fingerprint
+                          and (stage.ready is None or stage.ready(context)))
+            if up_to_date and not force:
+                print(f"⏭️ {stage.name}: inputs unchanged, skipped.")
+                report[stage.name] = {"status": "skipped", "seconds": 0.0}
+                continue
+
+            print(f"▶️ {stage.name}...")
+            start = time.perf_counter()
+            with tracing.span(f"stage_{stage.name}"):
+                stage.run(context)
+            elapsed = time.perf_counter() - start
+            report[stage.name] = {"status": "ran", "seconds": round(elapsed, 2)}
+            print(f"✅ {stage.name} finished in {elapsed:.1f}s.")
+            if fingerprint is not None:
+                # Recomputed: the stage may have written files its own fingerprint covers.
+                fingerprints[stage.name] = stage.fingerprint(context)
+                self.save_state(fingerprints)
+        return report
+
+
+# --- The invoice workflow ---
+def embedding_stage(context):
+    """The embedding pipeline stage (batch size, threads, workers from the context) the shared model runs on."""
+    if "embedding_stage" not in context:
+        batch_size = context.get("batch_size", embedding_pipeline.default_batch_size)
+        context["embedding_stage"] = embedding_pipeline.PipelineEmbeddings(
+            embedding_pipeline.HuggingFaceFactory(ui.embedding_model_name, batch_size), batch_size,
+            context.get("embed_workers", embedding_pipeline.default_workers), context.get("threads"))
+    return context["embedding_stage"]
+
+
+def shared_embedding(context):
+    """
+    The embedding model shared by every stage, built on the embedding pipeline stage
+    so ingest keeps its batching, threads and workers. Built lazily, so the model
+    only loads if a stage embeds.
+    """
+    if "embedding" not in context:
+        stage = embedding_stage(context)
+        context["embedding"] = embedding_cache.LazyEmbeddings(lambda: embedding_cache.cached_embeddings(
+            stage, ui.embedding_model_name, query_batch_window=ui.query_batch_window))
+    return context["embedding"]
+
+
+def extract_fingerprint(context):
+    directory = context.get("invoice_dir", csv_builder.invoice_dir)
+    paths = csv_builder.list_invoice_pdfs(directory) if os.path.isdir(directory) else []
+    return invoice_store.fingerprint_files(paths, context.get("format", csv_builder.default_format))
+
+
+def extract_ready(context):
+    return invoice_store.data_available()
+
+
+def run_extract(context):
+    csv_builder.build_csvs(context.get("invoice_dir", csv_builder.invoice_dir),
+                           workers=context.get("extract_workers", csv_builder.default_workers),
+                           output_format=context.get("format", csv_builder.default_format))
+
+
+def ingest_fingerprint(context):
+    return invoice_store.fingerprint_files([], ingest.input_fingerprint(),
+                                           context.get("backend", ingest.default_backend))
+
+
+def ingest_ready(context):
+    return ingest.store_is_current(ingest.backend_directories[context.get("backend", ingest.default_backend)])
+
+
+def run_ingest(context):
+    ingest.build_vectorstore(shared_embedding(context), context.get("backend", ingest.default_backend),
+                             pipeline=embedding_stage(context))
+
+
+def run_serve(context):
+    embedding_stage(context).close()  # queries are embedded in this process, never by ingest workers
+    ui.load_vectorstore(backend=context.get("backend", ingest.default_backend),
+                        shared_embedding=shared_embedding(context))
+    ui.load_router()
+    ui.launch(preload=context.get("preload", True))
+
+
+def invoice_pipeline(state_path=state_file):
+    return Pipeline([
+        Stage("extract", run_extract, fingerprint=extract_fingerprint, ready=extract_ready),
+        Stage("ingest", run_ingest, after=["extract"], fingerprint=ingest_fingerprint, ready=ingest_ready),
+        Stage("serve", run_serve, after=["ingest"]),
+    ], state_path)
+
+
+def run_pipeline(targets=("serve",), force=False, **context):
+    """
+    Run the invoice workflow up to `targets`; `context` sets e.g. backend, format,
+    invoice_dir, and the embedding stage's batch_size, threads and embed_workers.
+    """
+    return invoice_pipeline().run(list(targets), context, force)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the invoice workflow in one process, skipping up-to-date stages.")
+    parser.add_argument("targets", nargs="*", default=["serve"], choices=["extract", "ingest", "serve"],
+                        help="Stages to bring up to date (default: serve, i.e. everything).")
+    parser.add_argument("--force", action="store_true", help="Rerun stages even if their inputs are unchanged.")
+    parser.add_argument("--backend", choices=sorted(ingest.backend_directories), default=ingest.default_backend,
+                        help="Vector store backend (default: %(default)s).")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default=csv_builder.default_format,
+                        help="Extraction output format (default: %(default)s).")
+    parser.add_argument("--extract-workers", type=int, default=csv_builder.default_workers,
+                        help="PDF extraction processes.")
+    parser.add_argument("--batch-size", type=int, default=embedding_pipeline.default_batch_size,
+                        help="Chunks per embedding model batch (default: %(default)s).")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads for the embedding model (default: torch's choice).")
+    parser.add_argument("--embed-workers", type=int, default=embedding_pipeline.default_workers,
+                        help="Processes embedding in parallel during ingest (default: %(default)s).")
+    parser.add_argument("--trace-log", help="Append stage timings as JSON lines to this file.")
+    args = parser.parse_args()
+    tracing.configure(args.trace_log)
+
+    report = run_pipeline(args.targets, args.force, backend=args.backend, format=args.format,
+                          extract_workers=args.extract_workers, batch_size=args.batch_size,
+                          threads=args.threads, embed_workers=args.embed_workers)
+    print("⏱️ " + ", ".join(f"{name} {result['status']} ({result['seconds']:.1f}s)"
+                           for name, result in report.items()))
@@ -0,0 +1,170 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Retrieval-augmented answering for the Q&A UI, streamed token by token. A QAChain
+retrieves context with the hybrid search, fills the prompt and streams the
+model's answer from Ollama. Chains are built once per model and kept in a
+ChainPool, and all of them share one OllamaClient (and so one pool of
+keep-alive HTTP connections), instead of a new LLM and chain per question.
+astream() is the non-blocking variant used by the async UI handler.
+"""
+
+import time
+import asyncio
+import threading
+
+import chunking
+import tracing
+import context_budget
+
+# --- Configuration ---
+prompt_text = (
+    "You are a helpful assistant answering only based on the context below.\n"
+    "Context:{context}\n"
+    "Question: {question}\n"
+    "Answer:"
+)
+document_separator = "\n\n"
+max_buffered_items = 64  # streamed tokens held for a slow consumer before the worker waits
+
+
+async def iterate_in_thread(make_iterator, max_buffered=max_buffered_items):
+    """
+    Consume a blocking iterator in a worker thread, yielding its items to the event
+    loop as they arrive. At most `max_buffered` items wait for the consumer. If the
+    consumer stops early (e.g. the client disconnected and the generator was closed),
+    the worker stops at the next item and closes the iterator, releasing its thread
+    and any HTTP stream behind it.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(max_buffered)
+    cancelled = threading.Event()
+    done = object()
+
+    def send(item):
+        if cancelled.is_set():
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # the event loop has already shut down
+            pass
+
+    def produce():
+        iterator = None
+        try:
+            iterator = make_iterator()
+            for item in iterator:
+                slots.acquire()
+                if cancelled.is_set():
+                    break
+                send(item)
+        except Exception as e:
+            send(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        send(done)
+
+    worker = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                await worker
+                raise item
+            slots.release()
+            yield item
+        await worker
+    finally:
+        cancelled.set()
+        slots.release()  # wake the worker if it is waiting for room in the queue
+
+
+class QAChain:
+    def __init__(self, client, model, search, prompt=prompt_text):
+        self.client = client
+        self.model = model
+        self.search = search
+        self.prompt = prompt
+
+    def retrieve(self, question):
+        """Scored (text, metadata, score) candidates for `question`, best first."""
+        where = chunking.metadata_filter(question)
+        if hasattr(self.search, "search_scored"):
+            return self.search.search_scored(question, where)
+        return [(text, metadata, 1.0) for text, metadata in self.search.search(question, where)]
+
+    def build_prompt(self, question, info=None):
+        """
+        The filled-in prompt, its context chosen by context_budget within this
+        model's token budget; `info` (a dict), if given, receives the retrieval timings.
+        """
+        with tracing.span("retrieve"):
+            candidates = self.retrieve(question)
+            results, stats = context_budget.build_context(candidates, context_budget.token_budget(self.model))
+        if info is not None:
+            info["retrieval"] = dict(getattr(self.search, "last_timings", {}))
+        context = document_separator.join(text for text, _ in results)
+        prompt = self.prompt.format(context=context, question=question)
+        tracing.annotate(prompt_chars=len(prompt), prompt_tokens=context_budget.count_tokens(prompt),
+                         context_tokens=stats["context_tokens"], duplicates=stats["duplicates"],
+                         candidates=stats["candidates"], chunks=stats["chunks"])
+        return prompt
+
+    def stream(self, question, info=None):
+        """
+        Yield the answer to `question` as it is generated. `info`, if given, also
+        receives the request's timing breakdown (see tracing.collect).
+        """
+        with tracing.collect(info if info is not None else {}):
+            prompt = self.build_prompt(question, info)
+            with tracing.span("generate", model=self.model) as fields:
+                start = time.perf_counter()
+                tokens = 0
+                for token in self.client.generate_stream(self.model, prompt):
+                    if not tokens:
+                        tracing.observe("first_token", time.perf_counter() - start)
+                    tokens += 1
+                    yield token
+                fields["tokens"] = tokens
+                tracing.count("llm_tokens", tokens)
+
+    def invoke(self, question):
+        return "".join(self.stream(question))
+
+    async def astream(self, question, info=None):
+        """Async version of stream(): retrieval and generation run in a worker thread, off the event loop."""
+        async for token in iterate_in_thread(lambda: self.stream(question, info)):
+            yield token
+
+
+class ChainPool:
+    """One QAChain per model, created on first use and then reused."""
+
+    def __init__(self, client, search):
+        self.client = client
+        self.search = search
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        with self._lock:
+            chain = self._chains.get(model)
+            if chain is None:
+                chain = self._chains[model] = QAChain(self.client, model, self.search)
+            return chain
+
+    def warm_up(self, model):
+        """Create the chain for `model` and load the model into Ollama ahead of the first question."""
+        chain = self.get(model)
+        self.client.preload(model)
+        return chain
+
+    def __contains__(self, model):
+        return model in self._chains
@@ -0,0 +1,251 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Deterministic fast path in front of the RAG chain. Most questions asked of the
+invoice history are aggregates or lookups ("total cost in 2021", "how many days
+in March 2019", "first attendance", "longest gap", "total for INV-2021-07").
+The router recognises these intents with regular expressions and answers them
+from the rollup tables (rollups.py), in well under a millisecond and without
+retrieval or an LLM. Anything it does not recognise (or that is ambiguous, e.g.
+two years in one question) returns None and is left to the RAG chain.
+
+With several clients or dogs on record, a question is answered for the client
+and/or dog it names. Totals without a name cover everyone; per-dog questions
+(days attended, first visit, ...) without a name go to the RAG chain.
+
+Costs are counted by billing period (invoice month/year); days attended by the
+attendance date.
+"""
+
+import re
+
+import pandas as pd
+
+import rollups
+from chunking import invoice_number_pattern, year_pattern, month_pattern
+
+# --- Configuration ---
+date_pattern = re.compile(r"\b(\d{2}/\d{2}/\d{4})\b")
+
+# Intent patterns, checked in order (most specific first).
+intent_patterns = [
+    ("invoice_lookup", re.compile(r"\bINV-\d{4}-\d{2}(?:-\d+)?\b", re.IGNORECASE)),
+    ("attended_on", re.compile(r"\b(attend|there|go|went|visit)", re.IGNORECASE)),
+    ("longest_gap", re.compile(r"\blongest\b.*\b(gap|break)\b|\b(gap|break)\b.*\blongest\b", re.IGNORECASE)),
+    ("most_common_day", re.compile(r"\b(which|what) day\b.*\bmost\b|\bmost (common|frequent|popular) day\b",
+                                   re.IGNORECASE)),
+    # Counts before first/last: "how many days last year" asks for a count, not a date.
+    ("invoice_count", re.compile(r"\bhow many invoices\b|\bnumber of invoices\b", re.IGNORECASE)),
+    ("days_attended", re.compile(r"\bhow many (days|times|visits)\b|\b(days|times) (has|did)\b.*\battend"
+                                 r"|\b(total|number of) (number of )?(days|visits|attendances)\b", re.IGNORECASE)),
+    # First/last only for questions asking for a date.
+    ("first_attendance", re.compile(r"^(?=.*\b(when|date|what day|first time)\b)"
+                                    r".*\bfirst\b.*\b(day|time|attend\w*|visit\w*)\b", re.IGNORECASE)),
+    ("last_attendance", re.compile(r"^(?=.*\b(when|date|what day|last time)\b)"
+                                   r".*\b(most recent\w*|last(?!\s+(year|month|week)\b)|latest)\b"
+                                   r".*\b(day|time|attend\w*|visit\w*)\b", re.IGNORECASE)),
+    ("years_attended", re.compile(r"\b(which|what)\b.*\byears\b", re.IGNORECASE)),
+    ("total_cost", re.compile(r"\b(total cost|cost|spent|spend|paid|pay|amount due|total due)\b|\$", re.IGNORECASE)),
+]
+# Relative periods ("last year", "this month") are left to the RAG chain.
+relative_period_pattern = re.compile(r"\b(last|this|next|previous|past) (year|month|week)\b", re.IGNORECASE)
+# Questions that merely look like an intent but ask for something else.
+cost_per_day_pattern = re.compile(r"\b(per day|daily|average)\b", re.IGNORECASE)
+not_cost_pattern = re.compile(r"\b(days?|times|visits?|discount\w*|number of)\b", re.IGNORECASE)
+# Returned by a per-dog intent when several dogs are in scope: the question goes to RAG.
+ambiguous = object()
+
+
+def _money(value):
+    return f"${value:,.2f}"
+
+
+def _date(value):
+    return f"{value.strftime('%d/%m/%Y')} ({value.strftime('%A')})"
+
+
+class QueryRouter:
+    """
+    Answers from rollup tables (see rollups.py). `invoice_df` serves invoice
+    lookups; the rollups are built from the frames when `rollup` is not given.
+    """
+
+    def __init__(self, invoice_df, attendance_df=None, rollup=None):
+        self.invoices = invoice_df.drop_duplicates("InvoiceNumber").set_index("InvoiceNumber")
+        if rollup is None:
+            rollup = rollups.Rollups.from_frames(invoice_df, attendance_df)
+        self.items = rollup.by_pair()
+        self.pairs = {pair: rollups.summarize(items) for pair, items in self.items.items()}
+        self.overall = rollups.summarize([item for items in self.items.values() for item in items])
+        names = sorted({name for pair in self.pairs for name in pair if name}, key=len, reverse=True)
+        self.name_pattern = (re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE)
+                             if names else None)
+
+    def route(self, query):
+        """(answer, intent) for a recognised question, or None to fall back to RAG."""
+        scope = self._scope(query)
+        if scope is None:
+            return None
+        for intent, pattern in intent_patterns:
+            if pattern.search(query):
+                answer = getattr(self, f"_{intent}")(query, *scope)
+                if answer is ambiguous:
+                    return None
+                if answer is not None:
+                    return answer, intent
+        return None
+
+    def _scope(self, query):
+        """
+        (dog, stats, who) over the clients/dogs named in the question, or all of them
+        when none is named. `dog` is None when several dogs are in scope, which leaves
+        per-dog questions to RAG; `who` (e.g. " for Charlie Brown") labels totals over
+        a named scope. None when no client/dog matches every name given.
+        """
+        named = {}
+        if self.name_pattern:
+            named = {name.lower(): name for name in self.name_pattern.findall(query)}
+        pairs = [pair for pair in self.items if set(named) <= {pair[0].lower(), pair[1].lower()}]
+        if not pairs:
+            return None
+        dogs = {dog for _, dog in pairs}
+        dog = (dogs.pop() or "The dog") if len(dogs) == 1 else None
+        who = ""
+        if named:
+            originals = {name.lower(): name for pair in pairs for name in pair}
+            who = " for " + " and ".join(originals[name] for name in sorted(named))
+        if len(pairs) == len(self.items):
+            return dog, self.overall, who
+        if len(pairs) == 1:
+            return dog, self.pairs[pairs[0]], who
+        return dog, rollups.summarize([item for pair in pairs for item in self.items[pair]]), who
+
+    # --- Period parsing ---
+    @staticmethod
+    def _period(query):
+        """(year, month) named in the question; None parts when absent, False when ambiguous or relative."""
+        if relative_period_pattern.search(query):
+            return False
+        years = {int(year) for year in year_pattern.findall(query)}
+        months = {month.capitalize() for month in month_pattern.findall(query)}
+        if len(years) > 1 or len(months) > 1:
+            return False
+        year = years.pop() if years else None
+        month = months.pop() if months else None
+        if month and year is None:
+            return False
+        return year, month
+
+    # --- Intents ---
+    # Each takes the question and the scope from _scope(); per-dog intents return `ambiguous` without a dog.
+    def _invoice_lookup(self, query, dog, stats, who):
+        numbers = {number.upper() for number in invoice_number_pattern.findall(query)}
+        if len(numbers) != 1:
+            return None
+        number = numbers.pop()
+        if number not in self.invoices.index:
+            return f"There is no invoice {number} on record."
+        row = self.invoices.loc[number]
+        return (f"Invoice {number} ({row['MonthBilledFor']} {row['Year']}) for {row['DogName']}: "
+                f"{row['DatesAttendedCount']} days attended at {_money(row['OriginalCostPerDay'])} per day "
+                f"with a {row['PercentageDiscount']}% discount, total due {_money(row['TotalAmountDue'])}.")
+
+    def _attended_on(self, query, dog, stats, who):
+        dates = set(date_pattern.findall(query))
+        if len(dates) != 1:
+            return None
+        date = dates.pop()
+        parsed = pd.to_datetime(date, format="%d/%m/%Y", errors="coerce")
+        if pd.isna(parsed):
+            return None
+        if dog is None:
+            return ambiguous
+        if rollups.attended(stats, parsed):
+            return f"Yes, {dog} attended on {_date(parsed)}."
+        return f"No, {dog} did not attend on {_date(parsed)}."
+
+    def _longest_gap(self, query, dog, stats, who):
+        if self._period(query) != (None, None):
+            return None
+        if dog is None:
+            return ambiguous
+        if stats["gap"] is None:
+            return None
+        days, start, end = stats["gap"]
+        return f"The longest gap between visits was {days} days, from {_date(start)} to {_date(end)}."
+
+    def _most_common_day(self, query, dog, stats, who):
+        if self._period(query) != (None, None):
+            return None
+        if dog is None:
+            return ambiguous
+        most_common = rollups.most_common_day(stats)
+        if most_common is None:
+            return None
+        day, count = most_common
+        return f"{dog} has attended most often on {day}s ({count} times)."
+
+    def _first_attendance(self, query, dog, stats, who):
+        if self._period(query) != (None, None):
+            return None
+        if dog is None:
+            return ambiguous
+        if stats["first"] is None:
+            return None
+        return f"{dog} first attended daycare on {_date(stats['first'])}."
+
+    def _last_attendance(self, query, dog, stats, who):
+        if self._period(query) != (None, None):
+            return None
+        if dog is None:
+            return ambiguous
+        if stats["last"] is None:
+            return None
+        return f"{dog}'s most recent attendance was on {_date(stats['last'])}."
+
+    def _years_attended(self, query, dog, stats, who):
+        if dog is None:
+            return ambiguous
+        if not stats["years"]:
+            return None
+        years = ", ".join(str(year) for year in stats["years"])
+        return f"{dog} attended doggy daycare in the following years: {years}."
+
+    def _invoice_count(self, query, dog, stats, who):
+        period = self._period(query)
+        if period is False or period[1]:
+            return None
+        year = period[0]
+        if year is None:
+            return f"There are {stats['invoices']} invoices in total{who}."
+        return f"There are {stats['invoices_by_year'].get(year, 0)} invoices for {year}{who}."
+
+    def _days_attended(self, query, dog, stats, who):
+        period = self._period(query)
+        if period is False:
+            return None
+        if dog is None:
+            return ambiguous
+        year, month = period
+        if year is None:
+            return f"{dog} has attended daycare on {stats['days']} days in total."
+        if month is None:
+            return f"{dog} attended daycare on {stats['days_by_year'].get(year, 0)} days in {year}."
+        count = stats["days_by_period"].get((year, month), 0)
+        return f"{dog} attended daycare on {count} days in {month} {year}."
+
+    def _total_cost(self, query, dog, stats, who):
+        if cost_per_day_pattern.search(query) or not_cost_pattern.search(query):
+            return None
+        period = self._period(query)
+        if period is False:
+            return None
+        year, month = period
+        if year is None:
+            return f"The total cost for all invoices{who} is {_money(stats['cost'])}."
+        if month is None:
+            return f"The total cost for {year}{who} is {_money(stats['cost_by_year'].get(year, 0.0))}."
+        cost = stats["cost_by_period"].get((year, month), 0.0)
+        return f"The total cost for {month} {year}{who} is {_money(cost)}."
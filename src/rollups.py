@@ -0,0 +1,301 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Persisted rollup tables for the whole-history facts (totals, days attended,
+first/last attendance, busiest weekday, longest gap, monthly breakdown, years
+attended). Instead of recomputing them over the full attendance history on every
+start, the facts are kept per (client, dog, year, month) group:
+
+    invoices   invoices billed for the month
+    cost       their total amount due
+    mask       the days of the month attended, one bit per day
+    profile    addresses, provider and discount from the group's latest invoice
+
+Everything about attendance can be read back from the day mask (day count, first
+and last day, gaps, weekdays), so the summaries and the query router's tables
+cost a constant amount of work per group, however many attendance rows there are.
+
+Groups are built from per-invoice contributions, which are also persisted:
+csv_builder.py updates the rollups incrementally with just the invoices it
+re-extracted or deleted. Only the groups those invoices touch are recomputed, and
+an index of group -> contributing invoices means only their invoices are revisited.
+Readers call load_or_build(), which opens the persisted groups when they match the
+extracted data and rebuilds them from the full tables otherwise.
+
+    rollups/groups.json          the groups and a fingerprint of the data they match
+    rollups/contributions.json   each invoice's share of the groups, and the index
+"""
+
+import os
+import json
+import calendar
+from datetime import date
+
+import pandas as pd
+
+import invoice_store
+
+# --- Configuration ---
+rollup_dir = "rollups"
+groups_file = "groups.json"
+contributions_file = "contributions.json"
+rollup_version = 2
+
+month_numbers = {name: number for number, name in enumerate(calendar.month_name) if name}
+profile_columns = {"ClientAddress": "client_address", "ServiceProviderName": "provider",
+                   "ServiceProviderAddress": "provider_address", "PercentageDiscount": "discount"}
+
+
+def _column(df, name, default=""):
+    """A column as clean strings, or `default` for every row when the frame lacks it."""
+    if name not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[name].astype(object).where(df[name].notna(), default).astype(str).str.strip()
+
+
+def _parsed_dates(attendance_df):
+    if "ParsedDate" in attendance_df.columns:
+        return attendance_df["ParsedDate"]
+    return pd.to_datetime(attendance_df["Date"], format=invoice_store.date_format, errors="coerce")
+
+
+def contributions_from_frames(invoice_df, attendance_df):
+    """
+    Each invoice's share of the rollups: {invoice number: {"key", "cost", "invoice",
+    "profile", "masks"}}, where "key" is its (client, dog, year, month) billing period
+    and "masks" maps attendance (year, month) periods to day masks.
+    """
+    invoices = invoice_df.drop_duplicates("InvoiceNumber", keep="last")
+    numbers = invoices["InvoiceNumber"].astype(str)
+    years = pd.to_numeric(invoices["Year"], errors="coerce").fillna(0).astype(int)
+    months = _column(invoices, "MonthBilledFor").str.capitalize().map(month_numbers).fillna(0).astype(int)
+    costs = pd.to_numeric(invoices["TotalAmountDue"], errors="coerce").fillna(0.0)
+    profiles = {key: _column(invoices, column).tolist() for column, key in profile_columns.items()}
+
+    contributions = {}
+    for i, (number, client, dog, year, month, cost) in enumerate(zip(
+            numbers, _column(invoices, "ClientName"), _column(invoices, "DogName"), years, months, costs)):
+        contributions[number] = {"key": [client, dog, int(year), int(month)], "cost": round(float(cost), 2),
+                                 "invoice": True, "profile": {key: values[i] for key, values in profiles.items()},
+                                 "masks": {}}
+
+    parsed = _parsed_dates(attendance_df)
+    valid = parsed.notna()
+    if not valid.any():
+        return contributions
+    days = pd.DataFrame({
+        "number": attendance_df["InvoiceNumber"].astype(str)[valid],
+        "dog": _column(attendance_df, "DogName")[valid],
+        "period": (parsed.dt.year * 100 + parsed.dt.month)[valid].astype(int),
+        "bit": 2 ** (parsed.dt.day[valid].astype("int64") - 1),
+    }).drop_duplicates(["number", "period", "bit"])
+    # Distinct bits, so their sum is the day mask.
+    masks = days.groupby(["number", "period"], sort=False).agg(mask=("bit", "sum"), dog=("dog", "first"))
+    for (number, period), mask, dog in zip(masks.index, masks["mask"], masks["dog"]):
+        contribution = contributions.get(number)
+        if contribution is None:  # attendance rows without an invoice row
+            contribution = contributions[number] = {"key": ["", dog, 0, 0], "cost": 0.0, "invoice": False,
+                                                    "profile": {}, "masks": {}}
+        contribution["masks"][str(period)] = int(mask)
+    return contributions
+
+
+def _group_keys(contribution):
+    client, dog = contribution["key"][:2]
+    keys = {tuple(contribution["key"])} if contribution["invoice"] else set()
+    keys.update((client, dog, int(period) // 100, int(period) % 100) for period in contribution["masks"])
+    return keys
+
+
+class Rollups:
+    def __init__(self, groups=None, contributions=None, fingerprint=None, index=None):
+        self.groups = groups or {}                # (client, dog, year, month) -> group
+        self.contributions = contributions or {}  # invoice number -> contribution
+        self.index = index or {}                  # (client, dog, year, month) -> contributing invoice numbers
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_frames(cls, invoice_df, attendance_df):
+        rollups = cls()
+        rollups.update(invoice_df, attendance_df)
+        return rollups
+
+    def update(self, invoice_df, attendance_df, removed=()):
+        """
+        Replace the contributions of the invoices in the frames, drop those of the
+        `removed` invoice numbers, and recompute the groups they touch. Returns the
+        number of groups recomputed.
+        """
+        fresh = contributions_from_frames(invoice_df, attendance_df)
+        affected = set()
+        for number in set(removed) | set(fresh):
+            previous = self.contributions.pop(number, None)
+            if previous is None:
+                continue
+            for key in _group_keys(previous):
+                affected.add(key)
+                numbers = self.index.get(key)
+                if numbers is not None:
+                    numbers.discard(number)
+                    if not numbers:
+                        del self.index[key]
+        for number, contribution in fresh.items():
+            self.contributions[number] = contribution
+            for key in _group_keys(contribution):
+                affected.add(key)
+                self.index.setdefault(key, set()).add(number)
+        self._regroup(affected)
+        return len(affected)
+
+    def _regroup(self, keys):
+        """Recompute the groups in `keys` from just the invoices the index lists for them."""
+        for key in keys:
+            self.groups.pop(key, None)
+            numbers = self.index.get(key)
+            if not numbers:
+                continue
+            group = self.groups[key] = _new_group()
+            period = str(key[2] * 100 + key[3])
+            latest = ""
+            for number in sorted(numbers):
+                contribution = self.contributions[number]
+                if contribution["invoice"] and tuple(contribution["key"]) == key:
+                    group["invoices"] += 1
+                    group["cost"] = round(group["cost"] + contribution["cost"], 2)
+                    if number >= latest:
+                        latest = number
+                        group["profile"] = contribution["profile"]
+                group["mask"] |= contribution["masks"].get(period, 0)
+
+    # --- Persistence ---
+    def save(self, directory=rollup_dir):
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, contributions_file), {
+            "version": rollup_version, "contributions": self.contributions,
+            "index": [[*key, sorted(numbers)] for key, numbers in sorted(self.index.items())],
+        })
+        _write_json(os.path.join(directory, groups_file), {
+            "version": rollup_version, "fingerprint": self.fingerprint,
+            "groups": [[*key, group] for key, group in sorted(self.groups.items())],
+        })
+
+    @classmethod
+    def load(cls, directory=rollup_dir, contributions=False):
+        """The persisted rollups (with the per-invoice contributions and index if asked), or None."""
+        groups = _read_json(os.path.join(directory, groups_file))
+        if groups is None:
+            return None
+        rollups = cls({tuple(row[:4]): row[4] for row in groups["groups"]}, fingerprint=groups.get("fingerprint"))
+        if contributions:
+            stored = _read_json(os.path.join(directory, contributions_file))
+            if stored is None:
+                return None
+            rollups.contributions = stored["contributions"]
+            rollups.index = {tuple(row[:4]): set(row[4]) for row in stored["index"]}
+        return rollups
+
+    # --- Queries ---
+    def by_pair(self):
+        """{(client, dog): [((client, dog, year, month), group), ...] in period order}."""
+        pairs = {}
+        for key, group in sorted(self.groups.items()):
+            pairs.setdefault(key[:2], []).append((key, group))
+        return pairs
+
+
+def _new_group():
+    return {"invoices": 0, "cost": 0.0, "mask": 0, "profile": {}}
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("version") == rollup_version else None
+
+
+# --- Summaries ---
+def mask_days(mask):
+    """Days of the month set in `mask`, in order."""
+    return [day for day in range(1, 32) if mask >> (day - 1) & 1]
+
+
+def summarize(items):
+    """
+    Whole-history facts for the groups in `items` ((key, group) pairs, e.g. one
+    entry of Rollups.by_pair()). First/last attendance, gaps and the monthly
+    breakdown assume the groups belong to one dog.
+    """
+    stats = {"invoices": 0, "cost": 0.0, "days": 0, "first": None, "last": None, "gap": None,
+             "weekdays": {}, "masks": {}, "monthly": [], "invoices_by_year": {}, "cost_by_year": {},
+             "cost_by_period": {}, "days_by_year": {}, "days_by_period": {}, "profile": {}}
+    for (_, _, year, month), group in sorted(items, key=lambda item: item[0][2:]):
+        stats["invoices"] += group["invoices"]
+        stats["cost"] += group["cost"]
+        if group["invoices"]:
+            stats["invoices_by_year"][year] = stats["invoices_by_year"].get(year, 0) + group["invoices"]
+            stats["cost_by_year"][year] = stats["cost_by_year"].get(year, 0.0) + group["cost"]
+            if month:
+                period = (year, calendar.month_name[month])
+                stats["cost_by_period"][period] = stats["cost_by_period"].get(period, 0.0) + group["cost"]
+            stats["profile"] = group["profile"] or stats["profile"]
+        days = mask_days(group["mask"])
+        if not days:
+            continue
+        dates = [date(year, month, day) for day in days]
+        stats["masks"][(year, month)] = stats["masks"].get((year, month), 0) | group["mask"]
+        stats["days"] += len(dates)
+        stats["days_by_year"][year] = stats["days_by_year"].get(year, 0) + len(dates)
+        period = (year, calendar.month_name[month])
+        stats["days_by_period"][period] = stats["days_by_period"].get(period, 0) + len(dates)
+        stats["monthly"].append((year, month, len(dates)))
+        for previous, current in zip([stats["last"]] + dates[:-1], dates):
+            if previous is not None and (stats["gap"] is None or (current - previous).days > stats["gap"][0]):
+                stats["gap"] = ((current - previous).days, previous, current)
+        for day in dates:
+            name = day.strftime("%A")
+            stats["weekdays"][name] = stats["weekdays"].get(name, 0) + 1
+        stats["first"] = stats["first"] or dates[0]
+        stats["last"] = dates[-1]
+    stats["cost"] = round(stats["cost"], 2)
+    stats["years"] = sorted(stats["days_by_year"])
+    return stats
+
+
+def attended(stats, day):
+    """True when the dog(s) summarised in `stats` attended on the date `day`."""
+    return bool(stats["masks"].get((day.year, day.month), 0) >> (day.day - 1) & 1)
+
+
+def most_common_day(stats):
+    """(weekday, count) attended most often, or None."""
+    if not stats["weekdays"]:
+        return None
+    return max(stats["weekdays"].items(), key=lambda item: item[1])
+
+
+# --- Loading ---
+def load_or_build(directory=rollup_dir):
+    """The rollups matching the extracted data: the persisted ones when current, otherwise rebuilt and saved."""
+    fingerprint = invoice_store.data_fingerprint()
+    rollups = Rollups.load(directory)
+    if rollups is not None and rollups.fingerprint == fingerprint:
+        return rollups
+    print("🔢 Building rollup tables from the extracted data...")
+    invoice_df = invoice_store.load_invoices()
+    attendance_df = invoice_store.load_attendance(columns=["InvoiceNumber", "Date", "DogName"])
+    rollups = Rollups.from_frames(invoice_df, attendance_df)
+    rollups.fingerprint = fingerprint
+    rollups.save(directory)
+    return rollups
@@ -0,0 +1,180 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Lightweight, dependency-free instrumentation for the pipeline and the Q&A handler:
+
+- span(name) times a block. Durations are aggregated per name (count, total, max),
+  and every span is written to the JSON log when one is configured.
+- count(name, n) keeps counters (PDFs extracted, chunks embedded, tokens generated...).
+- collect(record) gathers the spans timed in the current thread into a dict, which
+  is how one Q&A request gets its breakdown (embed, retrieve, prompt size, time to
+  first token, generation). format_breakdown() renders it for the UI.
+- configure(log=...) writes spans and events as JSON lines to a file.
+- start_metrics_server(port) serves the counters and timings on localhost at
+  /metrics (Prometheus text format) and /metrics.json.
+
+Spans are cheap when nothing is configured: a perf_counter pair and a dict update.
+"""
+
+import json
+import time
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+default_metrics_port = 9464
+metric_prefix = "invoice_"
+
+_lock = threading.Lock()
+_local = threading.local()
+_log_file = None
+_counters = {}
+_timings = {}  # name -> [count, total seconds, max seconds]
+
+
+def configure(log=None):
+    """Write spans and events as JSON lines to `log` (appended); None stops logging."""
+    global _log_file
+    with _lock:
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = open(log, "a", buffering=1) if log else None
+
+
+def log_event(event, **fields):
+    if _log_file is None:
+        return
+    fields = {key: round(value, 2) if isinstance(value, float) else value for key, value in fields.items()}
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+    with _lock:
+        if _log_file is not None:
+            _log_file.write(line + "\n")
+
+
+def count(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    with _lock:
+        timing = _timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record[f"{name}_ms"] = record.get(f"{name}_ms", 0.0) + seconds * 1000
+
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """Time the block as `name`; the block may add fields (e.g. item counts) to the yielded dict."""
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed)
+        if "items" in fields and elapsed:
+            fields["items_per_s"] = round(fields["items"] / elapsed, 1)
+        log_event("span", name=name, ms=round(elapsed * 1000, 2), **fields)
+
+
+@contextlib.contextmanager
+def collect(record):
+    """Add the spans timed in this thread, and annotate() calls, to the dict `record`."""
+    previous = getattr(_local, "record", None)
+    _local.record = record
+    try:
+        yield record
+    finally:
+        _local.record = previous
+
+
+def annotate(**fields):
+    """Attach fields to the record being collected in this thread, if any."""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.update(fields)
+
+
+def format_breakdown(record):
+    """One line of per-stage timings from a collected record, e.g. for the UI."""
+    parts = []
+    for key, label, unit in (("embedding_load_ms", "model load", "ms"), ("embed_query_ms", "embed", "ms"),
+                             ("retrieve_ms", "retrieve", "ms"), ("prompt_chars", "prompt", "chars"),
+                             ("chunks", "context", "chunks"), ("prompt_tokens", "prompt est.", "tokens"),
+                             ("prompt_eval_count", "prompt (Ollama)", "tokens"),
+                             ("first_token_ms", "first token", "ms"), ("generate_ms", "generate", "ms"),
+                             ("total_ms", "total", "ms")):
+        if key in record:
+            parts.append(f"{label} {record[key]:,.0f} {unit}")
+    return ", ".join(parts)
+
+
+# --- Metrics ---
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {name: {"count": n, "total_s": round(total, 4), "mean_ms": round(total / n * 1000, 2),
+                               "max_ms": round(longest * 1000, 2)}
+                        for name, (n, total, longest) in _timings.items()},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def _metric_name(name):
+    return metric_prefix + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text():
+    data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, timing in sorted(data["timings"].items()):
+        metric = _metric_name(name)
+        lines += [f"# TYPE {metric}_seconds summary", f"{metric}_seconds_count {timing['count']}",
+                  f"{metric}_seconds_sum {timing['total_s']}",
+                  # A summary only has quantile/_count/_sum samples, so the max is its own gauge.
+                  f"# TYPE {metric}_max_seconds gauge", f"{metric}_max_seconds {timing['max_ms'] / 1000}"]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=default_metrics_port):
+    """Serve /metrics and /metrics.json on localhost in a background thread; returns the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,62 @@
+"""
+Author: Andrew Buchanan
+Date: 17/10/2026
+
+Purpose:
+Keeps the Chroma collection in 'chroma_db' in step with the invoice data without
+re-embedding the whole corpus. Every chunk has a deterministic ID built from the
+record it came from (an invoice number, or a named summary) plus a hash of its
+content (see chunking.chunk_id), so a rebuild only has to:
+
+- add chunks whose ID is not in the collection yet (new or changed records),
+- delete chunks whose ID is no longer produced (changed or removed records),
+- leave everything else alone.
+
+A changed record therefore shows up as one delete plus one add under the same
+record key, and only that record's text is sent to the embedding model.
+"""
+
+# --- Configuration ---
+write_batch_size = 1000  # kept below Chroma's maximum batch size
+
+
+def sync_vectorstore(vectorstore, chunks, batch_size=write_batch_size):
+    """
+    Make the collection hold exactly `chunks` ((chunk_id, text, metadata) from chunking.iter_chunks).
+
+    Chunks are consumed as a stream: only their IDs and the current batch of
+    not-yet-stored texts are held in memory. Returns a dict with the number of
+    chunks added, deleted and left unchanged.
+    """
+    existing = set(vectorstore.get(include=[])["ids"])
+    wanted = set()
+    pending = []
+    added = 0
+
+    def write(batch):
+        vectorstore.add_texts(
+            texts=[text for _, text, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch],
+            ids=[cid for cid, _, _ in batch],
+        )
+
+    for cid, text, metadata in chunks:
+        if cid in wanted:
+            continue
+        wanted.add(cid)
+        if cid in existing:
+            continue
+        pending.append((cid, text, metadata))
+        if len(pending) >= batch_size:
+            write(pending)
+            added += len(pending)
+            pending = []
+    if pending:
+        write(pending)
+        added += len(pending)
+
+    to_delete = sorted(existing - wanted)
+    for start in range(0, len(to_delete), batch_size):
+        vectorstore.delete(ids=to_delete[start:start + batch_size])
+
+    return {"added": added, "deleted": len(to_delete), "unchanged": len(wanted) - added}
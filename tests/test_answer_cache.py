@@ -0,0 +1,49 @@
+import numpy as np
+
+import answer_cache
+
+vocabulary = ["total", "cost", "snoopy", "live", "who", "where", "address", "in", "2019", "2020"]
+
+
+def embed(question):
+    words = answer_cache.normalize(question).replace("?", "").split()
+    vector = np.array([sum(w.startswith(term) for w in words) for term in vocabulary], dtype=np.float32)
+    return vector + 0.01
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_exact_then_semantic_lookup_within_a_partition():
+    cache = answer_cache.AnswerCache(embed, threshold=0.9)
+    cache.put("Who does Snoopy live with?", "llama3", True, "v1", "Charlie Brown.")
+    assert cache.get("  who does snoopy LIVE with ", "llama3", True, "v1") == ("Charlie Brown.", "exact")
+    assert cache.get("Snoopy lives with who?", "llama3", True, "v1") == ("Charlie Brown.", "semantic")
+    assert cache.get("Who does Snoopy live with?", "mistral", True, "v1") is None
+    assert cache.get("Who does Snoopy live with?", "llama3", False, "v1") is None
+
+    cache.put("Total cost in 2019?", "llama3", True, "v1", "$540.00")
+    assert cache.get("In 2020 the total cost?", "llama3", True, "v1") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 3)
+
+
+def test_ttl_lru_and_corpus_invalidation():
+    clock = Clock()
+    cache = answer_cache.AnswerCache(embed, ttl=10, max_entries=2, clock=clock)
+    cache.put("a", "m", True, "v1", "A")
+    cache.put("b", "m", True, "v1", "B")
+    assert cache.get("a", "m", True, "v1", semantic=False) == ("A", "exact")
+    cache.put("c", "m", True, "v1", "C")  # evicts "b", the least recently used
+    assert cache.get("b", "m", True, "v1", semantic=False) is None
+
+    clock.now = 11
+    assert cache.get("a", "m", True, "v1", semantic=False) is None
+    cache.put("d", "m", True, "v1", "D")
+    assert cache.get("d", "m", True, "v2", semantic=False) is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"], stats["invalidations"], stats["entries"]) == (1, 2, 1, 0)
@@ -0,0 +1,21 @@
+import benchmark
+import demo_ui_hybrid
+
+
+def test_benchmark_reports_every_stage():
+    client, answers = demo_ui_hybrid.client, demo_ui_hybrid.answers
+    report = benchmark.run(sizes=[120], pdf_limit=2, queries=3)
+    assert demo_ui_hybrid.client is client and demo_ui_hybrid.answers is answers
+    assert demo_ui_hybrid.chains is None
+    assert demo_ui_hybrid.persist_directory == demo_ui_hybrid.ingest.persist_directory
+    result = report["sizes"]["120"]
+    assert list(result["stages"]) == ["extract", "documents", "chunking", "embedding", "index", "retrieval", "ask"]
+    assert result["stages"]["extract"] == {**result["stages"]["extract"], "items": 2, "failures": 0}
+    assert result["stages"]["embedding"]["items"] == result["chunks"]
+    assert all(stage["peak_rss_mb"] > 0 for stage in result["stages"].values())
+
+
+def test_invoice_numbers_are_unique_across_accounts():
+    plan = benchmark.invoice_plan(200)
+    assert len({invoice["InvoiceNumber"] for invoice in plan}) == 200
+    assert plan[96]["InvoiceNumber"] == "INV-2017-01-0001"
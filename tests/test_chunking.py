@@ -0,0 +1,30 @@
+import chunking
+
+
+def test_lines_are_packed_whole_and_ids_are_stable():
+    lines = ["a" * 200, "b" * 200, "c" * 200, "d" * 1200]
+    chunks = chunking.pack_lines(lines, chunk_size=500)
+    assert chunks[:2] == ["a" * 200 + "\n" + "b" * 200, "c" * 200]
+    assert chunks[2:] == ["d" * 500, "d" * 500, "d" * 200]
+
+    records = [("attendance:INV-2019-03", ["x", "y"], {"invoice_number": "INV-2019-03", "year": 2019})]
+    first = list(chunking.iter_chunks(records))
+    assert first == list(chunking.iter_chunks(records))
+    cid, text, metadata = first[0]
+    assert cid.startswith("attendance:INV-2019-03:0:") and text == "x\ny"
+    assert metadata == {"invoice_number": "INV-2019-03", "year": 2019,
+                        "record_key": "attendance:INV-2019-03", "chunk": 0}
+
+
+def test_metadata_filter_from_question():
+    assert chunking.metadata_filter("What was the total on inv-2021-07?") == {"invoice_number": "INV-2021-07"}
+    assert chunking.metadata_filter("Total on INV-2021-07-0042?") == {"invoice_number": "INV-2021-07-0042"}
+    assert chunking.metadata_filter("How many days in March 2020?") == {
+        "$or": [{"$and": [{"year": 2020}, {"month": "March"}]}, {"record_type": "summary"}]}
+    assert chunking.metadata_filter("Days attended in 2020") == {"$or": [{"year": 2020}, {"record_type": "summary"}]}
+    assert chunking.metadata_filter("Compare 2019 and 2020") is None
+    assert chunking.metadata_filter("When did Snoopy first attend?") is None
+    assert chunking.metadata_filter("May I ask what Snoopy's daycare cost in 2020?") == {
+        "$or": [{"year": 2020}, {"record_type": "summary"}]}
+    assert chunking.metadata_filter("What may the total for march 2020 be?") == {
+        "$or": [{"$and": [{"year": 2020}, {"month": "March"}]}, {"record_type": "summary"}]}
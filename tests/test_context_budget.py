@@ -0,0 +1,50 @@
+import chunking
+import context_budget
+import fake_embeddings
+import hybrid_retrieval
+from lexical_index import LexicalIndexBuilder
+
+
+def make_search():
+    records = [
+        ("summary:narrative", ["Snoopy lives with Charlie Brown at 32 Willow Crescent, Bloomington."],
+         {"record_type": "summary"}),
+        ("summary:narrative_copy", ["Snoopy lives with Charlie Brown at 32 Willow Crescent, Bloomington."],
+         {"record_type": "summary"}),
+    ] + [
+        (f"invoice:INV-2019-{month:02d}", [f"Invoice Number: INV-2019-{month:02d}. Dog Name: Snoopy. "
+                                           f"Cost Per Day: $22.5, Discount: 50%. Total Due: ${month * 22.5}."],
+         {"invoice_number": f"INV-2019-{month:02d}", "year": 2019, "record_type": "invoice"})
+        for month in range(1, 13)
+    ]
+    chunks = list(chunking.iter_chunks(records))
+    builder = LexicalIndexBuilder()
+    vectorstore = fake_embeddings.InMemoryVectorstore(fake_embeddings.HashingEmbeddings())
+    for chunk in chunks:
+        builder.add(*chunk)
+    vectorstore.add_texts([text for _, text, _ in chunks], [metadata for _, _, metadata in chunks])
+    return hybrid_retrieval.HybridSearch(builder.build(), vectorstore)
+
+
+def test_weak_and_duplicate_candidates_are_dropped():
+    search = make_search()
+    question = "Who does Snoopy live with?"
+    candidates = search.search_scored(question)
+    assert len(candidates) == 14 and max(score for *_, score in candidates) == 1.0
+
+    chosen, stats = context_budget.build_context(candidates)
+    keys = [metadata["record_key"] for _, metadata in chosen]
+    assert len({"summary:narrative", "summary:narrative_copy"} & set(keys)) == 1
+    assert stats["duplicates"] == 1 and stats["relevant"] <= len(candidates) // 2
+    baseline = sum(context_budget.count_tokens(text) for text, _ in search.search(question))
+    assert stats["context_tokens"] < baseline
+
+
+def test_build_context_respects_chunk_cap_and_token_budget():
+    candidates = make_search().search_scored("Invoice discount cost per day for Snoopy")
+    chosen, stats = context_budget.build_context(candidates)
+    assert len(chosen) <= context_budget.max_chunks <= hybrid_retrieval.default_k
+    chosen, stats = context_budget.build_context(candidates, budget=60)
+    assert stats["context_tokens"] <= 60 and len(chosen) == 1
+    assert context_budget.token_budget("llama3:instruct") == context_budget.model_token_budgets["llama3"]
+    assert context_budget.token_budget("unknown") == context_budget.default_token_budget
@@ -0,0 +1,122 @@
+import os
+import time
+import shutil
+import multiprocessing
+
+import pandas as pd
+from fpdf import FPDF
+
+import csv_builder
+import generate_invoices
+
+
+def write_statement(path, filler_pages=3):
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    pdf.add_page()
+    for line in ["Invoice Number: INV-2021-07-0042", "Printed on 30/06/2021",
+                 "Service Provider Name: Pawprints and Playcare LLC", "Service Provider Address: 1 Main St",
+                 "Client Name: Linus Smith", "Client Address: 2 Elm St", "Month Billed For: July 2021",
+                 "Dog Name: Coco", "Attendance Date", "05/07/2021", "12/07/2021"]:
+        pdf.cell(200, 10, txt=line, ln=True)
+    pdf.add_page()
+    for line in ["19/07/2021", "Original Cost Per Day: $20.00", "Percentage Discount: 15%",
+                 "Discounted Cost Per Day: $17.00", "Total Amount Due: $51.00"]:
+        pdf.cell(200, 10, txt=line, ln=True)
+    for _ in range(filler_pages):
+        pdf.add_page()
+        pdf.cell(200, 10, txt="Terms: payment due by 01/09/2021", ln=True)
+    pdf.output(str(path))
+
+
+def test_dates_come_from_the_attendance_table_and_reading_stops_early(tmp_path):
+    path = tmp_path / "statement.pdf"
+    write_statement(path)
+    summary, attendance, report = csv_builder.extract_invoice_report(str(path))
+    assert [row["Date"] for row in attendance] == ["05/07/2021", "12/07/2021", "19/07/2021"]
+    assert summary["Year"] == "2021" and summary["MonthBilledFor"] == "July"
+    assert summary["TotalAmountDue"] == "51.00" and summary["DatesAttendedCount"] == 3
+    assert report["pages"] == 2 and report["missing"] == []
+
+
+def test_coverage_summary_reports_missing_fields():
+    reports = {"a.pdf": {"ms": 5.0, "missing": []}, "b.pdf": {"ms": 9.0, "missing": ["DogName"]},
+               "c.pdf": {"error": "TimeoutError"}}
+    summary = csv_builder.coverage_summary(reports)
+    assert summary["coverage"]["DogName"] == 0.5 and summary["coverage"]["InvoiceNumber"] == 1.0
+    assert summary["failed"] == 1 and summary["slowest"] == "b.pdf"
+
+
+def test_incremental_runs_handle_added_changed_deleted_failed_and_duplicate_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("invoices")
+    invoices = list(generate_invoices.iter_invoices())[:4]
+    paths = [os.path.join("invoices", f"invoice_{invoice['InvoiceNumber']}.pdf") for invoice in invoices]
+    for invoice in invoices[:3]:
+        generate_invoices.render(invoice, "invoices", logo=None)
+
+    def totals():
+        df = pd.read_csv(csv_builder.summary_csv, dtype=str)
+        return dict(zip(df["InvoiceNumber"], df["TotalAmountDue"]))
+
+    assert csv_builder.build_csvs("invoices") == []
+    assert list(totals()) == ["INV-2017-01", "INV-2017-02", "INV-2017-03"]
+
+    # Added and changed files are extracted; the others are left alone.
+    generate_invoices.render(invoices[3], "invoices", logo=None)
+    generate_invoices.render({**invoices[1], "PercentageDiscount": "0"}, "invoices", logo=None)
+    assert csv_builder.build_csvs("invoices") == []
+    assert totals() == {"INV-2017-01": invoices[0]["TotalAmountDue"], "INV-2017-02": "90.00",
+                        "INV-2017-03": invoices[2]["TotalAmountDue"], "INV-2017-04": invoices[3]["TotalAmountDue"]}
+
+    # A deleted file loses its rows; a file that now fails keeps its last good rows.
+    os.remove(paths[0])
+    with open(paths[2], "wb") as f:
+        f.write(b"not a pdf")
+    failures = csv_builder.build_csvs("invoices")
+    assert [path for path, _ in failures] == [paths[2]]
+    assert list(totals()) == ["INV-2017-02", "INV-2017-03", "INV-2017-04"]
+    assert csv_builder.load_manifest()[paths[2]]["invoice_numbers"] == ["INV-2017-03"]
+
+    # A second file with the same invoice number is skipped instead of overwriting the first.
+    shutil.copy(paths[3], os.path.join("invoices", "invoice_zz_copy.pdf"))
+    generate_invoices.render(invoices[2], "invoices", logo=None)
+    failures = csv_builder.build_csvs("invoices")
+    assert len(failures) == 1 and "duplicate invoice number INV-2017-04" in failures[0][1]
+    assert totals()["INV-2017-03"] == invoices[2]["TotalAmountDue"] and len(totals()) == 3
+    assert len(pd.read_csv(csv_builder.summary_csv)) == 3
+
+
+def test_process_pool_matches_serial_mode_and_reports_failures(tmp_path):
+    for invoice in list(generate_invoices.iter_invoices(clients=2, invoice_years=[2020]))[:5]:
+        generate_invoices.render(invoice, str(tmp_path), logo=None)
+    (tmp_path / "invoice_broken.pdf").write_bytes(b"not a pdf")
+    paths = csv_builder.list_invoice_pdfs(str(tmp_path))
+
+    serial = list(csv_builder.iter_extraction_results(paths, workers=1))
+    pooled = list(csv_builder.iter_extraction_results(paths, workers=2, chunk_size=2))
+    assert [result[:4] for result in pooled] == [result[:4] for result in serial]
+    failed = [(path, error) for path, _, _, error, _ in pooled if error]
+    assert len(failed) == 1 and failed[0][0].endswith("invoice_broken.pdf")
+
+
+def test_slow_pdfs_time_out_in_serial_and_pool_mode(tmp_path, monkeypatch):
+    extract = csv_builder.extract_invoice_report
+
+    def slow_for_one(invoice_path):
+        if invoice_path.endswith("slow.pdf"):
+            time.sleep(30)
+        return extract(invoice_path)
+
+    monkeypatch.setattr(csv_builder, "extract_invoice_report", slow_for_one)
+    write_statement(tmp_path / "fast.pdf")
+    write_statement(tmp_path / "slow.pdf")
+    paths = csv_builder.list_invoice_pdfs(str(tmp_path))
+    # The patched function only reaches pool workers that are forked from this process.
+    for workers in (1, 2) if multiprocessing.get_start_method() == "fork" else (1,):
+        start = time.perf_counter()
+        results = list(csv_builder.iter_extraction_results(paths, workers=workers, chunk_size=1, timeout=1))
+        assert time.perf_counter() - start < 10
+        errors = {os.path.basename(path): error for path, _, _, error, _ in results}
+        assert errors["fast.pdf"] is None
+        assert errors["slow.pdf"].startswith("ExtractionTimeout")
@@ -0,0 +1,86 @@
+import os
+import sys
+import subprocess
+
+import embedding_cache
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text)), float(text.count("a")), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.0, 2.0]
+
+
+def test_repeated_text_is_served_from_disk(tmp_path):
+    inner = CountingEmbeddings()
+    cached = embedding_cache.CachedEmbeddings(inner, "test/model", str(tmp_path))
+    first = cached.embed_documents(["a", "bb", "a"])
+    assert inner.calls == 2
+    assert cached.embed_documents(["bb", "a"]) == [first[1], first[0]]
+    assert inner.calls == 2
+
+    reopened = embedding_cache.CachedEmbeddings(CountingEmbeddings(), "test/model", str(tmp_path))
+    assert reopened.embed_documents(["a"]) == [first[0]]
+    assert reopened.embeddings.calls == 0
+    assert reopened.stats()["hits"] == 1
+
+
+def test_queries_and_documents_are_cached_separately(tmp_path):
+    inner = CountingEmbeddings()
+    cached = embedding_cache.CachedEmbeddings(inner, "test/model", str(tmp_path))
+    assert cached.embed_query("a") == [1.0, 0.0, 2.0]
+    assert cached.embed_documents(["a"]) == [[1.0, 1.0, 1.0]]
+    assert cached.embed_query("a") == [1.0, 0.0, 2.0]
+    assert inner.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    inner = CountingEmbeddings()
+    cached = embedding_cache.CachedEmbeddings(inner, "test/model", str(tmp_path), max_entries=2)
+    cached.embed_documents(["a", "bb"])
+    cached.embed_documents(["a"])      # "bb" is now least recently used
+    cached.embed_documents(["ccc"])    # evicts "bb"
+    stats = cached.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    calls = inner.calls
+    cached.embed_documents(["a", "ccc"])
+    assert inner.calls == calls
+    cached.embed_documents(["bb"])
+    assert inner.calls == calls + 1
+
+
+def test_slot_reused_by_another_process_is_a_miss(tmp_path):
+    first = embedding_cache.CachedEmbeddings(CountingEmbeddings(), "test/model", str(tmp_path), max_entries=1)
+    second = embedding_cache.CachedEmbeddings(CountingEmbeddings(), "test/model", str(tmp_path), max_entries=1)
+    first.embed_documents(["a"])
+    second.embed_documents(["a"])
+    second.embed_documents(["bb"])     # evicts "a" and reuses its slot in the shared files
+    assert first.embed_documents(["a"]) == [[1.0, 1.0, 1.0]]
+    assert first.embeddings.calls == 2
+
+
+def test_concurrent_queries_are_micro_batched():
+    from concurrent.futures import ThreadPoolExecutor
+
+    inner = CountingEmbeddings()
+    batched = embedding_cache.BatchedQueryEmbeddings(inner, window=0.05)
+    texts = ["a" * n for n in range(1, 9)]
+    with ThreadPoolExecutor(len(texts)) as pool:
+        vectors = list(pool.map(batched.embed_query, texts))
+    assert vectors == inner.embed_documents(texts)
+    stats = batched.batch_stats()
+    assert stats["queries"] == 8 and stats["batches"] < 8
+
+
+def test_importing_the_ui_does_not_load_langchain():
+    src = os.path.dirname(os.path.abspath(embedding_cache.__file__))
+    code = "import sys, demo_ui_hybrid; print(any(name.startswith('langchain') for name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=src, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,27 @@
+import embedding_pipeline
+import fake_embeddings
+
+
+class RecordingEmbeddings(fake_embeddings.HashingEmbeddings):
+    batches = []
+
+    def embed_documents(self, texts):
+        RecordingEmbeddings.batches.append(len(texts))
+        return super().embed_documents(texts)
+
+
+def test_batches_and_worker_processes_give_the_same_vectors():
+    texts = [f"Snoopy attended on {day:02d}/03/2019." for day in range(1, 11)]
+    single = embedding_pipeline.PipelineEmbeddings(RecordingEmbeddings, batch_size=4, report=None)
+    vectors = single.embed_documents(texts)
+    assert RecordingEmbeddings.batches == [4, 4, 2]
+    assert single.embedded == 10 and single.rate() > 0
+
+    sharded = embedding_pipeline.PipelineEmbeddings(fake_embeddings.HashingEmbeddings, batch_size=3, workers=2,
+                                                    report=None)
+    try:
+        assert sharded.embed_documents(texts) == vectors
+    finally:
+        sharded.close()
+    # Once closed, the stage keeps working in this process rather than starting new workers.
+    assert sharded.embed_documents(texts[:2]) == vectors[:2] and sharded._pool is None
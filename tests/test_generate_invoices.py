@@ -0,0 +1,35 @@
+import os
+
+import csv_builder
+import generate_invoices
+
+
+def test_default_plan_is_the_original_dataset():
+    invoices = list(generate_invoices.iter_invoices())
+    assert len(invoices) == 96
+    assert invoices[0]["InvoiceNumber"] == "INV-2017-01"
+    assert {(i["ClientName"], i["DogName"], i["OriginalCostPerDay"], i["PercentageDiscount"]) for i in invoices} == {
+        ("Charlie Brown", "Snoopy", "22.50", "50")}
+    assert all(i["DatesAttendedCount"] == 4 for i in invoices)
+
+
+def test_generation_is_seeded_and_independent_of_workers(tmp_path):
+    manifests = []
+    for workers in (1, 2):
+        manifest = tmp_path / f"truth_{workers}.jsonl"
+        written = generate_invoices.generate(clients=3, dogs_per_client=2, invoice_years=[2020], workers=workers,
+                                             output_dir=str(tmp_path / f"out_{workers}"), manifest=str(manifest),
+                                             logo=None)
+        assert written == 3 * 2 * 12
+        manifests.append(generate_invoices.load_manifest(str(manifest)))
+    assert manifests[0] == manifests[1]
+    assert manifests[0][12]["InvoiceNumber"] == "INV-2020-01-0001"
+    assert len(os.listdir(tmp_path / "out_2")) == 72
+
+
+def test_extracted_fields_match_the_manifest(tmp_path):
+    invoice = next(generate_invoices.iter_invoices(clients=2, seed=7))
+    generate_invoices.render(invoice, str(tmp_path))
+    summary, attendance = csv_builder.extract_invoice(str(tmp_path / f"invoice_{invoice['InvoiceNumber']}.pdf"))
+    assert summary == {key: value for key, value in invoice.items() if key != "Dates"}
+    assert [row["Date"] for row in attendance] == invoice["Dates"]
@@ -0,0 +1,60 @@
+import chunking
+import hybrid_retrieval
+from lexical_index import LexicalIndex, LexicalIndexBuilder
+
+
+class Document:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+class FakeVectorstore:
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def similarity_search(self, query, k, filter=None):
+        self.calls += 1
+        return [Document(text, metadata) for text, metadata in self.results[:k]]
+
+
+def build_index(tmp_path):
+    records = [
+        ("invoice:INV-2019-03", ["Invoice Number: INV-2019-03. Month Billed: March."],
+         {"invoice_number": "INV-2019-03", "year": 2019, "record_type": "invoice"}),
+        ("attendance:INV-2019-03", ["Snoopy attended on 03/03/2019 (Sunday) under invoice INV-2019-03."],
+         {"invoice_number": "INV-2019-03", "year": 2019, "record_type": "attendance"}),
+        ("invoice:INV-2020-01", ["Invoice Number: INV-2020-01. Month Billed: January."],
+         {"invoice_number": "INV-2020-01", "year": 2020, "record_type": "invoice"}),
+        ("summary:total_cost", ["The total cost for all invoices is $33.75."], {"record_type": "summary"}),
+    ]
+    builder = LexicalIndexBuilder()
+    chunks = list(builder.track(chunking.iter_chunks(records)))
+    builder.build().save(tmp_path)
+    return LexicalIndex.load(tmp_path), chunks
+
+
+def test_exact_ids_short_circuit_dense_search(tmp_path):
+    index, _ = build_index(tmp_path)
+    dense = FakeVectorstore([])
+    search = hybrid_retrieval.HybridSearch(index, dense)
+
+    results = search.search("What did Snoopy do on 03/03/2019?")
+    assert [metadata["record_key"] for _, metadata in results] == ["attendance:INV-2019-03"]
+    results = search.search("Total for inv-2019-03?", chunking.metadata_filter("Total for inv-2019-03?"))
+    assert [metadata["record_key"] for _, metadata in results] == ["invoice:INV-2019-03", "attendance:INV-2019-03"]
+    assert dense.calls == 0 and search.last_timings["path"] == "exact"
+
+
+def test_lexical_and_dense_results_are_fused(tmp_path):
+    index, chunks = build_index(tmp_path)
+    by_key = {metadata["record_key"]: (text, metadata) for _, text, metadata in chunks}
+    dense = FakeVectorstore([by_key["summary:total_cost"], by_key["invoice:INV-2020-01"]])
+    search = hybrid_retrieval.HybridSearch(index, dense, k=2)
+
+    results = search.search("total cost of all invoices")
+    assert results[0][1]["record_key"] == "summary:total_cost"
+    assert dense.calls == 1 and search.last_timings["path"] == "hybrid"
+    assert {"lexical_ms", "dense_ms", "fusion_ms"} <= set(search.last_timings)
+    assert hybrid_retrieval.reciprocal_rank_fusion([["a", "b"], ["b", "c"]]) == ["b", "a", "c"]
@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+
+import fake_embeddings
+import lexical_index
+import ingest_invoices_hybrid as ingest
+
+
+def write_csvs(total="22.50"):
+    pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03"], "ServiceProviderName": ["Pawprints and Playcare LLC"],
+        "ServiceProviderAddress": ["7427 Willow Creek Drive"], "ClientName": ["Charlie Brown"],
+        "ClientAddress": ["32 Willow Crescent"], "MonthBilledFor": ["March"], "Year": ["2019"],
+        "DogName": ["Snoopy"], "OriginalCostPerDay": ["22.50"], "PercentageDiscount": ["50"],
+        "TotalAmountDue": [total], "DatesAttendedCount": ["2"],
+    }).to_csv(ingest.invoice_csv, index=False)
+    pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2019-03"], "Date": ["03/03/2019", "10/03/2019"],
+        "Day": ["Sunday", "Sunday"], "DogName": ["Snoopy", "Snoopy"],
+    }).to_csv(ingest.attendance_csv, index=False)
+
+
+def test_store_is_rebuilt_only_when_stale(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_csvs()
+    directory = ingest.backend_directories["mmap"]
+    assert not ingest.store_is_current(directory)
+
+    def build():
+        ingest.build_vectorstore(fake_embeddings.HashingEmbeddings(), "mmap")
+
+    build()
+    assert ingest.store_is_current(directory)
+
+    os.remove(os.path.join(directory, lexical_index.index_file))
+    assert not ingest.store_is_current(directory)
+    build()
+    assert ingest.store_is_current(directory)
+
+    write_csvs(total="122.50")
+    assert not ingest.store_is_current(directory)
+    build()
+    assert ingest.store_is_current(directory)
+
+    monkeypatch.setattr(ingest, "document_version", ingest.document_version + 1)
+    assert not ingest.store_is_current(directory)
@@ -0,0 +1,62 @@
+import pandas as pd
+
+import invoice_documents
+
+
+def make_frames():
+    invoice_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2019-04", "INV-2019-05"],
+        "ServiceProviderName": ["Pawprints and Playcare LLC"] * 3,
+        "ServiceProviderAddress": ["7427 Willow Creek Drive"] * 3,
+        "ClientName": ["Charlie Brown"] * 3,
+        "ClientAddress": ["32 Willow Crescent"] * 3,
+        "MonthBilledFor": ["March", "April", "May"],
+        "Year": [2019, 2019, 2019],
+        "DogName": ["Snoopy"] * 3,
+        "OriginalCostPerDay": [22.5] * 3,
+        "PercentageDiscount": [50] * 3,
+        "TotalAmountDue": [22.5, 11.25, 0.0],
+        "DatesAttendedCount": [2, 1, 0],
+    })
+    attendance_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2019-03", "INV-2019-04"],
+        "Date": ["03/03/2019", "10/03/2019", "bad"],
+        "Day": ["Sunday", "Sunday", "Monday"],
+        "DogName": ["Snoopy"] * 3,
+    })
+    attendance_df["ParsedDate"] = pd.to_datetime(attendance_df["Date"], format="%d/%m/%Y", errors="coerce")
+    return invoice_df, attendance_df
+
+
+def test_texts_match_the_original_row_format():
+    invoice_df, attendance_df = make_frames()
+    assert invoice_documents.invoice_texts(invoice_df)["INV-2019-03"] == (
+        "Invoice Number: INV-2019-03. Month Billed: March. Year: 2019. "
+        "Client: Charlie Brown, Address: 32 Willow Crescent. "
+        "Service Provider: Pawprints and Playcare LLC, Address: 7427 Willow Creek Drive. "
+        "Dog Name: Snoopy. Cost Per Day: $22.5, Discount: 50%. Total Due: $22.5. Days Attended: 2."
+    )
+    assert invoice_documents.attendance_texts(attendance_df).tolist() == [
+        "Snoopy attended on 03/03/2019 (Sunday) in 2019 under invoice INV-2019-03.",
+        "Snoopy attended on 10/03/2019 (Sunday) in 2019 under invoice INV-2019-03.",
+        "Snoopy attended on bad (Monday) under invoice INV-2019-04.",
+    ]
+
+
+def test_records_are_the_same_for_any_batch_size():
+    invoice_df, attendance_df = make_frames()
+    expected = {key: (lines, meta) for key, lines, meta in invoice_documents.iter_records(invoice_df, attendance_df)}
+    for batch_size in (1, 2, 100):
+        records = invoice_documents.iter_records(invoice_df, attendance_df, batch_size)
+        assert {key: (lines, meta) for key, lines, meta in records} == expected
+
+    lines, meta = expected["attendance:INV-2019-03"]
+    assert len(lines) == 2 and lines[0].startswith("Snoopy attended on 03/03/2019")
+    assert meta == {"invoice_number": "INV-2019-03", "year": 2019, "month": "March", "dog": "Snoopy",
+                    "record_type": "attendance"}
+    assert expected["invoice:INV-2019-05"][0][0].startswith("Invoice Number: INV-2019-05.")
+    assert "attendance:INV-2019-05" not in expected
+    lines, meta = expected["summary:narrative:Charlie Brown:Snoopy"]
+    assert meta == {"record_type": "summary", "client": "Charlie Brown", "dog": "Snoopy"}
+    assert expected["summary:monthly_breakdown:Charlie Brown:Snoopy"][1] == meta
+    assert expected["summary:total_cost"][1] == {"record_type": "summary"}
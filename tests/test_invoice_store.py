@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+import invoice_store
+
+pytest.importorskip("pyarrow")
+
+
+def make_frames():
+    summary = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2020-01", "INV-XXXX-01"],
+        "ServiceProviderName": ["Pawprints and Playcare LLC"] * 3,
+        "ServiceProviderAddress": ["7427 Willow Creek Drive"] * 3,
+        "ClientName": ["Charlie Brown"] * 3,
+        "ClientAddress": ["32 Willow Crescent"] * 3,
+        "MonthBilledFor": ["March", "January", "January"],
+        "Year": ["2019", "2020", ""],
+        "DogName": ["Snoopy"] * 3,
+        "OriginalCostPerDay": ["22.50"] * 3,
+        "PercentageDiscount": ["50", "50", ""],
+        "TotalAmountDue": ["22.50", "33.75", "0.00"],
+        "DatesAttendedCount": ["2", "3", "0"],
+    })
+    attendance = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2019-03", "INV-2020-01"],
+        "Date": ["03/03/2019", "10/03/2019", "03/01/2020"],
+        "Day": ["Sunday", "Sunday", "Friday"],
+        "DogName": ["Snoopy"] * 3,
+    })
+    return summary, attendance
+
+
+def _sorted(df, key):
+    return df.sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def test_store_round_trips_the_extracted_strings(tmp_path):
+    summary, attendance = make_frames()
+    directory = str(tmp_path / "store")
+    invoice_store.write_store(summary, attendance, directory=directory)
+    assert sorted(os.listdir(os.path.join(directory, "invoices"))) == ["Year=0", "Year=2019", "Year=2020"]
+
+    raw_summary, raw_attendance = invoice_store.load_raw_frames(directory)
+    pd.testing.assert_frame_equal(_sorted(raw_summary, "InvoiceNumber"), _sorted(summary, "InvoiceNumber"))
+    pd.testing.assert_frame_equal(_sorted(raw_attendance, "Date"), _sorted(attendance, "Date"))
+
+
+def test_only_the_changed_years_are_rewritten(tmp_path):
+    summary, attendance = make_frames()
+    directory = str(tmp_path / "store")
+    invoice_store.write_store(summary, attendance, directory=directory)
+    kept = os.path.join(directory, "invoices", "Year=2019", "part-0.parquet")
+    before = os.stat(kept).st_mtime_ns
+
+    # 2020 changes; the 2019 rows passed in differ too but must be left as stored.
+    summary.loc[1, "TotalAmountDue"] = "40.00"
+    summary.loc[0, "TotalAmountDue"] = "99.99"
+    attendance = attendance[attendance["InvoiceNumber"] != "INV-2020-01"]
+    invoice_store.write_store(summary, attendance, {2020}, {2020}, directory=directory)
+
+    raw_summary, raw_attendance = invoice_store.load_raw_frames(directory)
+    totals = dict(zip(raw_summary["InvoiceNumber"], raw_summary["TotalAmountDue"]))
+    assert totals == {"INV-2019-03": "22.50", "INV-2020-01": "40.00", "INV-XXXX-01": "0.00"}
+    assert raw_attendance["InvoiceNumber"].tolist() == ["INV-2019-03", "INV-2019-03"]
+    assert not os.path.exists(os.path.join(directory, "attendance", "Year=2020"))
+    assert os.stat(kept).st_mtime_ns == before
+
+
+def test_csv_fallback_matches_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    summary, attendance = make_frames()
+    summary.to_csv(invoice_store.invoice_csv, index=False)
+    attendance.to_csv(invoice_store.attendance_csv, index=False)
+    assert not invoice_store.store_exists()
+
+    from_csv = invoice_store.load_invoices(["InvoiceNumber", "TotalAmountDue"])
+    assert from_csv["TotalAmountDue"].tolist() == [22.5, 33.75, 0.0]
+    days = invoice_store.load_attendance(["InvoiceNumber", "Date", "Year"])
+    assert days["Year"].tolist() == [2019, 2019, 2020]
+    assert days["ParsedDate"].dt.day.tolist() == [3, 10, 3]
+
+    invoice_store.write_store(summary, attendance)
+    from_store = invoice_store.load_attendance(["InvoiceNumber", "Date", "Year"])
+    assert _sorted(from_store, "ParsedDate")["Date"].tolist() == days["Date"].tolist()
+    assert _sorted(invoice_store.load_invoices(["InvoiceNumber", "TotalAmountDue"]), "InvoiceNumber")[
+        "TotalAmountDue"].tolist() == [22.5, 33.75, 0.0]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import mmap_index
+import vectorstore_sync
+
+
+class TableEmbeddings:
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_exact_search_filter_and_incremental_sync(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    table = {f"doc {i}": rng.standard_normal(16).tolist() for i in range(50)}
+    embedding = TableEmbeddings(table)
+    chunks = [(f"doc:{i}", f"doc {i}", {"year": 2019 + i % 2}) for i in range(50)]
+
+    index = mmap_index.MmapVectorIndex(str(tmp_path), embedding, dtype)
+    assert vectorstore_sync.sync_vectorstore(index, chunks, batch_size=16)["added"] == 50
+    # Added batches are on disk before persist(), not held in memory.
+    row_bytes = 16 * (2 if dtype == "float16" else 1)
+    assert (tmp_path / mmap_index.spool_files["vectors"]).stat().st_size == 50 * row_bytes
+    index.persist()
+    assert not (tmp_path / mmap_index.spool_files["vectors"]).exists()
+
+    reopened = mmap_index.MmapVectorIndex(str(tmp_path), embedding)
+    assert reopened.dtype == dtype and len(reopened) == 50
+    assert reopened.similarity_search("doc 7", k=1)[0].page_content == "doc 7"
+    filtered = reopened.similarity_search("doc 7", k=5, filter={"year": 2019})
+    assert len(filtered) == 5 and all(doc.metadata["year"] == 2019 for doc in filtered)
+
+    stats = vectorstore_sync.sync_vectorstore(reopened, chunks[:40])
+    reopened.persist()
+    assert stats == {"added": 0, "deleted": 10, "unchanged": 40}
+    assert len(mmap_index.MmapVectorIndex(str(tmp_path), embedding)) == 40
@@ -0,0 +1,98 @@
+import time
+import socket
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fake_ollama
+import ollama_client
+import qa_chain
+
+
+class FakeSearch:
+    def search(self, query, where=None):
+        return [("Snoopy attended on 03/03/2019.", {}), ("Total Due: $22.5.", {})]
+
+
+@pytest.fixture
+def server():
+    server = fake_ollama.start_server(answer="Snoopy went on Sunday.")
+    yield server
+    server.shutdown()
+
+
+def test_streams_tokens_through_a_pooled_chain(server):
+    client = ollama_client.OllamaClient(server.base_url)
+    assert client.list_models() == ["llama3:instruct", "mistral:instruct"]
+
+    chains = qa_chain.ChainPool(client, FakeSearch())
+    chain = chains.warm_up("llama3:instruct")
+    assert chains.get("llama3:instruct") is chain
+    info = {}
+    assert list(chain.stream("When did Snoopy attend?", info)) == ["Snoopy", " went", " on", " Sunday."]
+    assert info["chunks"] == 2 and info["prompt_tokens"] > info["context_tokens"] > 0
+    assert info["eval_count"] == 4 and info["prompt_eval_count"] > 0
+
+    preload, generate = [payload for method, _, payload in server.requests if method == "POST"]
+    assert preload["prompt"] == "" and preload["keep_alive"] == ollama_client.default_keep_alive
+    assert "Snoopy attended on 03/03/2019.\n\nTotal Due: $22.5." in generate["prompt"]
+    assert generate["prompt"].endswith("Question: When did Snoopy attend?\nAnswer:")
+
+    with pytest.raises(ollama_client.OllamaError):
+        client.generate("missing-model", "hello")
+
+
+def test_model_discovery_fails_fast_when_ollama_is_unreachable():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = ollama_client.OllamaClient(f"http://127.0.0.1:{port}")
+    with pytest.raises(ollama_client.OllamaError):
+        client.list_models(timeout=0.5)
+
+
+def test_malformed_stream_is_an_ollama_error():
+    class GarbageHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"<html>proxy error</html>\n")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GarbageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = ollama_client.OllamaClient(f"http://127.0.0.1:{server.server_address[1]}")
+        with pytest.raises(ollama_client.OllamaError):
+            client.generate("llama3:instruct", "hello")
+    finally:
+        server.shutdown()
+
+
+def test_abandoned_stream_stops_its_worker():
+    produced, closed = [], threading.Event()
+
+    def tokens():
+        try:
+            while True:
+                produced.append(len(produced))
+                yield produced[-1]
+        finally:
+            closed.set()
+
+    async def read_one():
+        stream = qa_chain.iterate_in_thread(tokens, max_buffered=2)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(read_one()) == 0
+    assert closed.wait(5)
+    count = len(produced)
+    time.sleep(0.05)
+    assert len(produced) == count <= 4
@@ -0,0 +1,41 @@
+import pipeline
+import invoice_store
+
+
+def make_pipeline(tmp_path, calls):
+    source = tmp_path / "source.txt"
+    output = tmp_path / "output.txt"
+
+    def build(context):
+        calls.append("build")
+        output.write_text(source.read_text().upper())
+
+    def report(context):
+        calls.append("report")
+
+    return pipeline.Pipeline([
+        pipeline.Stage("build", build, fingerprint=lambda context: invoice_store.fingerprint_files([str(source)]),
+                       ready=lambda context: output.exists()),
+        pipeline.Stage("report", report, after=["build"]),
+    ], str(tmp_path / "state.json")), source, output
+
+
+def test_stages_run_in_order_and_skip_when_inputs_are_unchanged(tmp_path):
+    calls = []
+    runner, source, output = make_pipeline(tmp_path, calls)
+    source.write_text("a")
+
+    assert [result["status"] for result in runner.run(["report"]).values()] == ["ran", "ran"]
+    assert calls == ["build", "report"]
+
+    runner.run(["report"])
+    assert calls[2:] == ["report"]  # build skipped, report always runs
+
+    output.unlink()
+    runner.run(["build"])
+    assert calls[3:] == ["build"]  # missing output
+
+    source.write_text("changed")
+    runner.run(["build"])
+    runner.run(["build"], force=True)
+    assert calls[4:] == ["build", "build"]
@@ -0,0 +1,69 @@
+import pandas as pd
+
+import query_router
+
+
+def make_router():
+    invoice_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03", "INV-2019-04", "INV-2020-01"],
+        "MonthBilledFor": ["March", "April", "January"],
+        "Year": [2019, 2019, 2020],
+        "DogName": ["Snoopy"] * 3,
+        "OriginalCostPerDay": [22.5] * 3,
+        "PercentageDiscount": [50] * 3,
+        "TotalAmountDue": [22.5, 11.25, 33.75],
+        "DatesAttendedCount": [2, 1, 3],
+    })
+    dates = ["03/03/2019", "10/03/2019", "01/04/2019", "03/01/2020", "10/01/2020", "17/01/2020"]
+    attendance_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03"] * 2 + ["INV-2019-04"] + ["INV-2020-01"] * 3,
+        "Date": dates,
+        "Day": ["Sunday", "Sunday", "Monday", "Friday", "Friday", "Friday"],
+    })
+    attendance_df["ParsedDate"] = pd.to_datetime(attendance_df["Date"], format="%d/%m/%Y")
+    return query_router.QueryRouter(invoice_df, attendance_df)
+
+
+def test_aggregate_and_lookup_intents():
+    router = make_router()
+    assert router.route("What was the total cost in 2019?") == ("The total cost for 2019 is $33.75.", "total_cost")
+    assert router.route("How many days did Snoopy attend in March 2019?")[0] == (
+        "Snoopy attended daycare on 2 days in March 2019.")
+    assert router.route("When was Snoopy's first day at daycare?")[0] == (
+        "Snoopy first attended daycare on 03/03/2019 (Sunday).")
+    assert router.route("What was the longest gap between visits?")[0].startswith(
+        "The longest gap between visits was 277 days, from 01/04/2019")
+    assert router.route("What day of the week has snoopy attended the most?")[1] == "most_common_day"
+    assert router.route("Total for inv-2020-01?")[0].endswith("total due $33.75.")
+    assert router.route("Did Snoopy attend on 10/01/2020?")[0] == "Yes, Snoopy attended on 10/01/2020 (Friday)."
+
+
+def test_open_ended_or_ambiguous_questions_fall_back():
+    router = make_router()
+    assert router.route("Who does Snoopy live with?") is None
+    assert router.route("What is the cost per day?") is None
+    assert router.route("Compare the total cost in 2019 and 2020") is None
+
+
+def test_non_cost_questions_are_not_answered_as_totals():
+    router = make_router()
+    assert router.route("What is the total number of days Snoopy attended?") == (
+        "Snoopy has attended daycare on 6 days in total.", "days_attended")
+    assert router.route("Total days in 2019?") == ("Snoopy attended daycare on 3 days in 2019.", "days_attended")
+    assert router.route("What is the discount amount Snoopy gets?") is None
+    assert router.route("What is the amount of food Snoopy eats?") is None
+    assert router.route("What is the total cost for Snoopy's visits?") is None
+    assert router.route("How much was spent in 2020?")[0] == "The total cost for 2020 is $33.75."
+    assert router.route("May I ask how much Snoopy's daycare cost?")[0] == (
+        "The total cost for all invoices for Snoopy is $67.50.")
+
+
+def test_counts_and_relative_periods_are_not_answered_as_first_or_last_dates():
+    router = make_router()
+    assert router.route("How many days last year did Snoopy attend?") is None
+    assert router.route("How much was spent last year?") is None
+    assert router.route("Where did Snoopy go on his first day?") is None
+    assert router.route("When did Snoopy last attend?") == (
+        "Snoopy's most recent attendance was on 17/01/2020 (Friday).", "last_attendance")
+    assert router.route("What was the date of Snoopy's first visit?")[1] == "first_attendance"
+    assert router.route("How many days has Snoopy attended since his first visit?")[1] == "days_attended"
@@ -0,0 +1,57 @@
+import pandas as pd
+
+import query_router
+import rollups
+
+
+def make_frames():
+    invoice_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03-0000", "INV-2019-04-0000", "INV-2019-03-0001"],
+        "ClientName": ["Charlie Brown", "Charlie Brown", "Linus Smith"],
+        "MonthBilledFor": ["March", "April", "March"],
+        "Year": ["2019", "2019", "2019"],
+        "DogName": ["Snoopy", "Snoopy", "Coco"],
+        "TotalAmountDue": ["22.50", "11.25", "40.00"],
+    })
+    attendance_df = pd.DataFrame({
+        "InvoiceNumber": ["INV-2019-03-0000", "INV-2019-03-0000", "INV-2019-04-0000", "INV-2019-03-0001"],
+        "Date": ["03/03/2019", "10/03/2019", "01/04/2019", "03/03/2019"],
+        "DogName": ["Snoopy", "Snoopy", "Snoopy", "Coco"],
+    })
+    return invoice_df, attendance_df
+
+
+def test_summaries_come_from_day_masks():
+    stats = rollups.summarize(rollups.Rollups.from_frames(*make_frames()).by_pair()[("Charlie Brown", "Snoopy")])
+    assert stats["days"] == 3 and stats["invoices"] == 2 and stats["cost"] == 33.75
+    assert stats["gap"][0] == 22 and str(stats["first"]) == "2019-03-03" and str(stats["last"]) == "2019-04-01"
+    assert rollups.most_common_day(stats) == ("Sunday", 2)
+    assert stats["days_by_period"] == {(2019, "March"): 2, (2019, "April"): 1}
+
+
+def test_incremental_update_matches_a_full_rebuild(tmp_path):
+    invoice_df, attendance_df = make_frames()
+    rollups.Rollups.from_frames(invoice_df.iloc[:2], attendance_df.iloc[:3]).save(tmp_path)
+
+    stored = rollups.Rollups.load(tmp_path, contributions=True)
+    changed_invoice = invoice_df.iloc[[2]].assign(TotalAmountDue="45.00")
+    assert stored.update(changed_invoice, attendance_df.iloc[[3]], removed=["INV-2019-04-0000"]) == 2
+    assert ("Charlie Brown", "Snoopy", 2019, 4) not in stored.index
+    assert stored.index[("Linus Smith", "Coco", 2019, 3)] == {"INV-2019-03-0001"}
+    stored.save(tmp_path)
+
+    expected = rollups.Rollups.from_frames(pd.concat([invoice_df.iloc[[0]], changed_invoice]),
+                                           attendance_df.iloc[[0, 1, 3]])
+    assert rollups.Rollups.load(tmp_path).groups == expected.groups
+    assert expected.groups[("Linus Smith", "Coco", 2019, 3)]["cost"] == 45.0
+
+
+def test_questions_are_scoped_to_the_named_client_or_dog():
+    invoice_df, attendance_df = make_frames()
+    router = query_router.QueryRouter(invoice_df, rollup=rollups.Rollups.from_frames(invoice_df, attendance_df))
+    assert router.route("How many days did Coco attend?")[0] == "Coco has attended daycare on 1 days in total."
+    assert router.route("Did Snoopy attend on 10/03/2019?")[0].startswith("Yes, Snoopy attended")
+    assert router.route("What did Charlie Brown pay in total?")[0] == (
+        "The total cost for all invoices for Charlie Brown is $33.75.")
+    assert router.route("What was the total cost in 2019?")[0] == "The total cost for 2019 is $73.75."
+    assert router.route("How many days in total?") is None
@@ -0,0 +1,46 @@
+import json
+import urllib.request
+
+import tracing
+
+
+def test_spans_are_aggregated_collected_and_logged(tmp_path):
+    tracing.reset()
+    tracing.configure(str(tmp_path / "trace.jsonl"))
+    record = {}
+    try:
+        with tracing.collect(record):
+            with tracing.span("retrieve"):
+                tracing.annotate(prompt_chars=1200)
+            with tracing.span("extract") as fields:
+                fields["items"] = 3
+        tracing.count("pdfs_extracted", 3)
+    finally:
+        tracing.configure(None)
+
+    assert set(record) == {"retrieve_ms", "extract_ms", "prompt_chars"}
+    assert tracing.format_breakdown(record).startswith("retrieve 0 ms, prompt 1,200 chars")
+    snapshot = tracing.snapshot()
+    assert snapshot["counters"] == {"pdfs_extracted": 3}
+    assert snapshot["timings"]["extract"]["count"] == 1
+    events = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    assert [event["name"] for event in events] == ["retrieve", "extract"]
+    assert events[1]["items"] == 3 and "items_per_s" in events[1]
+
+
+def test_metrics_endpoint():
+    tracing.reset()
+    tracing.count("chunks_embedded", 64)
+    with tracing.span("retrieve"):
+        pass
+    server = tracing.start_metrics_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        text = urllib.request.urlopen(url + "/metrics").read().decode()
+        assert "invoice_chunks_embedded_total 64" in text
+        assert "# TYPE invoice_retrieve_seconds summary" in text
+        assert "# TYPE invoice_retrieve_max_seconds gauge" in text
+        assert "invoice_retrieve_seconds_max" not in text
+        assert json.loads(urllib.request.urlopen(url + "/metrics.json").read())["counters"] == {"chunks_embedded": 64}
+    finally:
+        server.shutdown()
@@ -0,0 +1,33 @@
+import chunking
+import vectorstore_sync
+
+
+class FakeVectorstore:
+    def __init__(self):
+        self.docs = {}
+        self.embedded = []
+
+    def get(self, include=None):
+        return {"ids": list(self.docs)}
+
+    def delete(self, ids):
+        for cid in ids:
+            del self.docs[cid]
+
+    def add_texts(self, texts, metadatas, ids):
+        self.embedded.extend(texts)
+        self.docs.update(zip(ids, texts))
+
+
+def test_sync_only_embeds_changes():
+    store = FakeVectorstore()
+    records = [("invoice:INV-1", ["a"], {}), ("invoice:INV-2", ["b"], {}), ("invoice:INV-3", ["c"], {})]
+    assert vectorstore_sync.sync_vectorstore(store, chunking.iter_chunks(records)) == {
+        "added": 3, "deleted": 0, "unchanged": 0}
+
+    store.embedded.clear()
+    records = [("invoice:INV-1", ["a"], {}), ("invoice:INV-2", ["b changed"], {}), ("invoice:INV-4", ["d"], {})]
+    stats = vectorstore_sync.sync_vectorstore(store, chunking.iter_chunks(records))
+    assert stats == {"added": 2, "deleted": 2, "unchanged": 1}
+    assert sorted(store.embedded) == ["b changed", "d"]
+    assert sorted(store.docs.values()) == ["a", "b changed", "d"]